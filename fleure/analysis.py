@@ -16,6 +16,7 @@ import logging
 import nltk
 import tablib
 
+import fleure.cvss
 import fleure.globals
 import fleure.utils
 import fleure.rpmutils
@@ -79,12 +80,15 @@ def _errata_keywords(names, keywords, pkeywords):
 
 
 def errata_of_keywords_g(ers, keywords=fleure.globals.ERRATA_KEYWORDS,
-                         pkeywords=None, stemming=True):
+                         pkeywords=None, stemming=True, cache=None):
     """
     :param ers: A list of errata
     :param keywords: A tuple of keywords to filter 'important' RHBAs
     :param pkeywords: Similar to above but a dict gives the list per RPMs
     :param stemming: Strict matching of keywords with using NLTK stemmer
+    :param cache:
+        A dict to keep keywords matched for each errata, {advisory: keywords},
+        to avoid tokenizing the description of same errata again, or None
     :return:
         A generator to yield errata of which description contains any of
         given keywords
@@ -109,15 +113,20 @@ def errata_of_keywords_g(ers, keywords=fleure.globals.ERRATA_KEYWORDS,
         pkeywords = fleure.globals.ERRATA_PKEYWORDS
 
     for ert in ers:
-        # .. note:: This does not work in NLTK < 3.1 in Fedora.
-        # tokens = set(nltk.wordpunct_tokenize(ert["description"]))
-        tokens = set(nltk.word_tokenize(ert["description"]))
-        if stemming and tokens:
-            tokens = set(_stem(w.lower()) for w in tokens if w)
-
-        kwds = _errata_keywords(ert.get("package_names", []), keywords,
-                                pkeywords)
-        matched = kwds & tokens
+        matched = None if cache is None else cache.get(ert["advisory"])
+        if matched is None:
+            # .. note:: This does not work in NLTK < 3.1 in Fedora.
+            # tokens = set(nltk.wordpunct_tokenize(ert["description"]))
+            tokens = set(nltk.word_tokenize(ert["description"]))
+            if stemming and tokens:
+                tokens = set(_stem(w.lower()) for w in tokens if w)
+
+            kwds = _errata_keywords(ert.get("package_names", []), keywords,
+                                    pkeywords)
+            matched = kwds & tokens
+            if cache is not None:
+                cache[ert["advisory"]] = matched
+
         if matched:
             LOG.debug(_("%s matched: keywords=%s"), ert["advisory"],
                       ', '.join(matched))
@@ -241,7 +250,8 @@ def kfn(ert):
 
 
 def analyze_rhba(rhba, keywords=fleure.globals.ERRATA_KEYWORDS,
-                 pkeywords=None, core_rpms=fleure.globals.CORE_RPMS):
+                 pkeywords=None, core_rpms=fleure.globals.CORE_RPMS,
+                 kwcache=None):
     """
     Compute and return statistics of RHBAs from some view points.
 
@@ -249,9 +259,12 @@ def analyze_rhba(rhba, keywords=fleure.globals.ERRATA_KEYWORDS,
     :param keywords: A tuple of keywords to filter 'important' RHBAs
     :param pkeywords: Similar to above but a dict gives the list per RPMs
     :param core_rpms: Core RPMs to filter errata by them
+    :param kwcache: A dict to cache keywords matched, see
+        :func:`errata_of_keywords_g`
     :return: RHSA analized data and metrics
     """
-    rhba_by_kwds = sorted(errata_of_keywords_g(rhba, keywords, pkeywords),
+    rhba_by_kwds = sorted(errata_of_keywords_g(rhba, keywords, pkeywords,
+                                               cache=kwcache),
                           key=kfn, reverse=True)
     rhba_of_core_rpms_by_kwds = \
         sorted(errata_of_rpms_g(rhba_by_kwds, core_rpms),
@@ -302,6 +315,10 @@ def higher_score_cve_errata_g(ers, score=0):
     :param ers: A list of errata
     :param score: CVSS base metrics score
     """
+    ers = list(ers)
+    # Compute scores of CVEs of which vectors are known locally at once.
+    fleure.cvss.complement_scores([c for e in ers for c in e.get("cves", [])])
+
     for ert in ers:
         # NOTE: Skip older CVEs do not have CVSS base metrics and score.
         cves = [c for c in ert.get("cves", []) if "score" in c]
@@ -315,9 +332,100 @@ def higher_score_cve_errata_g(ers, score=0):
             yield ert
 
 
+class LazyDict(dict):
+    """
+    A dict computes values of keys on demand with factories and keeps them.
+
+    >>> calls = []
+    >>> dic = LazyDict(dict(a=lambda: calls.append(1) or 1), b=2)
+    >>> (dic["a"], dic["a"], dic["b"], calls)
+    (1, 1, 2, [1])
+    >>> "a" in LazyDict(dict(a=lambda: 1))
+    False
+    >>> LazyDict(dict(a=lambda: LazyDict(dict(b=lambda: 2)))).materialize()
+    {'a': {'b': 2}}
+    """
+    def __init__(self, factories, *args, **kwargs):
+        """
+        :param factories: A dict of {key: a callable returns the value}
+        """
+        super(LazyDict, self).__init__(*args, **kwargs)
+        self._factories = factories
+
+    def __missing__(self, key):
+        if key not in self._factories:
+            raise KeyError(key)
+
+        val = self[key] = self._factories[key]()
+        return val
+
+    def materialize(self):
+        """Compute values of all keys not computed yet, recursively.
+        """
+        for key in self._factories:
+            val = self[key]
+            if isinstance(val, LazyDict):
+                val.materialize()
+
+        return self
+
+
+def _lazy_cvss_views(data, ers, score=0):
+    """
+    :param data: A dict of analyzed data of `ers`
+    :param ers: A list of errata
+    :param score: CVSS base metrics score
+    :return: `data` with views of errata by CVSS scores computed lazily
+    """
+    def _by_score():
+        return list(higher_score_cve_errata_g(ers, score)) if score > 0 else []
+
+    def _updates():
+        return list_updates_from_errata(res["list_higher_cvss_score"])
+
+    res = LazyDict(dict(list_higher_cvss_score=_by_score,
+                        list_higher_cvss_updates=_updates), data)
+    return res
+
+
+def analyze_errata_lazy(ers, score=fleure.globals.CVSS_MIN_SCORE,
+                        keywords=fleure.globals.ERRATA_KEYWORDS,
+                        pkeywords=None, core_rpms=fleure.globals.CORE_RPMS,
+                        kwcache=None):
+    """
+    Similar to :func:`analyze_errata` but views of errata of each type are
+    computed only when they are accessed, e.g. RHBAs are not filtered by
+    keywords, the most expensive analysis, unless some views of RHBAs are
+    needed.
+
+    :return: A :class:`LazyDict` object
+    """
+    rhsa = [e for e in ers if e["advisory"][2] == 'S']
+    rhba = [e for e in ers if e["advisory"][2] == 'B']
+    rhea = [e for e in ers if e["advisory"][2] == 'E']
+
+    def _rhsa():
+        return _lazy_cvss_views(analyze_rhsa(rhsa), rhsa, score)
+
+    def _rhba():
+        return _lazy_cvss_views(analyze_rhba(rhba, keywords=keywords,
+                                             pkeywords=pkeywords,
+                                             core_rpms=core_rpms,
+                                             kwcache=kwcache), rhba, score)
+
+    def _rhea():
+        return dict(list=rhea, list_by_packages=list_update_errata_pairs(rhea))
+
+    return LazyDict(dict(rhsa=_rhsa, rhba=_rhba, rhea=_rhea),
+                    rate_by_type=[("Security", len(rhsa)),
+                                  ("Bug", len(rhba)),
+                                  ("Enhancement", len(rhea))])
+
+
 def analyze_errata(ers, score=fleure.globals.CVSS_MIN_SCORE,
                    keywords=fleure.globals.ERRATA_KEYWORDS,
-                   pkeywords=None, core_rpms=fleure.globals.CORE_RPMS):
+                   pkeywords=None, core_rpms=fleure.globals.CORE_RPMS,
+                   kwcache=None):
     """
     :param ers: A list of applicable errata sorted by severity
         if it's RHSA and advisory in ascending sequence
@@ -325,35 +433,12 @@ def analyze_errata(ers, score=fleure.globals.CVSS_MIN_SCORE,
     :param keywords: A tuple of keywords to filter 'important' RHBAs
     :param pkeywords: Similar to above but a dict gives the list per RPMs
     :param core_rpms: Core RPMs to filter errata by them
+    :param kwcache: A dict to cache keywords matched, see
+        :func:`errata_of_keywords_g`
     """
-    rhsa = [e for e in ers if e["advisory"][2] == 'S']
-    rhba = [e for e in ers if e["advisory"][2] == 'B']
-    rhea = [e for e in ers if e["advisory"][2] == 'E']
-
-    rhsa_data = analyze_rhsa(rhsa)
-    rhba_data = analyze_rhba(rhba, keywords=keywords, pkeywords=pkeywords,
-                             core_rpms=core_rpms)
-    if score > 0:
-        rhba_by_score = list(higher_score_cve_errata_g(rhba, score))
-        us_of_rhba_by_score = list_updates_from_errata(rhba_by_score)
-    else:
-        rhsa_by_score = []
-        rhba_by_score = []
-        us_of_rhsa_by_score = []
-        us_of_rhba_by_score = []
-
-    rhsa_data["list_higher_cvss_score"] = rhsa_by_score
-    rhba_data["list_higher_cvss_score"] = rhba_by_score
-    rhsa_data["list_higher_cvss_updates"] = us_of_rhsa_by_score
-    rhba_data["list_higher_cvss_updates"] = us_of_rhba_by_score
-
-    return dict(rhsa=rhsa_data,
-                rhba=rhba_data,
-                rhea=dict(list=rhea,
-                          list_by_packages=list_update_errata_pairs(rhea)),
-                rate_by_type=[("Security", len(rhsa)),
-                              ("Bug", len(rhba)),
-                              ("Enhancement", len(rhea))])
+    return analyze_errata_lazy(ers, score=score, keywords=keywords,
+                               pkeywords=pkeywords, core_rpms=core_rpms,
+                               kwcache=kwcache).materialize()
 
 
 def padding_row(row, mcols):
@@ -17,18 +17,41 @@ from __future__ import absolute_import
 import logging
 import os.path
 import os
+import shutil
+import sys
+import tarfile
 import tempfile
 import uuid
 import zipfile
 
 import fleure.globals
+import fleure.scheduler
 import fleure.utils
 
 from fleure.globals import _
 
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 LOG = logging.getLogger(__name__)
 
+ARCHIVE_FORMATS = ("zip", "tar.zst", "tar.xz")
+
+# zipfile.ZipFile supports compresslevel in python >= 3.7.
+ZIP_HAS_LEVEL = sys.version_info >= (3, 7)
+
+# Members already compressed and not worth compressing again.
+COMPRESSED_EXTS = (".xlsx", ".zip", ".gz", ".bz2", ".xz", ".zst", ".parquet",
+                   ".png", ".jpg", ".svgz")
+
 
 def _is_link(filepath):
     """
@@ -89,37 +112,100 @@ def _remove_if_bad_file(filepath, prefix=None):
     return None
 
 
-def safe_untar(arcfile, destdir, files=None):
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+# Errors raised on broken or unsupported archives.
+_TAR_ERRORS = (tarfile.TarError, EOFError, IOError, OSError, ValueError) + \
+    ((lzma.LZMAError, ) if lzma is not None else ()) + \
+    ((zstandard.ZstdError, ) if zstandard is not None else ())
+
+
+def _open_tar_stream(fileobj):
     """
-    Extract tar archive file safely, with avoiding dir traversal attack
-    attempts, for example.
+    :param fileobj: File object of a tar archive, may be compressed with gzip,
+        bzip2, xz or zstd
+    :return: A :class:`tarfile.TarFile` object to read members in order
+    """
+    magic = fileobj.read(6)
+    fileobj.seek(0)
 
-    .. note::
-       :mod:`tarfile` cannot be used here as it does not support tar+xz files.
+    if magic.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstandard module is not available")
+        dctx = zstandard.ZstdDecompressor()
+        return tarfile.open(fileobj=dctx.stream_reader(fileobj), mode="r|")
+
+    if magic.startswith(XZ_MAGIC):
+        if lzma is None:
+            raise ValueError("lzma module is not available")
+        return tarfile.open(fileobj=lzma.LZMAFile(fileobj), mode="r|")
+
+    return tarfile.open(fileobj=fileobj, mode="r|*")  # gzip, bzip2 or none
+
+
+def _extract_member(tar, member, path):
+    """
+    Write the content of a regular file `member` to `path`, not following
+    symlinks may exist at `path`.
+    """
+    if os.path.lexists(path):
+        os.remove(path)
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+    with os.fdopen(os.open(path, flags, member.mode & 0o644 | 0o600),
+                   'wb') as out:
+        shutil.copyfileobj(tar.extractfile(member), out, 1024 * 1024)
+
+    os.utime(path, (member.mtime, member.mtime))
+
+
+def _decode(msg):
+    """
+    :param msg: Error message from subprocesses may be bytes or None
+    :return: Error message decoded or None
+    """
+    if isinstance(msg, bytes):
+        return msg.decode("utf-8", "replace").strip()
+    return msg
+
+
+def _untar_by_tar(arcfile, destdir, files=None):
+    """
+    Extract tar archive file safely with tar command, used for tar+xz files
+    :mod:`lzma` is not available to read, e.g. in python 2.
 
     :param arcfile: Tar file path
     :param destdir: Destination dir to extract files from `arcfile` to
-    :param files:
-        A list of files to extract. All files looks safe will be extracted if
-        it's None.
+    :param files: See :func:`safe_untar`
 
     :return: A list of error messages if something goes wrong or []
     """
     cmd_s = "tar --list -f " + arcfile
     (rcode, out, err) = fleure.utils.subproc_call(cmd_s, timeout=30)
     if rcode != 0:
-        return [err or "Failed to list files in tar: %s" % arcfile]
-
+        return [_decode(err) or "Failed to list files in tar: %s" % arcfile]
+
+    # Members are matched with `files` by normalized paths, e.g. './a/b' and
+    # 'a/b', same as :func:`safe_untar`.
+    members = dict((os.path.normpath(f), f) for f
+                   in out.decode('utf-8').splitlines()
+                   if not _is_bad_path(f) and not f.endswith('/') and
+                   os.path.normpath(f).split(os.path.sep)[0] != os.path.pardir)
     if files is None:
-        files = [f for f in out.decode('utf-8').splitlines()
-                 if not _is_bad_path(f)]
+        files = sorted(members)
 
     errors = []
-    for filepath in files:
-        cmd_s = "tar --get -C {}/ -f {} {}".format(destdir, arcfile, filepath)
+    for filepath in (os.path.normpath(f) for f in files):
+        if filepath not in members:
+            LOG.debug(_("Not found in %s: %s"), arcfile, filepath)
+            continue
+
+        cmd_s = "tar --get -C {}/ -f {} {}".format(destdir, arcfile,
+                                                   members[filepath])
         (rcode, out, err) = fleure.utils.subproc_call(cmd_s, timeout=60)
         if rcode != 0:
-            err = err or "Failed to extract from " + arcfile
+            err = _decode(err) or "Failed to extract from " + arcfile
             errors.append(err + ": " + filepath)
             continue
 
@@ -131,6 +217,86 @@ def safe_untar(arcfile, destdir, files=None):
     return errors
 
 
+def safe_untar(arcfile, destdir, files=None):
+    """
+    Extract tar archive file safely, with avoiding dir traversal attack
+    attempts, for example.
+
+    The archive is read and decompressed only once as a stream, and members
+    are checked as they come: members of bad paths, links and special files
+    are skipped and only regular files wanted are written, and reading stops
+    once all of `files` were extracted.
+
+    Tar+xz files are extracted with tar command instead if :mod:`lzma` is
+    not available, see :func:`_untar_by_tar`.
+
+    :param arcfile: Tar file path, may be compressed with gzip, bzip2, xz or
+        zstd
+    :param destdir: Destination dir to extract files from `arcfile` to
+    :param files:
+        A list of files to extract. All files looks safe will be extracted if
+        it's None.
+
+    :return: A list of error messages if something goes wrong or []
+    """
+    wanted = None
+    if files is not None:
+        wanted = set(os.path.normpath(f) for f in files)
+
+    destdir = os.path.realpath(destdir)
+    errors = []
+    try:
+        with open(arcfile, 'rb') as inp:
+            if lzma is None and inp.read(6).startswith(XZ_MAGIC):
+                return _untar_by_tar(arcfile, destdir, files)
+
+            inp.seek(0)
+            tar = _open_tar_stream(inp)
+            try:
+                for member in tar:
+                    filepath = os.path.normpath(member.name)
+                    if wanted is not None and filepath not in wanted:
+                        continue
+
+                    if member.isdir():
+                        continue
+
+                    if _is_bad_path(member.name) or \
+                            filepath.split(os.path.sep)[0] == os.path.pardir:
+                        errors.append("Skip as bad path: " + member.name)
+                        continue
+
+                    if not member.isfile():
+                        errors.append("Skip as a link or special file: " +
+                                      member.name)
+                        continue
+
+                    path = os.path.join(destdir, filepath)
+                    pdir = os.path.dirname(path)
+                    if _is_bad_path(os.path.realpath(pdir), destdir):
+                        errors.append("Skip as refering unexpected path: " +
+                                      member.name)
+                        continue
+                    if not os.path.exists(pdir):
+                        os.makedirs(pdir)
+
+                    _extract_member(tar, member, path)
+                    if wanted is not None:
+                        wanted.discard(filepath)
+                        if not wanted:
+                            break  # Not read the rest.
+            finally:
+                tar.close()
+    except _TAR_ERRORS as exc:
+        return errors + ["Failed to extract from %s: %s" % (arcfile, exc)]
+
+    if wanted:
+        LOG.debug(_("Not found in %s: %s"), arcfile,
+                  ", ".join(sorted(wanted)))
+
+    return errors
+
+
 def safe_unzip(arcfile, destdir, files=None):
     """
     Extract zip file safely similar to :func:`safe_untar`.
@@ -179,8 +345,7 @@ def _exract_fnc(maybe_arc_path):
     if maybe_arc_path.endswith(".zip"):
         return safe_unzip
 
-    # TBD: re.match(r".tar.(?:gz|bz2|xz)$", maybe_arc_path):
-    return safe_untar
+    return safe_untar  # tar.gz, tar.bz2, tar.xz or tar.zst
 
 
 def extract_rpmdb_archive(arc_path, root=None):
@@ -218,26 +383,150 @@ def extract_rpmdb_archive(arc_path, root=None):
     return (root, _exract_fnc(arc_path)(arc_path, root, files))
 
 
+def archive_filename(name=None, fmt="zip"):
+    """
+    :param name: Name of the archive, e.g. host ID, or None (random UUID)
+    :param fmt: Archive format, see :data:`ARCHIVE_FORMATS`
+    :return: Archive filename
+
+    >>> archive_filename("host-a", "tar.zst")
+    'report-host-a.tar.zst'
+    """
+    if name is None:
+        name = str(uuid.uuid4())
+
+    return "report-%s.%s" % (name, fmt)
+
+
+def _is_compressed(filename):
+    """
+    >>> _is_compressed("errata_summary.xlsx"), _is_compressed("errata.json")
+    (True, False)
+    """
+    return filename.endswith(COMPRESSED_EXTS)
+
+
+def _archive_zip(output, members, level=None):
+    """
+    Make a zip archive. Already compressed members are stored as they are.
+
+    :param output: Output archive path
+    :param members: A list of tuples of (file path, name in the archive)
+    :param level: Compression level (0 - 9) or None (default)
+    """
+    kwargs = dict()
+    if level is not None:
+        if ZIP_HAS_LEVEL:
+            kwargs["compresslevel"] = level
+        else:
+            LOG.warning(_("Compression level of zip is not supported in "
+                          "python < 3.7 and ignored: %d"), level)
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, **kwargs) as zipf:
+        for path, arcname in members:
+            ctype = (zipfile.ZIP_STORED if _is_compressed(path) else
+                     zipfile.ZIP_DEFLATED)
+            zipf.write(path, arcname=arcname, compress_type=ctype)
+
+
+def _compressed_stream(fileobj, fmt, level=None):
+    """
+    :param fileobj: File object to write compressed data into
+    :param fmt: Archive format, "tar.zst" or "tar.xz"
+    :param level: Compression level or None (default)
+    :return: Writable file object to compress data written into `fileobj`
+    """
+    if fmt == "tar.zst":
+        if zstandard is None:
+            raise ValueError("zstandard module is not available")
+        cctx = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return cctx.stream_writer(fileobj)
+
+    if lzma is None:
+        raise ValueError("lzma module is not available")
+
+    return lzma.LZMAFile(fileobj, 'wb', preset=6 if level is None else level)
+
+
+def _archive_tar(output, members, fmt, level=None):
+    """
+    Make a tar archive compressed as a stream, i.e. members are read and
+    compressed block by block and nothing but a block is kept in memory.
+
+    Zstandard stores incompressible blocks of already compressed members
+    as raw blocks and does not spend much time on them.
+
+    :param output: Output archive path
+    :param members: A list of tuples of (file path, name in the archive)
+    :param fmt: Archive format, "tar.zst" or "tar.xz"
+    :param level: Compression level or None (default)
+    """
+    with open(output, 'wb') as out:
+        stream = _compressed_stream(out, fmt, level)
+        try:
+            # Follow symlinks to the results of reference hosts.
+            tar = tarfile.open(fileobj=stream, mode="w|", dereference=True)
+            try:
+                for path, arcname in members:
+                    tar.add(path, arcname=arcname)
+            finally:
+                tar.close()
+        finally:
+            stream.close()
+
+
 def archive_report(resultsdir, output=None,
-                   filenames=fleure.globals.REPORT_FILES):
+                   filenames=fleure.globals.REPORT_FILES, fmt="zip",
+                   level=None):
     """
-    Archive analysis results (.xls files).
+    Archive analysis results (.xlsx files).
 
     :param resultsdir: Dir in which results are
     :param output: Archive filename
     :param filenames: Name of files will be archived into the output file
+    :param fmt: Archive format, see :data:`ARCHIVE_FORMATS`
+    :param level: Compression level or None (default of each format)
+
+    :return: Path of the archive made
     """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError("Unknown archive format: %s" % fmt)
+
     if output is None:
-        output = "report-%s.zip" % str(uuid.uuid4())
+        output = archive_filename(fmt=fmt)
 
     output = os.path.join(resultsdir, output)
-    topdir = os.path.basename(resultsdir)
+    topdir = os.path.basename(os.path.normpath(resultsdir))
+    members = [(os.path.join(resultsdir, fn), os.path.join(topdir, fn))
+               for fn in filenames]
 
-    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for filename in filenames:
-            zipf.write(os.path.join(resultsdir, filename),
-                       arcname=os.path.join(topdir, filename))
+    if fmt == "zip":
+        _archive_zip(output, members, level)
+    else:
+        _archive_tar(output, members, fmt, level)
 
     return output
 
+
+def archive_reports(resultsdirs, outputs=None,
+                    filenames=fleure.globals.REPORT_FILES, fmt="zip",
+                    level=None, workers=None):
+    """
+    Archive analysis results of hosts in parallel. Compressors release the
+    GIL so that archives are made on multiple cores with threads.
+
+    :param resultsdirs: A list of dirs in which results are
+    :param outputs: A list of archive filenames or None
+    :param workers: Max number of workers or None (number of CPUs)
+    :param filenames, fmt, level: See :func:`archive_report`
+
+    :return: A list of paths of the archives made
+    """
+    if outputs is None:
+        outputs = [None] * len(resultsdirs)
+
+    tasks = [((rdir, out, filenames, fmt, level), {}) for rdir, out
+             in zip(resultsdirs, outputs)]
+    return fleure.scheduler.run_tasks(archive_report, tasks, workers)
+
 # vim:sw=4:ts=4:et:
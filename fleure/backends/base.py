@@ -87,6 +87,12 @@ class Base(object):
                 if fleure.rpmutils.check_rpmdb_root(self.root, readonly=True):
                     self.populate()
 
+    def close(self):
+        """Release resources, e.g. lists of packages and errata cached.
+        """
+        self._packages = collections.defaultdict(list)
+        self._populated = False
+
     def _make_list_of(self, item, process_fns=None):
         """placeholder.
 
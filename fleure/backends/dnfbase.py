@@ -279,6 +279,15 @@ class Base(fleure.backends.base.Base):
 
         return objs
 
+    def close(self):
+        """Release the sack, repo metadata and packages loaded.
+        """
+        super(Base, self).close()
+        self._hpackages = collections.defaultdict(list)
+        if self.base is not None:
+            self.base.close()
+            self.base = None
+
     def configure(self):
         """Configure repos, etc.
         """
@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Content-addressed storage of report artifacts.
+
+Result files of hosts, .xlsx, .json, .dot, .svg and so on, are stored once
+in a store keyed by SHA-256 digests of their content, and replaced with
+links to the objects in the store. Each host's working dir has a manifest,
+{relative path: {digest, size}}, points into the store, so that identical
+outputs of any hosts cost disk space only once.
+"""
+from __future__ import absolute_import
+
+import fnmatch
+import hashlib
+import logging
+import os.path
+import os
+import shutil
+import stat
+
+import fleure.utils
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+PATTERNS = ("*.xlsx", "*.xls", "*.json", "*.json.gz", "*.json.zst",
+            "*.jsonl", "*.csv", "*.parquet", "*.arrow", "*.dot", "*.svg",
+            "*.html", "*.css", "*.js")
+EXCLUDES = (MANIFEST, "metadata.json*", "refindex.json")  # Host specific.
+CHUNK_SIZE = 1024 * 1024
+
+
+def digest_of(filepath):
+    """
+    :param filepath: File path
+    :return: SHA-256 hex digest of the content of the file
+    """
+    hsh = hashlib.sha256()
+    with open(filepath, 'rb') as inp:
+        for chunk in iter(lambda: inp.read(CHUNK_SIZE), b''):
+            hsh.update(chunk)
+
+    return hsh.hexdigest()
+
+
+def _link(src, dst):
+    """
+    Make a hard link, or a symlink if a hard link cannot be made, e.g. src
+    and dst are in different file systems.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+
+
+class Store(object):
+    """Content-addressed object store.
+    """
+    def __init__(self, topdir):
+        """
+        :param topdir: Top dir of the store
+        """
+        self.topdir = topdir
+        self.objdir = os.path.join(topdir, "objects")
+        if not os.path.exists(self.objdir):
+            os.makedirs(self.objdir)
+
+    def path_of(self, digest):
+        """
+        :param digest: SHA-256 hex digest
+        :return: Path of the object
+        """
+        return os.path.join(self.objdir, digest[:2], digest[2:])
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path_of(digest))
+
+    def put(self, filepath):
+        """
+        Store a file and replace it with a link to the object in the store.
+
+        :param filepath: File path
+        :return: A tuple of (digest, True if it's new object)
+        """
+        digest = digest_of(filepath)
+        objpath = self.path_of(digest)
+        new = not os.path.exists(objpath)
+        if new:
+            odir = os.path.dirname(objpath)
+            if not os.path.exists(odir):
+                os.makedirs(odir)
+            try:
+                os.rename(filepath, objpath)  # Atomic and no copies.
+            except OSError:
+                shutil.copy2(filepath, objpath)
+                os.remove(filepath)
+            os.chmod(objpath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        else:
+            os.remove(filepath)
+
+        _link(objpath, filepath)
+        return (digest, new)
+
+    def link(self, digest, filepath):
+        """
+        Make a link to the object.
+
+        :param digest: SHA-256 hex digest of the object
+        :param filepath: Path of the link
+        """
+        if os.path.lexists(filepath):
+            os.remove(filepath)
+
+        _link(self.path_of(digest), filepath)
+
+
+def _files_g(workdir, patterns=PATTERNS, excludes=EXCLUDES):
+    """
+    :param workdir: Working dir of a host
+    :return: A generator yields relative paths of result files in `workdir`
+    """
+    for dirpath, dirnames, filenames in os.walk(workdir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for fname in sorted(filenames):
+            if any(fnmatch.fnmatch(fname, p) for p in excludes):
+                continue
+            if any(fnmatch.fnmatch(fname, p) for p in patterns):
+                yield os.path.relpath(os.path.join(dirpath, fname), workdir)
+
+
+def load_manifest(workdir):
+    """
+    :param workdir: Working dir of a host
+    :return: Manifest, {relative path: {digest, size}}, or None
+    """
+    path = os.path.join(workdir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+
+    return fleure.utils.json_load(path)
+
+
+def store_results(workdir, topdir, patterns=PATTERNS):
+    """
+    Store result files in the store and save the manifest.
+
+    :param workdir: Working dir of a host
+    :param topdir: Top dir of the store
+    :param patterns: File name patterns of result files to store
+    :return: Manifest, {relative path: {digest, size}}
+    """
+    store = Store(topdir)
+    (manifest, nnew, size) = (dict(), 0, 0)
+    for relpath in _files_g(workdir, patterns):
+        path = os.path.join(workdir, relpath)
+        if os.path.islink(path):
+            continue  # Linked already.
+
+        fsize = os.path.getsize(path)
+        (digest, new) = store.put(path)
+        manifest[relpath] = dict(digest=digest, size=fsize)
+        if new:
+            (nnew, size) = (nnew + 1, size + fsize)
+
+    fleure.utils.json_dump(manifest, os.path.join(workdir, MANIFEST))
+    LOG.info(_("Stored %d files (new: %d, %d bytes) of %s in %s"),
+             len(manifest), nnew, size, workdir, topdir)
+    return manifest
+
+
+def link_results(manifest, topdir, workdir):
+    """
+    Make links to objects in the store listed in the manifest of other host.
+
+    :param manifest: Manifest of other host, see :func:`store_results`
+    :param topdir: Top dir of the store
+    :param workdir: Working dir of the host
+    """
+    store = Store(topdir)
+    for relpath, info in manifest.items():
+        path = os.path.join(workdir, relpath)
+        pdir = os.path.dirname(path)
+        if not os.path.exists(pdir):
+            os.makedirs(pdir)
+        store.link(info["digest"], path)
+
+    fleure.utils.json_dump(manifest, os.path.join(workdir, MANIFEST))
+
+
+def unlink_results(workdir):
+    """
+    Remove links to objects in the store listed in the manifest, to avoid
+    modifying objects by writing results into the working dir again.
+
+    :param workdir: Working dir of a host
+    """
+    manifest = load_manifest(workdir)
+    if manifest is None:
+        return
+
+    for relpath in manifest:
+        path = os.path.join(workdir, relpath)
+        if os.path.lexists(path):
+            os.remove(path)
+
+    os.remove(os.path.join(workdir, MANIFEST))
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,211 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Checkpoints of multihost runs to resume them.
+
+States of hosts processed are appended into <workdir>/checkpoint.jsonl, a
+line of JSON per host, with keys of their inputs:
+
+- input: SHA-256 digest of the RPM DB archive or files of the host
+- config: SHA-256 digest of options affect results
+- repos: Repos of the host and snapshot: SHA-256 digest of the repo metadata
+  (repomd.xml) of them in the cache dir
+
+A re-run skips hosts done with same keys, without extracting and preparing
+them again, and processes only hosts failed, new or changed. The last line
+of a host wins, and a line broken as the run died is ignored.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os.path
+import os
+
+import fleure.globals
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+DONE = "done"
+FAILED = "failed"
+
+# Options not affect results of hosts.
+IGNORED_OPTIONS = ("hid", "workdir", "cachedir", "conf_path", "backends",
+                   "workers", "multiproc", "spool", "verbosity", "archive",
+                   "archive_format", "archive_level", "resume", "pipeline",
+                   "low_memory", "worker_max_tasks", "worker_max_rss")
+
+
+def _update_with_file(hsh, path, bufsize=1024 * 1024):
+    """Update a hash object `hsh` with the content of `path`."""
+    with open(path, "rb") as inp:
+        while True:
+            buf = inp.read(bufsize)
+            if not buf:
+                break
+            hsh.update(buf)
+
+
+def input_hash(path):
+    """
+    :param path: Path to the RPM DB archive of a host or the root dir of RPM
+        DB files of the host
+    :return: SHA-256 hex digest of the archive or the RPM DB files
+    """
+    hsh = hashlib.sha256()
+    if not os.path.isdir(path):
+        _update_with_file(hsh, path)
+        return hsh.hexdigest()
+
+    for fname in fleure.globals.RPMDB_FILENAMES:
+        fpath = os.path.join(path, fleure.globals.RPMDB_SUBDIR, fname)
+        if os.path.exists(fpath):
+            hsh.update(fname.encode("utf-8") + b"\n")
+            _update_with_file(hsh, fpath)
+
+    return hsh.hexdigest()
+
+
+def config_hash(options):
+    """
+    :param options: A dict of options
+    :return: SHA-256 hex digest of `options` affect results
+
+    >>> config_hash(dict(a=1, workers=4)) == config_hash(dict(a=1))
+    True
+    >>> config_hash(dict(a=1)) == config_hash(dict(a=2))
+    False
+    """
+    opts = dict((k, v) for k, v in options.items()
+                if k not in IGNORED_OPTIONS)
+    data = json.dumps(opts, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def repos_snapshot(cachedir, repos):
+    """
+    :param cachedir: Cache dir of repo metadata
+    :param repos: A list of repos
+    :return: SHA-256 hex digest of the repos and their metadata in
+        `cachedir`, changes if the metadata were refreshed
+    """
+    hsh = hashlib.sha256()
+    for repo in sorted(repos):
+        hsh.update(repo.encode("utf-8") + b"\n")
+
+    if not cachedir or not os.path.isdir(cachedir):
+        return hsh.hexdigest()
+
+    for subdir in sorted(os.listdir(cachedir)):
+        if not any(subdir.startswith(r) for r in repos):
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(os.path.join(cachedir,
+                                                                 subdir)):
+            dirnames.sort()
+            if "repomd.xml" in filenames:
+                _update_with_file(hsh, os.path.join(dirpath, "repomd.xml"))
+
+    return hsh.hexdigest()
+
+
+class Checkpoint(object):
+    """States of hosts processed in multihost runs.
+    """
+    def __init__(self, workdir, options, cachedir=None):
+        """
+        :param workdir: Working dir of the multihost run
+        :param options: A dict of options of the run
+        :param cachedir: Cache dir of repo metadata shared among hosts
+        """
+        self.path = os.path.join(workdir, CHECKPOINT_FILE)
+        self.config = config_hash(options)
+        self.cachedir = cachedir
+        self.states = dict()  # {hid: state}
+        self._snapshots = dict()  # {repos: snapshot} of the previous run
+        self._csnapshots = dict()  # {repos: snapshot} of this run
+        self._sep = ""
+
+        if os.path.exists(self.path):
+            self.load()
+
+    def _snapshot(self, repos, cache):
+        """Get the snapshot of `repos` and cache it."""
+        key = tuple(repos)
+        if key not in cache:
+            cache[key] = repos_snapshot(self.cachedir, repos)
+        return cache[key]
+
+    def is_done(self, hid, digest):
+        """
+        :param hid: Host ID
+        :param digest: Input hash of the host, see :func:`input_hash`
+        :return: True if the host was done with the same inputs
+        """
+        state = self.states.get(hid)
+        if not state or state.get("status") != DONE:
+            return False
+
+        return (state.get("input") == digest and
+                state.get("config") == self.config and
+                state.get("snapshot") == self._snapshot(state["repos"],
+                                                        self._snapshots))
+
+    def load(self):
+        """Load states recorded in previous runs.
+        """
+        with open(self.path) as inp:
+            for line in inp:
+                if not line.endswith("\n"):  # Terminate it before appending.
+                    self._sep = "\n"
+                try:
+                    state = json.loads(line)
+                except ValueError:  # Broken as the run died while writing.
+                    continue
+                self.states[state["hid"]] = state
+
+    def _append(self, state):
+        """Append a state and flush it to the disk at once."""
+        with open(self.path, 'a') as out:
+            out.write(self._sep + json.dumps(state, sort_keys=True) + "\n")
+            self._sep = ""
+            out.flush()
+            os.fsync(out.fileno())
+
+    def mark(self, host, done=True):
+        """
+        Record the state of a host processed.
+
+        :param host: A :class:`~fleure.config.Host` object processed, its
+            input hash must be set as `input_hash` attribute
+        :param done: True if it was done or False if failed
+        """
+        self.record(host.hid, done, getattr(host, "input_hash", None),
+                    host.repos)
+
+    def record(self, hid, done=True, digest=None, repos=None):
+        """
+        Record the state of a host, may be failed before configured.
+
+        :param hid: Host ID
+        :param done: True if it was done or False if failed
+        :param digest: Input hash of the host, see :func:`input_hash`
+        :param repos: A list of repos of the host or None
+        """
+        repos = list(repos or [])
+        state = dict(hid=hid, status=DONE if done else FAILED,
+                     input=digest, config=self.config, repos=repos,
+                     snapshot=self._snapshot(repos, self._csnapshots))
+        self.states[hid] = state
+        self._append(state)
+        if not done:
+            LOG.debug(_("%s: Recorded as failed"), hid)
+
+# vim:sw=4:ts=4:et:
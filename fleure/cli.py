@@ -19,10 +19,16 @@ import os.path
 import re
 import sys
 
+import fleure.archive
 import fleure.globals
 import fleure.config
+import fleure.dates
+import fleure.export
+import fleure.jsonio
 import fleure.main
 import fleure.multihosts
+import fleure.reports
+import fleure.watch
 
 
 LOG = logging.getLogger(__name__)
@@ -36,13 +42,26 @@ def period_type(period_s):
     :param period_s:
         A string represents date period such as
         "YYYY[-MM[-DD]][,YYYY[-MM[-DD]]]", ex. '2014-10-01,2014-12-31',
-        '2014-01-01'.
+        '2014-01-01', periods separated with ';', ex.
+        '2014-01,2014-03;2014-04,2014-06', or name of periods to make
+        automatically, 'monthly' or 'quarterly'.
 
     .. seealso:: :func:`period_to_dates` and its friends in fleure.dates
+
+    >>> period_type("2014-01,2014-03;2014-04")
+    [['2014-01', '2014-03'], ['2014-04']]
+    >>> period_type("monthly")
+    'monthly'
     """
     if not period_s:
         return []
 
+    if period_s in fleure.dates.PERIOD_BUCKETS:
+        return period_s
+
+    if ';' in period_s:
+        return [period_type(p.strip()) for p in period_s.split(';')]
+
     reg = r"^((\d{4})(?:.(\d{2})(?:.(\d{2}))?))?$"
     if ',' in period_s:
         (start, end) = period_s.split(',')
@@ -102,9 +121,13 @@ def parse_args(argv):
     add_arg("-A", "--archive", action="store_true",
             help="Archive report files generated")
     add_arg("-M", "--multihost", action="store_true", help="Multihost mode")
-    # ..note:: Disabled until issue of yum vs. multiprocessing module is fixed.
-    # add_arg("-M", "--multiproc", action="store_true",
-    #         help="Specify this option to analyze data in parallel")
+    add_arg("--watch", action="store_true",
+            help="Watch the data dir and analyze hosts whose RPM DB "
+                 "archives are new or changed continuously in multihost "
+                 "mode")
+    add_arg("-P", "--multiproc", action="store_true",
+            help="Analyze hosts in parallel with processes in multihost "
+                 "mode")
     add_arg("-B", "--backend", choices=tuple(backends.keys()),
             help="Specify backend to get updates and errata. Choices: "
                  "%s [%s]" % (', '.join(backends.keys()), defaults["backend"]))
@@ -128,11 +151,81 @@ def parse_args(argv):
             help="Period to filter errata in format of "
                  "YYYY[-MM[-DD]][,YYYY[-MM[-DD]]], ex. "
                  "'2014-10-01,2014-12-31', '2014-01-01'. If end date is "
-                 "omitted, Today will be used instead")
+                 "omitted, Today will be used instead. Multiple periods "
+                 "can be given separated with ';', and 'monthly' or "
+                 "'quarterly' makes periods from errata automatically")
     add_arg("-C", "--cachedir",
             help="Specify yum repo metadata cachedir [root/var/cache]")
-    add_arg("-R", "--refdir",
-            help="Output 'delta' result compared to the data in this dir")
+    add_arg("-R", "--refdir", action="append",
+            help="Output 'delta' result compared to the data in this dir. "
+                 "It can be given multiple times to compute deltas against "
+                 "multiple reference data at once.")
+    add_arg("--cvedb",
+            help="CVE database made from CVE feed files with 'python -m "
+                 "fleure.cvedb' to lookup CVSS data without network access")
+    add_arg("--offline", action="store_true",
+            help="Do not try to get CVSS data from the network")
+    add_arg("--export", dest="exports", action="append",
+            choices=fleure.export.FORMATS,
+            help="Export lists of errata, updates and packages in this "
+                 "format also. It can be given multiple times. Choices: "
+                 "%s" % ", ".join(fleure.export.FORMATS))
+    add_arg("--compress", choices=tuple(fleure.jsonio.COMPRESSIONS.keys()),
+            help="Compress JSON files of results with gzip or zstd")
+    add_arg("--fleetdb",
+            help="Save results of hosts also into this SQLite database to "
+                 "query fleet-wide results")
+    add_arg("--fleet-index", dest="fleetidx",
+            help="Add hosts also into this fleet index of bitmaps of hosts "
+                 "per advisory and package to count and list hosts "
+                 "affected with 'python -m fleure.fleetidx' quickly")
+    add_arg("--castore",
+            help="Keep result files in this content-addressed store and "
+                 "link to them from results dirs, to save identical files "
+                 "only once")
+    add_arg("--archive-format", choices=fleure.archive.ARCHIVE_FORMATS,
+            help="Format of report archives made with --archive. Choices: "
+                 "%s [%s]" % (", ".join(fleure.archive.ARCHIVE_FORMATS),
+                              defaults["archive_format"]))
+    add_arg("--archive-level", type=int,
+            help="Compression level of report archives, e.g. 0 - 9 for zip "
+                 "and xz, 1 - 22 for zstd [default of each format]")
+    add_arg("--report", dest="reports", action="append",
+            choices=fleure.reports.names(), metavar="NAME",
+            help="Make this report sheet or output only. It can be given "
+                 "multiple times. Choices: %s [all]"
+                 % ", ".join(fleure.reports.names()))
+    add_arg("--max-diffs", type=int,
+            help="Analyze hosts differ from some other host only by this "
+                 "number of newer RPMs or less incrementally from its "
+                 "results in multihost mode. 0 disables it [%(max_diffs)s]"
+                 % defaults)
+    add_arg("--spool",
+            help="Submit jobs of hosts into this spool dir shared with "
+                 "workers run with 'python -m fleure.spool <spool>' on "
+                 "this or other nodes, and wait for results in multihost "
+                 "mode")
+    add_arg("--pipeline", action="store_true",
+            help="Extract, prepare, analyze and archive hosts in stages "
+                 "run concurrently with bounded queues between them in "
+                 "multihost mode, not with --spool")
+    add_arg("--resume", action="store_true",
+            help="Record states of hosts processed and skip hosts done in "
+                 "previous runs with same RPM DBs, options and repo "
+                 "metadata in multihost mode")
+    add_arg("--low-memory", action="store_true",
+            help="Release backends of hosts as soon as possible and "
+                 "analyze hosts in parallel only if memory is enough for "
+                 "them in multihost mode")
+    add_arg("--worker-max-tasks", type=int,
+            help="Recycle worker processes after this number of hosts in "
+                 "multihost mode")
+    add_arg("--worker-max-rss", type=int,
+            help="Recycle worker processes once their RSS exceeded this "
+                 "MiB in multihost mode")
+    add_arg("-j", "--workers", type=int,
+            help="Max number of workers to run tasks in parallel [number of "
+                 "CPUs]")
     add_arg("-T", "--tpath", action="append", dest="tpaths",
             help="Specify additional template path one by one. These paths "
                  "will have higher priority than default paths. "
@@ -179,8 +272,12 @@ def main(argv=None):
 
     for key in ("workdir", "repos", "hid", "archive", "backend",
                 "cvss_min_score", "errata_keywords", "errata_pkeywords",
-                "core_rpms", "period", "cachedir", "refdir", "tpaths",
-                "verbosity"):
+                "core_rpms", "period", "cachedir", "refdir", "workers",
+                "cvedb", "offline", "exports", "compress", "fleetdb",
+                "fleetidx", "castore", "archive_format", "archive_level",
+                "reports", "multiproc", "max_diffs", "spool", "resume",
+                "pipeline", "low_memory", "worker_max_tasks",
+                "worker_max_rss", "tpaths", "verbosity"):
         val = getattr(args, key, None)
         if val is not None:
             cnf[key] = val  # CLI options > configs from file[s].
@@ -196,7 +293,10 @@ def main(argv=None):
                                      "to single host mode."))
         args.multihost = False
 
-    fnc = fleure.multihosts.main if args.multihost else fleure.main.main
+    if args.multihost:
+        fnc = fleure.watch.main if args.watch else fleure.multihosts.main
+    else:
+        fnc = fleure.main.main
     fnc(args.root_or_archive, **cnf)
 
 
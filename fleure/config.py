@@ -19,7 +19,10 @@ import anyconfig.utils
 
 import fleure.globals
 import fleure.archive
+import fleure.dedup
 import fleure.dates
+import fleure.export
+import fleure.jsonio
 import fleure.rpmutils
 import fleure.utils
 
@@ -61,6 +64,28 @@ DEFAULTS = dict(workdir=None,
                 period=None,
                 refdir=None,
                 archive=False,
+                archive_format="zip",
+                archive_level=None,
+                reports=None,
+                max_diffs=fleure.dedup.MAX_DIFFS,
+                spool=None,
+                resume=False,
+                pipeline=False,
+                low_memory=False,
+                worker_max_tasks=None,
+                worker_max_rss=None,
+                workers=None,
+                cvedb=None,
+                offline=False,
+                cve_timeout=10,
+                cve_rate=None,
+                cve_cache=None,
+                cve_cache_ttl=7 * 24 * 60 * 60,
+                exports=[],
+                compress=None,
+                fleetdb=None,
+                fleetidx=None,
+                castore=None,
                 defails=True,
                 rpmkeys=fleure.globals.RPM_KEYS)
 
@@ -133,9 +158,55 @@ class Host(dict):
 
             - cachedir: Dir to save cache files
             - period: Period to fetch and analyze data as a tuple of dates in
-              format of YYYY[-MM[-DD]], eg. ("2014-10-01", "2014-11-01").
+              format of YYYY[-MM[-DD]], eg. ("2014-10-01", "2014-11-01"), a
+              list of such periods, or "monthly" or "quarterly" to make
+              periods from issue dates of errata automatically.
             - refdir: A dir holding reference data previously generated to
-              compute delta, updates since that data generated.
+              compute delta, updates since that data generated, or a list of
+              such dirs.
+            - workers: Max number of workers to run tasks in parallel. Number
+              of CPUs will be used if None.
+            - cvedb: Path to the CVE database made from CVE feed files with
+              :func:`fleure.cvedb.import_feeds` to lookup CVSS data
+            - offline: Do not try to get CVSS data from the network
+            - cve_timeout: Timeout in seconds to fetch CVSS data of a CVE
+            - cve_rate: Max number of requests per second to fetch CVSS data
+              or None (unlimited)
+            - cve_cache: Path to the cache database of CVSS data fetched, it
+              will be <cachedir>/fleure_cves.db if None
+            - cve_cache_ttl: Time to live of CVSS data cached in seconds
+            - exports: A list of formats to export lists of results also, see
+              :data:`fleure.export.FORMATS`
+            - compress: Compression type of JSON files of results, 'gzip',
+              'zstd' or None (not compressed)
+            - fleetdb: Path to the fleet results database to save results
+              of hosts also, see :mod:`fleure.fleetdb`
+            - fleetidx: Path to the fleet index to add bitmaps of hosts per
+              advisory and package also, see :mod:`fleure.fleetidx`
+            - castore: Top dir of the content-addressed store to keep result
+              files of hosts once, see :mod:`fleure.cas`
+            - archive_format: Format of report archives, see
+              :data:`fleure.archive.ARCHIVE_FORMATS`
+            - archive_level: Compression level of report archives or None
+            - reports: A list of names of report sheets and outputs to make
+              or None (all), see :func:`fleure.reports.names`
+            - max_diffs: Max number of RPMs differ from some other host to
+              analyze hosts incrementally in multihost mode, see
+              :mod:`fleure.dedup`. 0 disables it.
+            - spool: Spool dir shared with workers to analyze hosts on
+              multiple nodes in multihost mode, see :mod:`fleure.spool`
+            - resume: Record states of hosts processed and skip hosts done in
+              previous runs with same inputs in multihost mode, see
+              :mod:`fleure.checkpoint`
+            - pipeline: Process hosts in the staged pipeline in multihost
+              mode, see :mod:`fleure.pipeline`
+            - low_memory: Release backends of hosts as soon as possible and
+              admit hosts to analyze only if memory is enough in multihost
+              mode
+            - worker_max_tasks: Recycle worker processes after this number
+              of hosts analyzed or None
+            - worker_max_rss: Recycle worker processes once their RSS
+              exceeded this MiB or None
         """
         if conf_path:
             conf_path = _normpath(conf_path)  # Workaround for anyconfig.
@@ -144,8 +215,7 @@ class Host(dict):
         cnf.update(kwargs)  # Override with kwargs may came from CLI options.
 
         # These parameters need some modifications:
-        if cnf["period"]:
-            cnf["period"] = fleure.dates.period_to_dates(*cnf["period"])
+        cnf["period"] = fleure.dates.normalize_periods(cnf["period"])
 
         super(Host, self).__init__(cnf)
 
@@ -244,20 +314,40 @@ class Host(dict):
                             cachedir=self.cachedir)
         return self.base
 
+    def release(self):
+        """
+        Release the backend and lists of errata and updates not needed any
+        more to save memory. Installed RPMs are kept to compare hosts, and
+        errata and updates are loaded from the files saved if needed later.
+        """
+        if self.base is not None:
+            self.base.close()
+            self.base = None
+
+        for key in ("errata", "updates"):
+            self.__dict__.pop(key, None)
+
     def save(self, obj, filename, savedir=None, **kwargs):
         """
         :param obj: Object to save
         :param filename: File base name to save
         :param savedir: Directory to save results
-        :param kwargs: Extra keyword arguments passed to anyconfig.dump
+        :param kwargs: Extra keyword arguments passed to
+            :func:`fleure.jsonio.dump`
         """
-        if anyconfig.utils.is_iterable(obj):
-            obj = dict(data=obj, )  # Top level data should be a dict.
-
         if savedir is None:
             savedir = self.workdir
 
-        filepath = os.path.join(savedir, "%s.json" % filename)
-        anyconfig.dump(obj, filepath, **kwargs)
+        if anyconfig.utils.is_iterable(obj):
+            if self.get("exports"):
+                obj = list(obj)  # It may be an iterator.
+                fleure.export.export(obj, filename, savedir, self.exports)
+
+            obj = dict(data=obj, )  # Top level data should be a dict.
+
+        filepath = os.path.join(savedir, "%s.json%s" %
+                                (filename,
+                                 fleure.jsonio.suffix(self.get("compress"))))
+        fleure.jsonio.dump(obj, filepath, **kwargs)
 
 # vim:sw=4:ts=4:et:
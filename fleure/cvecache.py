@@ -0,0 +1,244 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Persistent cache of CVE details (CVSS data) shared among hosts and runs.
+Pages fetched with their validators and the rate limit of requests are
+kept in it also to share them among processes, see :mod:`fleure.cvefetch`.
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+TTL = 7 * 24 * 60 * 60  # [sec]
+NEGATIVE_TTL = 24 * 60 * 60  # [sec]
+MAX_ENTRIES = 100000
+
+
+class CveCache(object):
+    """CVE details cache backed by an SQLite database. It keeps negative
+    results, CVEs have no CVSS data, also.
+
+    >>> cache = CveCache(":memory:")
+    >>> cache.update({"CVE-2017-0001": dict(cve="CVE-2017-0001", score="5.0"),
+    ...               "CVE-2017-0002": None})
+    >>> cache.lookup(["CVE-2017-0001", "CVE-2017-0002", "CVE-2017-0003"])
+    ... # doctest: +NORMALIZE_WHITESPACE
+    ({'CVE-2017-0001': {'cve': 'CVE-2017-0001', 'score': '5.0'},
+      'CVE-2017-0002': None}, ['CVE-2017-0003'])
+    >>> sorted(cache.stats().items())
+    [('evictions', 0), ('hits', 1), ('misses', 1), ('negative_hits', 1)]
+    """
+    def __init__(self, dbpath, ttl=TTL, negative_ttl=NEGATIVE_TTL,
+                 max_entries=MAX_ENTRIES):
+        """
+        :param dbpath: Path to the cache database file
+        :param ttl: Time to live of entries in seconds
+        :param negative_ttl: Time to live of negative entries in seconds
+        :param max_entries:
+            Max number of entries. Least recently used entries will be evicted
+            if the number of entries exceeds it.
+        """
+        self.dbpath = dbpath
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.counters = dict(hits=0, negative_hits=0, misses=0, evictions=0)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(dbpath, timeout=60,
+                                     check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cves "
+                           "(cve TEXT PRIMARY KEY, data TEXT, "
+                           " expires REAL, atime REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cves_atime "
+                           "ON cves (atime)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages "
+                           "(url TEXT PRIMARY KEY, body BLOB, etag TEXT, "
+                           " last_modified TEXT, atime REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_atime "
+                           "ON pages (atime)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS limits "
+                           "(name TEXT PRIMARY KEY, next REAL)")
+        self._conn.commit()
+
+    def lookup(self, cves):
+        """
+        :param cves: A list of CVE names
+        :return:
+            A tuple of ({cve: CVSS data or None (negative)}, [cve not found])
+        """
+        (found, missing) = (dict(), [])
+        now = time.time()
+        stmt = "SELECT data FROM cves WHERE cve = ? AND expires > ?"
+        with self._lock:
+            for cve in cves:
+                row = self._conn.execute(stmt, (cve, now)).fetchone()
+                if row is None:
+                    self.counters["misses"] += 1
+                    missing.append(cve)
+                    continue
+
+                if row[0] is None:
+                    self.counters["negative_hits"] += 1
+                    found[cve] = None
+                else:
+                    self.counters["hits"] += 1
+                    found[cve] = json.loads(row[0])
+
+            if found:
+                self._conn.executemany("UPDATE cves SET atime = ? "
+                                       "WHERE cve = ?",
+                                       [(now, c) for c in found])
+                self._conn.commit()
+
+        return (found, missing)
+
+    def get(self, cve, default=None):
+        """
+        :param cve: CVE name
+        :param default: Default value returned if not found or negative
+        :return: CVSS data of `cve` or `default`
+        """
+        return self.lookup([cve])[0].get(cve) or default
+
+    def update(self, dcves):
+        """
+        :param dcves: A dict, {cve: CVSS data or None (negative)}
+        """
+        now = time.time()
+        vals = [(cve, None if data is None else json.dumps(data),
+                 now + (self.negative_ttl if data is None else self.ttl),
+                 now) for cve, data in dcves.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO cves "
+                                   "VALUES (?, ?, ?, ?)", vals)
+            self._conn.commit()
+            self._evict(now)
+
+    def get_page(self, url):
+        """
+        :param url: URL of the page fetched
+        :return: A dict of the page, dict(body=, etag=, last_modified=), or
+            None if not found
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT body, etag, last_modified "
+                                     "FROM pages WHERE url = ?",
+                                     (url, )).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute("UPDATE pages SET atime = ? WHERE url = ?",
+                               (time.time(), url))
+            self._conn.commit()
+
+        return dict(body=bytes(row[0]), etag=row[1], last_modified=row[2])
+
+    def put_page(self, url, page):
+        """
+        Keep the page with its validators to revalidate it with conditional
+        requests later, see :class:`fleure.cvefetch.Fetcher`.
+
+        :param url: URL of the page fetched
+        :param page: A dict of the page, see :meth:`get_page`
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pages "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (url, sqlite3.Binary(page["body"]),
+                                page.get("etag"), page.get("last_modified"),
+                                now))
+            self._conn.commit()
+            self._evict(now)
+
+    def reserve(self, interval, name="fetch"):
+        """
+        Reserve the next time slot to make a request, shared among processes
+        use the same cache database, to limit the rate of requests of them
+        all, see :class:`fleure.cvefetch.RateLimiter`.
+
+        :param interval: Interval between requests in seconds
+        :param name: Name of the rate limit
+        :return: Seconds to wait until the slot reserved
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Lock it among processes.
+            try:
+                row = self._conn.execute("SELECT next FROM limits "
+                                         "WHERE name = ?",
+                                         (name, )).fetchone()
+                slot = max(now, row[0] if row else now)
+                self._conn.execute("INSERT OR REPLACE INTO limits "
+                                   "VALUES (?, ?)", (name, slot + interval))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+        return slot - now
+
+    def _evict(self, now):
+        """
+        Remove expired entries and least recently used ones if the number of
+        entries exceeds the max.
+        """
+        self._conn.execute("DELETE FROM cves WHERE expires <= ?", (now, ))
+        for table, key in (("cves", "cve"), ("pages", "url")):
+            nents = self._conn.execute("SELECT COUNT(*) FROM " +
+                                       table).fetchone()[0]
+            if nents > self.max_entries:
+                nexc = nents - self.max_entries
+                self._conn.execute("DELETE FROM {0} WHERE {1} IN "
+                                   "(SELECT {1} FROM {0} ORDER BY atime "
+                                   " LIMIT ?)".format(table, key), (nexc, ))
+                self.counters["evictions"] += nexc
+        self._conn.commit()
+
+    def stats(self):
+        """
+        :return: A dict of counters, hits, negative_hits, misses and evictions
+        """
+        return self.counters.copy()
+
+    def close(self):
+        """Close the cache database.
+        """
+        stats = sorted(self.stats().items())
+        LOG.info(_("CVE cache %s: %s"), self.dbpath,
+                 ", ".join("%s=%d" % kv for kv in stats))
+        self._conn.close()
+
+
+class Pages(object):
+    """Dict-like view of pages kept in :class:`CveCache` to pass it as the
+    cache of :class:`fleure.cvefetch.Fetcher`.
+    """
+    def __init__(self, cache):
+        """
+        :param cache: An instance of :class:`CveCache`
+        """
+        self.cache = cache
+
+    def get(self, url, default=None):
+        """
+        :return: A dict of the page, see :meth:`CveCache.get_page`
+        """
+        page = self.cache.get_page(url)
+        return default if page is None else page
+
+    def __setitem__(self, url, page):
+        self.cache.put_page(url, page)
+
+# vim:sw=4:ts=4:et:
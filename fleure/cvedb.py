@@ -0,0 +1,355 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Import CVE feed files stored locally into an indexed database and lookup
+CVSS data from it without accessing network.
+
+Supported feed formats:
+
+- NVD JSON feeds (1.1), e.g. nvdcve-1.1-2017.json.gz
+- NVD CVE API (2.0) JSON responses
+- CSAF (VEX) JSON documents, e.g. Red Hat's security data
+- OVAL XML definitions having <cve cvss2="..." cvss3="..."> elements, e.g.
+  Red Hat's OVAL v2 streams
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import bz2
+import contextlib
+import gzip
+import json
+import logging
+import os.path
+import os
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+
+import fleure.cveinfo
+
+
+LOG = logging.getLogger(__name__)
+
+CVE_KEYS = ("cve", "score", "metrics", "score_v3", "metrics_v3")
+NVD_URL_FMT = "https://nvd.nist.gov/vuln/detail/%s"
+
+
+def _open(path):
+    """
+    Open feed file may be compressed.
+
+    :param path: Feed file path
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    elif path.endswith(".bz2"):
+        return bz2.BZ2File(path, 'rb')
+
+    return open(path, 'rb')
+
+
+def _score_and_vector(data):
+    """
+    :param data: A dict contains CVSS data, baseScore and vectorString
+    :return: A tuple of (score :: float, vector :: str) or (None, None)
+
+    >>> _score_and_vector(dict(baseScore=5.0,
+    ...                        vectorString="AV:N/AC:L/Au:N/C:N/I:N/A:P"))
+    (5.0, 'AV:N/AC:L/Au:N/C:N/I:N/A:P')
+    >>> _score_and_vector(None)
+    (None, None)
+    """
+    if not data:
+        return (None, None)
+
+    return (data.get("baseScore"), data.get("vectorString"))
+
+
+def _first_cvss_data(metrics, keys):
+    """
+    :param metrics: NVD API 2.0 'metrics' dict
+    :param keys: Keys of metrics in order of preference
+    :return: 'cvssData' dict or None
+    """
+    for key in keys:
+        if metrics.get(key):
+            return metrics[key][0].get("cvssData")
+
+    return None
+
+
+def _nvd_1_1_g(data):
+    """
+    :param data: NVD JSON feed (1.1) data
+    :return: A generator yields tuples of CVE data in order of `CVE_KEYS`
+    """
+    for item in data.get("CVE_Items", []):
+        impact = item.get("impact", {})
+        v2 = _score_and_vector(impact.get("baseMetricV2", {}).get("cvssV2"))
+        v3 = _score_and_vector(impact.get("baseMetricV3", {}).get("cvssV3"))
+        yield (item["cve"]["CVE_data_meta"]["ID"], ) + v2 + v3
+
+
+def _nvd_2_0_g(data):
+    """
+    :param data: NVD CVE API (2.0) JSON response data
+    :return: A generator yields tuples of CVE data in order of `CVE_KEYS`
+    """
+    for vuln in data.get("vulnerabilities", []):
+        cve = vuln["cve"]
+        metrics = cve.get("metrics", {})
+        v2 = _score_and_vector(_first_cvss_data(metrics, ("cvssMetricV2", )))
+        v3 = _score_and_vector(_first_cvss_data(metrics, ("cvssMetricV31",
+                                                          "cvssMetricV30")))
+        yield (cve["id"], ) + v2 + v3
+
+
+def _csaf_g(data):
+    """
+    :param data: CSAF JSON document data
+    :return: A generator yields tuples of CVE data in order of `CVE_KEYS`
+    """
+    for vuln in data.get("vulnerabilities", []):
+        if "cve" not in vuln:
+            continue
+
+        (v2, v3) = ((None, None), (None, None))
+        for score in vuln.get("scores", []):
+            if v2[0] is None:
+                v2 = _score_and_vector(score.get("cvss_v2"))
+            if v3[0] is None:
+                v3 = _score_and_vector(score.get("cvss_v3"))
+
+        yield (vuln["cve"], ) + v2 + v3
+
+
+def _parse_oval_cvss(val):
+    """
+    :param val: Value of cvss2 or cvss3 attribute, "<score>/<vector>"
+    :return: A tuple of (score :: float, vector :: str) or (None, None)
+
+    >>> _parse_oval_cvss("5.0/AV:N/AC:L/Au:N/C:N/I:N/A:P")
+    (5.0, 'AV:N/AC:L/Au:N/C:N/I:N/A:P')
+    >>> _parse_oval_cvss("7.5/CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H")
+    (7.5, 'CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H')
+    >>> _parse_oval_cvss(None)
+    (None, None)
+    """
+    if not val or '/' not in val:
+        return (None, None)
+
+    (score, vector) = val.split('/', 1)
+    try:
+        return (float(score), vector)
+    except ValueError:
+        return (None, None)
+
+
+def _oval_g(inp):
+    """
+    :param inp: File object of OVAL XML data
+    :return: A generator yields tuples of CVE data in order of `CVE_KEYS`
+    """
+    for _event, elem in ET.iterparse(inp):
+        if elem.tag == "cve" or elem.tag.endswith("}cve"):
+            if elem.text:
+                yield ((elem.text.strip(), ) +
+                       _parse_oval_cvss(elem.get("cvss2")) +
+                       _parse_oval_cvss(elem.get("cvss3")))
+        elif elem.tag.endswith("definition"):
+            elem.clear()  # Release memory as it will not be used later.
+
+
+def load_feed_g(path):
+    """
+    Load CVE feed file and yield CVE data.
+
+    :param path: Feed file path
+    :return: A generator yields tuples of CVE data in order of `CVE_KEYS`
+    """
+    with _open(path) as inp:
+        if ".xml" in os.path.basename(path):
+            for cve in _oval_g(inp):
+                yield cve
+            return
+
+        data = json.loads(inp.read().decode("utf-8"))
+
+    if "CVE_Items" in data:
+        itr = _nvd_1_1_g(data)
+    elif "document" in data:
+        itr = _csaf_g(data)
+    else:
+        itr = _nvd_2_0_g(data)
+
+    for cve in itr:
+        yield cve
+
+
+def _merge(old, new):
+    """
+    :param old, new: Tuples of CVE data in order of `CVE_KEYS`
+    :return: A tuple of CVE data complemented `old` with `new`
+
+    >>> _merge(("CVE-2017-0001", None, None, 7.5, "CVSS:3.0/AV:N"),
+    ...        ("CVE-2017-0001", 5.0, "AV:N", None, None))
+    ('CVE-2017-0001', 5.0, 'AV:N', 7.5, 'CVSS:3.0/AV:N')
+    """
+    return tuple(o if o is not None else n for o, n in zip(old, new))
+
+
+def _connect(dbpath):
+    """
+    :param dbpath: Path to the CVE database file
+    :return: :class:`sqlite3.Connection` object
+    """
+    conn = sqlite3.connect(dbpath)
+    conn.execute("CREATE TABLE IF NOT EXISTS cves "
+                 "(cve TEXT PRIMARY KEY, score REAL, metrics TEXT, "
+                 " score_v3 REAL, metrics_v3 TEXT)")
+    return conn
+
+
+def import_feeds(paths, dbpath):
+    """
+    Import CVE feed files into the database. Data of CVEs already in the
+    database will be complemented with new ones.
+
+    :param paths: A list of CVE feed file paths
+    :param dbpath: Path to the CVE database file to save data
+    :return: Number of CVEs imported
+    """
+    ncves = 0
+    with contextlib.closing(_connect(dbpath)) as conn, conn:
+        for path in paths:
+            LOG.info("Importing: %s", path)
+            cves = dict()
+            for cve in load_feed_g(path):
+                cves[cve[0]] = _merge(cves[cve[0]], cve) \
+                    if cve[0] in cves else cve
+
+            stmt = "SELECT * FROM cves WHERE cve = ?"
+            for cid, cve in cves.items():
+                row = conn.execute(stmt, (cid, )).fetchone()
+                if row:
+                    cves[cid] = _merge(cve, row)
+
+            conn.executemany("INSERT OR REPLACE INTO cves VALUES "
+                             "(?, ?, ?, ?, ?)", cves.values())
+            ncves += len(cves)
+
+    LOG.info("Imported %d CVEs into %s", ncves, dbpath)
+    return ncves
+
+
+class CveStore(object):
+    """Indexed CVE database object provides a dict like interface to lookup
+    CVE and CVSS data as :func:`fleure.cveinfo.get_cvss_for_cve` returns.
+    """
+    def __init__(self, dbpath):
+        """
+        :param dbpath: Path to the CVE database file
+        """
+        self.dbpath = dbpath
+        self._conn = None
+        self._cache = dict()
+
+    def _get_conn(self):
+        """Open the database lazily."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.dbpath,
+                                         check_same_thread=False)
+        return self._conn
+
+    def get(self, cve, default=None):
+        """
+        :param cve: CVE ID, e.g. "CVE-2010-1585"
+        :param default: Default value returned if not found
+        :return: A dict contains CVE and CVSS data or `default`
+        """
+        if cve in self._cache:
+            return self._cache[cve] or default
+
+        row = self._get_conn().execute("SELECT * FROM cves WHERE cve = ?",
+                                       (cve, )).fetchone()
+        dcve = None if row is None else _to_cve_dict(row)
+        self._cache[cve] = dcve
+
+        return dcve or default
+
+    def __contains__(self, cve):
+        return self.get(cve) is not None
+
+    def close(self):
+        """Close the database."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _to_cve_dict(row):
+    """
+    :param row: A tuple of CVE data in order of `CVE_KEYS`
+    :return: A dict contains CVE and CVSS data, with CVSS v3 data instead of
+        v2 data if CVSS v2 data is not available
+
+    >>> dcve = _to_cve_dict(("CVE-2017-0001", None, None, 7.5, "CVSS:3.0/x"))
+    >>> dcve["score"], dcve["metrics"], dcve["metrics_v"]
+    (7.5, 'CVSS:3.0/x', [])
+    """
+    dcve = dict(zip(CVE_KEYS, row))
+    dcve["url"] = NVD_URL_FMT % dcve["cve"]
+    if dcve["score"] is None:
+        dcve["score"] = dcve["score_v3"]
+        dcve["metrics"] = dcve["metrics_v3"]
+        dcve["metrics_v"] = []
+    else:
+        dcve["metrics_v"] = fleure.cveinfo.cvss_metrics(dcve["metrics"])
+
+    if dcve["score"] is None:
+        return None  # No CVSS data for this CVE.
+
+    return dcve
+
+
+def make_parser():
+    """Parse arguments.
+    """
+    defaults = dict(output="cves.db", verbosity=0)
+    psr = argparse.ArgumentParser()
+    psr.set_defaults(**defaults)
+
+    add_arg = psr.add_argument
+    add_arg("-o", "--output",
+            help="CVE database file path to save [%(output)s]" % defaults)
+    add_arg("-v", "--verbose", action="count", dest="verbosity",
+            help="Verbose mode")
+    add_arg("feeds", nargs="+",
+            help="CVE feed files, NVD JSON, CSAF JSON or OVAL XML, may be "
+                 "compressed with gzip or bzip2")
+
+    return psr
+
+
+def main(argv=None):
+    """Cli main.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = make_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbosity
+                        else logging.WARN)
+
+    ncves = import_feeds(args.feeds, args.output)
+    print("Imported %d CVEs: %s" % (ncves, args.output))
+
+
+if __name__ == '__main__':
+    main()
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,247 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Fetch CVE www pages concurrently with keep-alive connections reused per
+worker threads, timeouts, rate limiting and conditional requests using
+ETag/Last-Modified validators.
+"""
+from __future__ import absolute_import
+
+import logging
+import multiprocessing.pool
+import socket
+import threading
+import time
+
+try:
+    import http.client as httplib  # python 3
+    from urllib.parse import urljoin, urlsplit
+except ImportError:
+    import httplib
+    from urlparse import urljoin, urlsplit
+
+import fleure.cveinfo
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+WORKERS = 8
+TIMEOUT = 10  # [sec]
+MAX_REDIRECTS = 3
+
+
+class RateLimiter(object):
+    """Limit the rate of requests shared among threads, and processes also
+    if `reserve` is given.
+    """
+    def __init__(self, rate=None, reserve=None):
+        """
+        :param rate: Max number of requests per second or None (unlimited)
+        :param reserve: A callable takes the interval and reserves the next
+            time slot shared among processes, returns seconds to wait, e.g.
+            :meth:`fleure.cvecache.CveCache.reserve`, or None
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self.reserve = reserve
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Wait until the next request is allowed.
+        """
+        if not self.interval:
+            return
+
+        if self.reserve is not None:
+            delay = self.reserve(self.interval)
+        else:
+            with self._lock:
+                now = time.time()
+                delay = self._next - now
+                self._next = max(now, self._next) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Fetcher(object):
+    """HTTP(S) fetcher runs requests concurrently in a pool of threads.
+    """
+    def __init__(self, workers=WORKERS, timeout=TIMEOUT, rate=None,
+                 cache=None, headers=None, limiter=None):
+        """
+        :param workers: Number of worker threads
+        :param timeout: Timeout of each request in seconds
+        :param rate: Max number of requests per second or None (unlimited)
+        :param cache:
+            A dict or dict-like object to keep responses with validators,
+            {url: dict(body=, etag=, last_modified=)}, to revalidate them
+            with conditional requests later, e.g.
+            :class:`fleure.cvecache.Pages` to keep them among runs
+        :param headers: Extra HTTP headers sent with each request
+        :param limiter: An instance of :class:`RateLimiter` shared with
+            others, or None to make one limits the rate by `rate`
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate) if limiter is None else limiter
+        self.cache = dict() if cache is None else cache
+        self.headers = dict() if headers is None else headers
+        self._local = threading.local()
+        self._conns = []  # All connections opened in any threads.
+        self._lock = threading.Lock()
+
+    def _get_conn(self, scheme, netloc, renew=False):
+        """
+        Get a keep-alive connection for current thread.
+
+        :param scheme: URL scheme, 'http' or 'https'
+        :param netloc: Network location, host[:port]
+        :param renew: Close the connection and open new one if True
+        """
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = dict()
+
+        key = (scheme, netloc)
+        conn = conns.get(key)
+        if conn is not None and renew:
+            conn.close()
+            conn = None
+
+        if conn is None:
+            cls = (httplib.HTTPSConnection if scheme == "https"
+                   else httplib.HTTPConnection)
+            conn = conns[key] = cls(netloc, timeout=self.timeout)
+            with self._lock:
+                self._conns.append(conn)
+
+        return conn
+
+    def _request(self, url, headers):
+        """
+        :param url: URL to fetch
+        :param headers: HTTP request headers
+        :return: A tuple of (status, response headers, body)
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for retry in (False, True):  # Retry once if the connection dropped.
+            conn = self._get_conn(parts.scheme, parts.netloc, renew=retry)
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                return (resp.status, dict((k.lower(), v) for k, v
+                                          in resp.getheaders()), body)
+            except (httplib.HTTPException, socket.error):
+                if retry:
+                    raise
+
+        return (None, {}, None)  # Never reached.
+
+    def fetch(self, url, redirects=MAX_REDIRECTS):
+        """
+        Fetch given URL and return its content.
+
+        :param url: URL to fetch
+        :param redirects: Max number of redirects to follow
+        :return: Content (:: bytes) or None if failed
+        """
+        headers = self.headers.copy()
+        cached = self.cache.get(url)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.limiter.wait()
+        try:
+            (status, rheaders, body) = self._request(url, headers)
+        except (httplib.HTTPException, socket.error) as exc:
+            LOG.warning(_("Failed to fetch %s: %s"), url, str(exc))
+            return None
+
+        if status == 304 and cached:
+            return cached["body"]
+
+        if status in (301, 302, 303, 307, 308) and redirects > 0:
+            location = rheaders.get("location")
+            if location:  # It may be relative.
+                return self.fetch(urljoin(url, location), redirects - 1)
+
+        if status != 200:
+            LOG.warning(_("Failed to fetch %s: status=%s"), url, status)
+            return None
+
+        if "etag" in rheaders or "last-modified" in rheaders:
+            self.cache[url] = dict(body=body, etag=rheaders.get("etag"),
+                                   last_modified=rheaders.get("last-modified"))
+        return body
+
+    def fetch_all(self, urls):
+        """
+        Fetch given URLs concurrently.
+
+        :param urls: A list of URLs
+        :return: A dict, {url: content or None}
+        """
+        urls = list(urls)
+        if not urls:
+            return dict()
+
+        pool = multiprocessing.pool.ThreadPool(min(self.workers, len(urls)))
+        try:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
+        finally:
+            pool.close()
+            pool.join()
+
+    def close(self):
+        """Close all connections.
+        """
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+
+
+def get_cvss_for_cves(cves, fetcher=None, url_fn=fleure.cveinfo.cve2url):
+    """
+    Get CVSS data for given CVEs concurrently.
+
+    :param cves: An iterable yields CVE names, e.g. "CVE-2010-1585"
+    :param fetcher: An instance of :class:`Fetcher` or None
+    :param url_fn: A callable to get the URL of CVE www page
+
+    :return: A dict, {cve: CVSS data or None}, see also
+        :func:`fleure.cveinfo.get_cvss_for_cve`. CVEs failed to fetch are not
+        in it, and None indicates CVE has no CVSS data.
+    """
+    cves = [c for c in set(cves) if fleure.cveinfo.may_have_cvss(c)]
+    if not cves:
+        return dict()
+
+    close = fetcher is None
+    if fetcher is None:
+        fetcher = Fetcher()
+
+    LOG.info(_("Fetching CVSS data of %d CVEs"), len(cves))
+    urls = dict((url_fn(c), c) for c in cves)
+    try:
+        pages = fetcher.fetch_all(urls.keys())
+    finally:
+        if close:
+            fetcher.close()
+
+    return dict((urls[url], fleure.cveinfo.parse_cvss_data(urls[url], data))
+                for url, data in pages.items() if data is not None)
+
+# vim:sw=4:ts=4:et:
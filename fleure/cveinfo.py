@@ -31,6 +31,7 @@ from fleure.globals import _
 
 
 LOG = logging.getLogger(__name__)
+URL_TIMEOUT = 30  # [sec]
 
 # @see http://www.first.org/cvss/cvss-guide.html
 # AV:L/AC:N/Au:N/C:N/I:N/A:C
@@ -88,13 +89,14 @@ CVSSS_METRICS_MAP = dict(
 )
 
 
-def urlread(url, data=None, headers=None):
+def urlread(url, data=None, headers=None, timeout=URL_TIMEOUT):
     """
     Open given url and return its contents or None.
 
     :param url: URL string to read
     :param data: Data to send
     :param headers: Optional http headers to be passed
+    :param timeout: Timeout in seconds
 
     :return: Content (:: str) or None
     """
@@ -103,7 +105,7 @@ def urlread(url, data=None, headers=None):
 
     req = urllib2.Request(url=url, data=data, headers=headers)
     try:
-        return urllib2.urlopen(req).read()
+        return urllib2.urlopen(req, timeout=timeout).read()
     except (HTTPError, URLError, IOError, OSError):
         return None
 
@@ -176,25 +178,36 @@ def cvss_metrics(cvss, metrics_map=None):
     return metrics
 
 
-def get_cvss_for_cve(cve):
+def may_have_cvss(cve):
     """
-    Get CVSS data for given cve from the Red Hat www site.
-
     :param cve: CVE name, e.g. "CVE-2010-1585" :: str
-    :return:  {"metrics": base_metric :: str, "score": base_score :: str}
+    :return: True if given CVE may have CVSS data
 
-    See the HTML source of CVE www page for its format, e.g.
-    https://www.redhat.com/security/data/cve/CVE-2010-1585.html.
+    >>> may_have_cvss("CVE-2010-1585")
+    True
+    >>> may_have_cvss("CVE-2008-0001")
+    False
     """
     match = re.match(r"CVE-(?P<year>\d{4})-(?P<id>\d{4})", cve)
     if match:
         year = int(match.groupdict()["year"])
         if year < 2009:  # No CVSS
-            return None
+            return False
     else:
         LOG.warning(_("Invalid CVE: %s"), cve)
-        return None
+        return False
 
+    return True
+
+
+def parse_cvss_data(cve, data):
+    """
+    Parse the content of CVE www page and get CVSS data.
+
+    :param cve: CVE name, e.g. "CVE-2010-1585" :: str
+    :param data: Content of the CVE www page
+    :return:  {"metrics": base_metric :: str, "score": base_score :: str}
+    """
     def has_cvss_link(tag):
         """Does CVE has a link to CVSS base metrics?
         """
@@ -207,7 +220,6 @@ def get_cvss_for_cve(cve):
 
     url_fmt = "http://nvd.nist.gov/cvss.cfm?version=2&name=%s&vector=(%s)"
     try:
-        data = urlread(cve2url(cve))
         soup = beautifulsoup.BeautifulSoup(data)
 
         cvss_base_metrics = soup.findAll(has_cvss_link)[0].string
@@ -227,4 +239,20 @@ def get_cvss_for_cve(cve):
 
     return None
 
+
+def get_cvss_for_cve(cve):
+    """
+    Get CVSS data for given cve from the Red Hat www site.
+
+    :param cve: CVE name, e.g. "CVE-2010-1585" :: str
+    :return:  {"metrics": base_metric :: str, "score": base_score :: str}
+
+    See the HTML source of CVE www page for its format, e.g.
+    https://www.redhat.com/security/data/cve/CVE-2010-1585.html.
+    """
+    if not may_have_cvss(cve):
+        return None
+
+    return parse_cvss_data(cve, urlread(cve2url(cve)))
+
 # vim:sw=4:ts=4:et:
@@ -0,0 +1,268 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Compute CVSS v2 and v3.x base scores from vectors locally.
+
+Scores of many vectors are computed at once with array operations if numpy
+is available, or one by one in pure python otherwise.
+
+- CVSS v2: https://www.first.org/cvss/v2/guide
+- CVSS v3.0: https://www.first.org/cvss/v3.0/specification-document
+- CVSS v3.1: https://www.first.org/cvss/v3.1/specification-document
+"""
+from __future__ import absolute_import
+
+import logging
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+V2_KEYS = ("AV", "AC", "Au", "C", "I", "A")
+V2_WEIGHTS = dict(AV=dict(L=0.395, A=0.646, N=1.0),
+                  AC=dict(H=0.35, M=0.61, L=0.71),
+                  Au=dict(M=0.45, S=0.56, N=0.704),
+                  C=dict(N=0.0, P=0.275, C=0.660),
+                  I=dict(N=0.0, P=0.275, C=0.660),  # noqa: E741
+                  A=dict(N=0.0, P=0.275, C=0.660))
+
+V3_KEYS = ("AV", "AC", "PR", "UI", "S", "C", "I", "A")
+V3_WEIGHTS = dict(AV=dict(N=0.85, A=0.62, L=0.55, P=0.2),
+                  AC=dict(L=0.77, H=0.44),
+                  PR=dict(N=0.85, L=0.62, H=0.27),
+                  UI=dict(N=0.85, R=0.62),
+                  S=dict(U=0.0, C=1.0),  # 1.0 means scope changed.
+                  C=dict(H=0.56, L=0.22, N=0.0),
+                  I=dict(H=0.56, L=0.22, N=0.0),  # noqa: E741
+                  A=dict(H=0.56, L=0.22, N=0.0))
+V3_PR_CHANGED = dict(L=0.68, H=0.5)  # PR weights if scope changed.
+
+
+def _normalize_v2(vector):
+    """
+    :param vector: CVSS v2 vector string may be broken slightly
+    :return: Normalized vector string
+
+    >>> _normalize_v2("(AV:N/AC:H/AU:N/C:N/I:P/A:N)")
+    'AV:N/AC:H/Au:N/C:N/I:P/A:N'
+    >>> _normalize_v2("AV:N/AC:H/Au/N/C:N/I:P/A:N")  # CVE-2012-5077
+    'AV:N/AC:H/Au:N/C:N/I:P/A:N'
+    """
+    vector = vector.strip().strip("()")
+    return vector.replace("/AU:", "/Au:").replace("/Au/", "/Au:")
+
+
+def parse_vector(vector):
+    """
+    Parse CVSS v2 or v3.x base vector.
+
+    :param vector: CVSS vector string, e.g. "AV:N/AC:L/Au:N/C:N/I:N/A:P"
+    :return:
+        A tuple of (version, weights) where version is 2 or 3 and weights is
+        a tuple of base metric weights in order of `V2_KEYS` or `V3_KEYS`, or
+        None if failed to parse it
+
+    >>> parse_vector("AV:N/AC:L/Au:N/C:N/I:N/A:P")
+    (2, (1.0, 0.71, 0.704, 0.0, 0.0, 0.275))
+    >>> parse_vector("CVSS:3.0/AV:N/AC:L/PR:L/UI:N/S:C/C:N/I:N/A:H")
+    (3, (0.85, 0.77, 0.68, 0.85, 1.0, 0.0, 0.0, 0.56))
+    >>> parse_vector("AV:N/AC:X") is None
+    True
+    """
+    if not vector:
+        return None
+
+    if vector.startswith("CVSS:3."):
+        (version, keys, weights) = (3, V3_KEYS, V3_WEIGHTS)
+        vector = vector.split('/', 1)[-1]
+    else:
+        (version, keys, weights) = (2, V2_KEYS, V2_WEIGHTS)
+        vector = _normalize_v2(vector)
+
+    try:
+        metrics = dict(m.split(':', 1) for m in vector.split('/'))
+        vals = tuple(weights[k][metrics[k]] for k in keys)
+    except (KeyError, ValueError):
+        LOG.warning(_("Invalid CVSS vector: %s"), vector)
+        return None
+
+    if version == 3 and metrics["S"] == 'C' and metrics["PR"] != 'N':
+        vals = vals[:2] + (V3_PR_CHANGED[metrics["PR"]], ) + vals[3:]
+
+    return (version, vals)
+
+
+def _round1(val):
+    """
+    Round half up to one decimal place as CVSS v2 specifies.
+
+    >>> _round1(4.95)
+    5.0
+    """
+    return math.floor(val * 10 + 0.5) / 10.0
+
+
+def _roundup(val):
+    """
+    Round up to one decimal place in the way CVSS v3.1 specifies, to avoid
+    floating point errors. It's used for CVSS v3.0 vectors also.
+
+    >>> _roundup(4.02), _roundup(4.0), _roundup(4.000000000000001)
+    (4.1, 4.0, 4.0)
+    """
+    ival = int(round(val * 100000))
+    if ival % 10000 == 0:
+        return ival / 100000.0
+
+    return (math.floor(ival / 10000) + 1) / 10.0
+
+
+def _v2_score(av, ac, au, conf, integ, avail):
+    """
+    :return: CVSS v2 base score computed from base metric weights
+    """
+    impact = 10.41 * (1 - (1 - conf) * (1 - integ) * (1 - avail))
+    exploitability = 20 * av * ac * au
+    if impact == 0:
+        return 0.0
+
+    return _round1((0.6 * impact + 0.4 * exploitability - 1.5) * 1.176)
+
+
+def _v3_score(av, ac, pr, ui, scope, conf, integ, avail):
+    """
+    :return: CVSS v3.x base score computed from base metric weights
+    """
+    iss = 1 - (1 - conf) * (1 - integ) * (1 - avail)
+    if scope:
+        impact = 7.52 * (iss - 0.029) - 3.25 * (iss - 0.02) ** 15
+    else:
+        impact = 6.42 * iss
+
+    if impact <= 0:
+        return 0.0
+
+    base = impact + 8.22 * av * ac * pr * ui
+    return _roundup(min((1.08 if scope else 1.0) * base, 10))
+
+
+def _v2_scores_a(wts):
+    """
+    :param wts: numpy array of CVSS v2 base metric weights, shape (N, 6)
+    :return: numpy array of CVSS v2 base scores, shape (N, )
+    """
+    (av, ac, au, conf, integ, avail) = wts.T
+    impact = 10.41 * (1 - (1 - conf) * (1 - integ) * (1 - avail))
+    exploitability = 20 * av * ac * au
+    base = (0.6 * impact + 0.4 * exploitability - 1.5) * 1.176
+    return numpy.where(impact == 0, 0.0, numpy.floor(base * 10 + 0.5) / 10)
+
+
+def _v3_scores_a(wts):
+    """
+    :param wts: numpy array of CVSS v3.x base metric weights, shape (N, 8)
+    :return: numpy array of CVSS v3.x base scores, shape (N, )
+    """
+    (av, ac, pr, ui, scope, conf, integ, avail) = wts.T
+    changed = scope > 0
+    iss = 1 - (1 - conf) * (1 - integ) * (1 - avail)
+    impact = numpy.where(changed,
+                         7.52 * (iss - 0.029) - 3.25 * (iss - 0.02) ** 15,
+                         6.42 * iss)
+    base = impact + 8.22 * av * ac * pr * ui
+    base = numpy.minimum(numpy.where(changed, 1.08 * base, base), 10)
+
+    ival = numpy.round(base * 100000)
+    base = numpy.where(ival % 10000 == 0, ival / 100000,
+                       (numpy.floor(ival / 10000) + 1) / 10)
+    return numpy.where(impact <= 0, 0.0, base)
+
+
+def _scores(wss, version):
+    """
+    :param wss: A list of tuples of base metric weights of same version
+    :param version: CVSS version, 2 or 3
+    :return: A list of base scores (:: float)
+    """
+    if not wss:
+        return []
+
+    if numpy is None:
+        fnc = _v2_score if version == 2 else _v3_score
+        return [fnc(*wts) for wts in wss]
+
+    fnc = _v2_scores_a if version == 2 else _v3_scores_a
+    return fnc(numpy.array(wss, dtype=numpy.float64)).tolist()
+
+
+def base_scores(vectors):
+    """
+    Compute CVSS base scores of given vectors at once.
+
+    :param vectors: A list of CVSS v2 or v3.x vector strings
+    :return:
+        A list of base scores (:: float) or None if the vector is invalid, in
+        the same order of `vectors`
+
+    >>> base_scores(["AV:N/AC:L/Au:N/C:N/I:N/A:P",
+    ...              "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H",
+    ...              "AV:N/AC:X"])
+    [5.0, 7.5, None]
+    """
+    parsed = [parse_vector(v) for v in vectors]
+    res = [None] * len(parsed)
+    for version in (2, 3):
+        idxs = [i for i, pvs in enumerate(parsed)
+                if pvs is not None and pvs[0] == version]
+        scores = _scores([parsed[i][1] for i in idxs], version)
+        for idx, score in zip(idxs, scores):
+            res[idx] = score
+
+    return res
+
+
+def base_score(vector):
+    """
+    :param vector: CVSS v2 or v3.x vector string
+    :return: Base score (:: float) or None if the vector is invalid
+
+    >>> base_score("AV:N/AC:M/Au:N/C:N/I:P/A:N")
+    4.3
+    """
+    return base_scores([vector])[0]
+
+
+def complement_scores(cves):
+    """
+    Complement CVSS base scores of CVEs have vectors but no scores at once.
+
+    :param cves: A list of CVE dicts may have 'metrics' (vector) and 'score'
+    :return: Number of CVEs complemented
+
+    >>> cves = [dict(cve="CVE-2017-0001",
+    ...              metrics="AV:N/AC:L/Au:N/C:C/I:C/A:C"),
+    ...         dict(cve="CVE-2017-0002", score="4.3")]
+    >>> complement_scores(cves)
+    1
+    >>> cves[0]["score"]
+    10.0
+    """
+    targets = [c for c in cves if c.get("metrics") and "score" not in c]
+    scores = base_scores([c["metrics"] for c in targets])
+    ncves = 0
+    for cve, score in zip(targets, scores):
+        if score is not None:
+            cve["score"] = score
+            ncves += 1
+
+    return ncves
+
+# vim:sw=4:ts=4:et:
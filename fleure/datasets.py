@@ -10,12 +10,14 @@ from __future__ import absolute_import
 import collections
 import logging
 import operator
-import os.path
 import re
 import tablib
 
+import fleure.cvefetch
 import fleure.cveinfo
+import fleure.cvss
 import fleure.dates
+import fleure.delta
 import fleure.utils
 
 from fleure.globals import _
@@ -24,22 +26,32 @@ from fleure.globals import _
 LOG = logging.getLogger(__name__)
 
 
-def _cve_details(cve, cve_cvss_map=None):
+def _cve_details(cve, cve_cvss_map=None, offline=False):
     """
     :param cve: A dict represents CVE :: {id:, url:, ...}
-    :param cve_cvss_map: A dict :: {cve: cve_and_cvss_data}
+    :param cve_cvss_map:
+        A dict or a dict-like object such as :class:`fleure.cvedb.CveStore`
+        :: {cve: cve_and_cvss_data}
+    :param offline: Do not try to get CVSS data from the network if True
 
     :return: A dict represents CVE and its CVSS metrics
     """
     cveid = cve.get("id", cve.get("cve"))
 
+    dcve = None
     if cve_cvss_map is not None:
         dcve = cve_cvss_map.get(cveid)
 
     if dcve:
+        dcve = dcve.copy()
+        dcve["nvd_url"] = dcve.get("url")
+        dcve["url"] = cve.get("url", dcve["nvd_url"])
         cve.update(**dcve)
         return cve
 
+    if offline:
+        return cve
+
     dcve = fleure.cveinfo.get_cvss_for_cve(cveid)
 
     if dcve is None:
@@ -129,37 +141,45 @@ def make_dataset(data, title, headers, lheaders=None):
     return tablib.Dataset(*tdata, title=title[:30], headers=lheaders)
 
 
-def _assert_if_not_exist(path, desc):
-    """Tiny helper function to check if given path (dir or file) exists.
+def make_sheet(data, title, headers, lheaders=None):
     """
-    if not os.path.exists(path):
-        raise IOError("Reference %s not found: %s" % (desc, path))
+    Similar to :func:`make_dataset` but rows are made lazily to be written
+    one by one with :func:`fleure.xlsx.dump_xlsx`.
 
+    :param data: List of data :: [dict]
+    :param title: Worksheet title
+    :param headers: Keys of data to be used as columns
+    :param lheaders: Localized version of `headers` used as column headers
+    :return: A tuple of (title, column headers, an iterator yields rows)
+
+    >>> (title, headers, rows) = make_sheet([dict(a=1, b=["x", "y"])], "T",
+    ...                                     ("a", "b"))
+    >>> list(rows)
+    [[1, 'x, y']]
+    """
+    rows = ([_make_cell_data(val, h) for h in headers] for val in data)
+    return (title, list(lheaders or headers), rows)
 
-def compute_delta(refdir, ers, updates, nevra_keys=fleure.globals.RPM_KEYS):
+
+def compute_delta(refdir, ers, updates, nevra_keys=fleure.globals.RPM_KEYS,
+                  idxdir=None):
     """
     :param refdir: Dir has reference data files: packages.json, errata.json
         and updates.json
     :param ers: A list of errata
     :param updates: A list of update packages
-    """
-    _assert_if_not_exist(refdir, "data dir")
-
-    ref_es_file = os.path.join(refdir, "errata.json")
-    ref_us_file = os.path.join(refdir, "updates.json")
-    _assert_if_not_exist(ref_es_file, "errata file")
-    _assert_if_not_exist(ref_us_file, "updates file")
+    :param idxdir: Dir to save the index of the reference or None, see
+        :meth:`fleure.delta.RefStore.load`
 
-    ref_es_data = fleure.utils.json_load(ref_es_file)
-    ref_us_data = fleure.utils.json_load(ref_us_file)
-    LOG.debug(_("Loaded reference errata and updates file"))
-
-    ref_eadvs = set(e["advisory"] for e in ref_es_data["data"])
-    ref_nevras = set((p[k] for k in nevra_keys) for p in ref_us_data["data"])
+    .. seealso:: :func:`fleure.delta.compute_deltas`
+    """
+    ref = fleure.delta.RefStore.load(refdir, nevra_keys=nevra_keys,
+                                     idxdir=idxdir)
+    LOG.debug(_("Loaded reference errata and updates data"))
 
-    return ([e for e in ers if e["advisory"] not in ref_eadvs],
-            [u for u in updates
-             if (u[k] for k in nevra_keys) not in ref_nevras])
+    (_ref, ers, updates) = fleure.delta.compute_deltas([ref], ers,
+                                                       updates)[0]
+    return (ers, updates)
 
 
 def _errata_to_int(errata):
@@ -197,7 +217,8 @@ def _errata_to_int(errata):
                                  dic["year"], dic["seq"], rev))
 
 
-def complement_an_errata(ert, updates=None, to_update_fn=None, score=-1):
+def complement_an_errata(ert, updates=None, to_update_fn=None, score=-1,
+                         cvedb=None, offline=False):
     """
     TBD: What should be complemented?
 
@@ -206,6 +227,10 @@ def complement_an_errata(ert, updates=None, to_update_fn=None, score=-1):
     :param to_update_fn:
         A callable to convert pacakge object to compare with update packages
     :param score: CVSS score
+    :param cvedb:
+        A dict-like object to lookup CVSS data of CVEs, e.g. an instance of
+        :class:`fleure.cvedb.CveStore`, or None
+    :param offline: Do not try to get CVSS data from the network if True
     """
     if updates is None:
         updates = []
@@ -223,8 +248,58 @@ def complement_an_errata(ert, updates=None, to_update_fn=None, score=-1):
     ert["synopsis"] = ert["synopsis"].strip()
 
     if score > 0:
-        ert["cves"] = [_cve_details(cve) for cve in ert.get("cves", [])]
+        ert["cves"] = [_cve_details(cve, cvedb, offline) for cve
+                       in ert.get("cves", [])]
 
     return ert
 
+
+def complement_cves(ers, cvedb=None, offline=False, fetcher=None,
+                    cache=None):
+    """
+    Complement CVEs of errata with CVSS data. Scores of CVEs not found in
+    `cvedb` but having CVSS vectors already are computed locally, and CVSS
+    data of the rest not found in `cache` will be fetched concurrently at once
+    unless `offline` is True.
+
+    :param ers: A list of errata dicts
+    :param cvedb:
+        A dict-like object to lookup CVSS data of CVEs, e.g. an instance of
+        :class:`fleure.cvedb.CveStore`, or None
+    :param offline: Do not try to get CVSS data from the network if True
+    :param fetcher: An instance of :class:`fleure.cvefetch.Fetcher` or None
+    :param cache:
+        An instance of :class:`fleure.cvecache.CveCache` to keep CVSS data
+        fetched, or None
+    :return: `ers` complemented
+    """
+    (cmap, vcves) = (dict(), [])
+    for ert in ers:
+        for cve in ert.get("cves", []):
+            cveid = cve.get("id", cve.get("cve"))
+            if cveid not in cmap:
+                cmap[cveid] = None if cvedb is None else cvedb.get(cveid)
+                if cmap[cveid] is None and cve.get("metrics"):
+                    vcves.append(dict(cve=cveid, metrics=cve["metrics"]))
+
+    fleure.cvss.complement_scores(vcves)
+    cmap.update((c["cve"], c) for c in vcves if "score" in c)
+
+    if not offline:
+        cves = [c for c, dcve in cmap.items() if dcve is None]
+        if cache is not None:
+            (dcves, cves) = cache.lookup(cves)
+            cmap.update(dcves)
+
+        dcves = fleure.cvefetch.get_cvss_for_cves(cves, fetcher)
+        if cache is not None:
+            cache.update(dcves)
+        cmap.update(dcves)
+
+    for ert in ers:
+        ert["cves"] = [_cve_details(cve, cmap, offline=True) for cve
+                       in ert.get("cves", [])]
+
+    return ers
+
 # vim:sw=4:ts=4:et:
@@ -7,8 +7,10 @@
 """
 from __future__ import absolute_import
 
+import bisect
 import calendar
 import logging
+import operator
 import re
 
 import fleure.globals
@@ -16,6 +18,9 @@ import fleure.globals
 
 LOG = logging.getLogger(__name__)
 
+# Names of periods made automatically from the issue dates of errata.
+PERIOD_BUCKETS = dict(monthly=1, quarterly=3)
+
 
 def _round_ymd(year, mon, day, roundout=False):
     """
@@ -122,6 +127,19 @@ def _to_date(date_s):
     return (int("20" + year), int(month), int(day))
 
 
+def date_to_int(date_s):
+    """
+    Convert date string of errata to an int, ordinal of the date and can be
+    compared with dates :func:`period_to_dates` returns.
+
+    >>> date_to_int("12/16/10")
+    20101216
+    >>> date_to_int("2014-10-14 00:00:00")
+    20141014
+    """
+    return _d2i(_to_date(date_s))
+
+
 def period_to_dates(start_date, end_date=fleure.globals.TODAY):
     """
     :param period: Period of errata in format of YYYY[-MM[-DD]],
@@ -151,4 +169,115 @@ def in_period(date_s, start_date, end_date):
     date_i = _d2i(_to_date(date_s))
     return start_date <= date_i and date_i < end_date
 
+
+def _is_bucket(obj):
+    """
+    :return: True if `obj` is a name of periods in :data:`PERIOD_BUCKETS`
+    """
+    return not isinstance(obj, (list, tuple)) and obj in PERIOD_BUCKETS
+
+
+def normalize_periods(periods):
+    """
+    :param periods:
+        A period, a list of (start_date[, end_date]) in YYYY[-MM[-DD]], a list
+        of such periods or name of periods to make automatically, one of
+        :data:`PERIOD_BUCKETS`, e.g. "monthly", "quarterly"
+
+    :return: A list of periods, tuples of dates (start, end) :: (int, int), or
+        the name of periods to make automatically
+
+    >>> normalize_periods(None)
+    []
+    >>> normalize_periods(["2014-10-01", "2014-12-31"])
+    [(20141001, 20150101)]
+    >>> normalize_periods([["2014-01", "2014-03"], ["2014-04", "2014-06"]])
+    [(20140101, 20140401), (20140401, 20140701)]
+    >>> normalize_periods((20141001, 20150101))
+    [(20141001, 20150101)]
+    >>> normalize_periods("quarterly")
+    'quarterly'
+    """
+    if not periods:
+        return []
+
+    if not isinstance(periods, (list, tuple)):
+        periods = [periods]
+
+    if len(periods) == 1 and _is_bucket(periods[0]):
+        return periods[0]
+
+    if not isinstance(periods[0], (list, tuple)):
+        periods = [periods]  # A period, (start_date[, end_date]).
+
+    return [tuple(p) if isinstance(p[0], int) else period_to_dates(*p)
+            for p in periods]
+
+
+def make_period_buckets(start_date, end_date, bucket="monthly"):
+    """
+    Make up consecutive periods of given unit which cover the range of given
+    dates.
+
+    :param start_date, end_date: First and last date, YYYYMMDD
+    :param bucket: Unit of periods, one of :data:`PERIOD_BUCKETS`
+    :return: A list of periods, tuples of dates (start, end) :: (int, int)
+
+    >>> make_period_buckets(20141015, 20141203)
+    [(20141001, 20141101), (20141101, 20141201), (20141201, 20150101)]
+    >>> make_period_buckets(20141015, 20150110, "quarterly")
+    [(20141001, 20150101), (20150101, 20150401)]
+    """
+    months = PERIOD_BUCKETS[bucket]
+    (year, mon) = (start_date // 10000, start_date // 100 % 100)
+    mon -= (mon - 1) % months  # Align to the first month of the bucket.
+
+    periods = []
+    while _d2i((year, mon, 1)) <= end_date:
+        (nyear, nmon) = (year + (mon + months - 1) // 12,
+                         (mon + months - 1) % 12 + 1)
+        periods.append((_d2i((year, mon, 1)), _d2i((nyear, nmon, 1))))
+        (year, mon) = (nyear, nmon)
+
+    return periods
+
+
+def slice_by_periods(items, periods, key="issue_date"):
+    """
+    Sort items by dates once and slice them for each periods by bisection.
+
+    :param items: A list of dicts have date string, e.g. errata
+    :param periods:
+        A list of periods, tuples of dates (start, end) :: (int, int) or name
+        of periods to make automatically, one of :data:`PERIOD_BUCKETS`
+    :param key: Key of date string of each items
+
+    :return:
+        A generator yielding tuples of (period, [item in period]), where items
+        are sorted by the dates
+
+    >>> ers = [dict(advisory="A", issue_date="2014-10-14 00:00:00"),
+    ...        dict(advisory="B", issue_date="12/16/14"),
+    ...        dict(advisory="C", issue_date="11/03/14")]
+    >>> [(p, [e["advisory"] for e in es]) for p, es
+    ...  in slice_by_periods(ers, [(20141001, 20141201)])]
+    [((20141001, 20141201), ['A', 'C'])]
+    >>> [(p, len(es)) for p, es in slice_by_periods(ers, "monthly")]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [((20141001, 20141101), 1), ((20141101, 20141201), 1),
+     ((20141201, 20150101), 1)]
+    """
+    dis = sorted(((date_to_int(i[key]), i) for i in items),
+                 key=operator.itemgetter(0))
+    dates = [d for d, _i in dis]
+    sitems = [i for _d, i in dis]
+
+    if _is_bucket(periods):
+        periods = (make_period_buckets(dates[0], dates[-1], periods)
+                   if dates else [])
+
+    for (start, end) in periods:
+        yield ((start, end), sitems[bisect.bisect_left(dates, start):
+                                    bisect.bisect_left(dates, end)])
+
 # vim:sw=4:ts=4:et:
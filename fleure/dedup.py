@@ -0,0 +1,184 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""De-duplication of hosts by installed RPMs.
+
+- Hosts having exactly same installed RPMs are found with fingerprints,
+  SHA-256 digests of their installed RPMs, without comparing lists of RPMs
+  of hosts each other.
+
+- Hosts differ from some other host (reference) only by a few RPMs, newer
+  than or same as the reference's, are analyzed from the reference's errata
+  and updates incrementally: errata and updates applicable to such a host
+  must be applicable to the reference also, as each of its RPMs is not
+  older than the RPM of the same name and arch of the reference, so that
+  these are selected from the reference's by comparing the versions.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import operator
+
+import fleure.rpmutils
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+MAX_DIFFS = 10
+
+_P2NA = operator.itemgetter("name", "arch")
+
+
+def nevra_s(pkg):
+    """
+    :param pkg: A dict represents a package
+    :return: A string represents NEVRA of `pkg`
+
+    >>> nevra_s(dict(name="a", epoch=0, version="1", release="1.el7",
+    ...              arch="x86_64"))
+    'a-0:1-1.el7.x86_64'
+    """
+    return "%(name)s-%(epoch)s:%(version)s-%(release)s.%(arch)s" % pkg
+
+
+def fingerprint(pkgs):
+    """
+    :param pkgs: A list of dicts represent installed packages
+    :return: SHA-256 hex digest of `pkgs` not depends on the order of them
+
+    >>> pkgs = [dict(name=n, epoch=0, version="1", release="1", arch="noarch")
+    ...         for n in ("a", "b")]
+    >>> fingerprint(pkgs) == fingerprint(pkgs[::-1])
+    True
+    >>> fingerprint(pkgs) == fingerprint(pkgs[:1])
+    False
+    """
+    hsh = hashlib.sha256()
+    for nevra in sorted(nevra_s(p) for p in pkgs):
+        hsh.update(nevra.encode("utf-8"))
+        hsh.update(b"\n")
+
+    return hsh.hexdigest()
+
+
+def group_by_fingerprint(hosts):
+    """
+    :param hosts: A list of :class:`~fleure.config.Host` objects prepared
+    :return: A list of tuples of (a host, a list of hosts having same
+        installed RPMs as it) in order of `hosts`
+    """
+    groups = dict()  # {fingerprint: [host]}
+    refs = []
+    for host in hosts:
+        fpr = fingerprint(host.installed)
+        if fpr in groups:
+            groups[fpr].append(host)
+        else:
+            groups[fpr] = []
+            refs.append((fpr, host))
+
+    return [(host, groups[fpr]) for fpr, host in refs]
+
+
+def _is_newer_or_same(pkg, refs):
+    """
+    :param pkg: A dict represents a package
+    :param refs: A dict of {(name, arch): package}
+    """
+    ref = refs.get(_P2NA(pkg))
+    return ref is not None and fleure.rpmutils.pcmp(pkg, ref) >= 0
+
+
+def is_near(ref, host, max_diffs=MAX_DIFFS, cache=None):
+    """
+    :param ref: A :class:`~fleure.config.Host` object, the reference
+    :param host: A :class:`~fleure.config.Host` object
+    :param max_diffs: Max number of RPMs differ from `ref`
+    :param cache: A dict to cache sets of NEVRAs of reference hosts or None
+
+    :return: True if `host` can be analyzed from the results of `ref`, that
+        is, both refer same repos and RPMs of `host` differ from `ref` are
+        only a few and newer than or same as the RPMs of same name and arch
+        of `ref`
+    """
+    if list(ref.repos) != list(host.repos):
+        return False
+
+    if abs(len(ref.installed) - len(host.installed)) > max_diffs:
+        return False
+
+    if cache is None:
+        cache = dict()
+    if ref.hid not in cache:
+        cache[ref.hid] = set(nevra_s(p) for p in ref.installed)
+
+    rnevras = cache[ref.hid]
+    diffs = [p for p in host.installed if nevra_s(p) not in rnevras]
+    if len(diffs) > max_diffs:
+        return False
+
+    rpkgs = dict((_P2NA(p), p) for p in ref.installed)
+    return all(_is_newer_or_same(p, rpkgs) for p in diffs)
+
+
+def apply_delta(errata, updates, installed):
+    """
+    Select errata and updates applicable to a host from those of the
+    reference host, see :func:`is_near`.
+
+    :param errata: A list of errata of the reference host
+    :param updates: A list of update packages of the reference host
+    :param installed: A list of installed packages of the host
+
+    :return: A tuple of (a list of errata, a list of update packages)
+    """
+    ipkgs = dict((_P2NA(p), p) for p in installed)
+
+    def _is_update(pkg):
+        """Is `pkg` an update of some installed package?"""
+        ipkg = ipkgs.get(_P2NA(pkg))
+        return ipkg is not None and fleure.rpmutils.pcmp(ipkg, pkg) < 0
+
+    ups = [u for u in updates if _is_update(u)]
+    unas = set(_P2NA(u) for u in ups)
+
+    ers = []
+    for ert in errata:
+        eups = [p for p in ert.get("updates", []) if _P2NA(p) in unas]
+        if any(_is_update(p) for p in eups):
+            ers.append(dict(ert, updates=eups,
+                            update_names=list(set(u["name"] for u in eups))))
+
+    return (ers, ups)
+
+
+def find_near_hosts(hosts, max_diffs=MAX_DIFFS):
+    """
+    :param hosts: A list of :class:`~fleure.config.Host` objects having
+        different installed RPMs each other
+    :param max_diffs: Max number of RPMs differ from the reference
+
+    :return: A tuple of (a list of hosts should be analyzed fully, a dict of
+        {reference host ID: [hosts can be analyzed from its results]})
+    """
+    (refs, nears, cache) = ([], dict(), dict())
+    if max_diffs <= 0:
+        return (list(hosts), nears)
+
+    for host in sorted(hosts, key=lambda h: len(h.installed), reverse=True):
+        ref = next((r for r in refs if is_near(r, host, max_diffs, cache)),
+                   None)
+        if ref is None:
+            refs.append(host)
+        else:
+            LOG.info(_("%s: Analyze incrementally from the results of %s"),
+                     host.hid, ref.hid)
+            nears.setdefault(ref.hid, []).append(host)
+
+    return (refs, nears)
+
+# vim:sw=4:ts=4:et:
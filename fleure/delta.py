@@ -0,0 +1,174 @@
+#
+# Copyright (C) 2017 Red Hat, Inc.
+# Red Hat Author(s): Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Delta engine to compute errata and updates not found in reference data
+previously generated.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import operator
+import os.path
+import os
+
+import fleure.globals
+import fleure.jsonio
+import fleure.utils
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+REF_FILES = ("errata.json", "updates.json")
+REF_INDEX = "fleure_refindex_%s.json"
+
+
+def _assert_if_not_exist(path, desc):
+    """Tiny helper function to check if given path (dir or file) exists.
+    """
+    if not os.path.exists(path):
+        raise IOError("Reference %s not found: %s" % (desc, path))
+
+
+def _signature(paths):
+    """
+    :param paths: A list of file paths
+    :return: A list of [basename, mtime, size] of files to detect changes
+    """
+    return [[os.path.basename(p), int(os.path.getmtime(p)),
+             os.path.getsize(p)] for p in paths]
+
+
+def index_path(refdir, idxdir):
+    """
+    :param refdir: Dir has reference data files
+    :param idxdir: Dir to save indexes of references, e.g. the cache dir
+    :return: Path of the index file of the reference in `idxdir`
+
+    >>> index_path("/tmp/ref/", "/tmp/cache")  # doctest: +ELLIPSIS
+    '/tmp/cache/fleure_refindex_....json'
+    >>> index_path("/tmp/ref", "/tmp/c") == index_path("/tmp/ref/", "/tmp/c")
+    True
+    """
+    refdir = os.path.abspath(refdir).encode("utf-8")
+    return os.path.join(idxdir,
+                        REF_INDEX % hashlib.sha256(refdir).hexdigest()[:16])
+
+
+class RefStore(object):
+    """Indexed reference snapshot: set of errata advisories and hash set of
+    NEVRAs of update packages.
+    """
+    def __init__(self, advisories=None, nevras=None, name=None,
+                 nevra_keys=fleure.globals.RPM_KEYS):
+        """
+        :param advisories: An iterable yields errata advisories
+        :param nevras: An iterable yields tuples of (N, E, V, R, A)
+        :param name: Name of this reference
+        :param nevra_keys: Keys to get a tuple of NEVRA from packages
+        """
+        self.name = name
+        self.advisories = frozenset(advisories or [])
+        self.nevras = frozenset(tuple(n) for n in (nevras or []))
+        self.to_nevra = operator.itemgetter(*nevra_keys)
+
+    def __contains__(self, obj):
+        """
+        :param obj: An errata or an update package dict
+
+        >>> ref = RefStore(["RHBA-2017:0001"], [("a", 0, "1", "1", "x86_64")])
+        >>> dict(advisory="RHBA-2017:0001") in ref
+        True
+        >>> dict(name="a", epoch=0, version="1", release="1",
+        ...      arch="x86_64") in ref
+        True
+        >>> dict(advisory="RHBA-2017:0002") in ref
+        False
+        """
+        if "advisory" in obj:
+            return obj["advisory"] in self.advisories
+
+        return self.to_nevra(obj) in self.nevras
+
+    @classmethod
+    def load(cls, refdir, nevra_keys=fleure.globals.RPM_KEYS, idxdir=None):
+        """
+        Load reference data from the index in `idxdir` or make up the index
+        from reference data files, errata.json and updates.json may be
+        compressed, and save it for later use if not found or outdated.
+
+        The index is not saved in `refdir` as it may be read-only or shared.
+
+        :param refdir: Dir has reference data files
+        :param nevra_keys: Keys to get a tuple of NEVRA from packages
+        :param idxdir: Dir to save the index, e.g. the cache dir, or None
+            (the index is not saved)
+        :return: An instance of :class:`RefStore`
+        """
+        _assert_if_not_exist(refdir, "data dir")
+        paths = [fleure.jsonio.find(os.path.join(refdir, fn)) for fn
+                 in REF_FILES]
+        for path in paths:
+            _assert_if_not_exist(path, "file")
+
+        sig = _signature(paths)
+        idxpath = None if idxdir is None else index_path(refdir, idxdir)
+        if idxpath is not None and os.path.exists(idxpath):
+            idx = fleure.utils.json_load(idxpath)
+            if idx.get("signature") == sig:
+                LOG.debug(_("Loaded the reference index: %s"), idxpath)
+                return cls(idx["advisories"], idx["nevras"], refdir,
+                           nevra_keys)
+
+        to_nevra = operator.itemgetter(*nevra_keys)
+        (ers, ups) = [fleure.jsonio.load_items_g(p) for p in paths]
+        ref = cls((e["advisory"] for e in ers), (to_nevra(u) for u in ups),
+                  refdir, nevra_keys)
+        if idxpath is None:
+            return ref
+
+        try:
+            if not os.path.exists(idxdir):
+                os.makedirs(idxdir)
+            fleure.utils.json_dump(dict(signature=sig,
+                                        advisories=sorted(ref.advisories),
+                                        nevras=sorted(ref.nevras)), idxpath)
+        except (IOError, OSError) as exc:
+            LOG.debug(_("Could not save the reference index: %s"), str(exc))
+
+        return ref
+
+
+def compute_deltas(refs, ers, updates):
+    """
+    Compute delta of errata and updates against multiple references at once.
+
+    :param refs: A list of :class:`RefStore` objects
+    :param ers: An iterable yields errata
+    :param updates: An iterable yields update packages
+
+    :return: A list of tuples (ref, [errata], [update]) for each reference
+
+    >>> refs = [RefStore(["A"], [("a", 0, "1", "1", "x86_64")]),
+    ...         RefStore(["A", "B"], [])]
+    >>> ers = [dict(advisory="A"), dict(advisory="B"), dict(advisory="C")]
+    >>> ups = [dict(name="a", epoch=0, version="1", release="1",
+    ...             arch="x86_64")]
+    >>> [([e["advisory"] for e in es], len(us)) for _r, es, us
+    ...  in compute_deltas(refs, ers, ups)]
+    [(['B', 'C'], 0), (['C'], 1)]
+    """
+    res = [(ref, [], []) for ref in refs]
+    for idx, items in ((1, ers), (2, updates)):
+        for item in items:
+            for delta in res:
+                if item not in delta[0]:
+                    delta[idx].append(item)
+
+    return res
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,312 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Export lists of analysis results such as errata, updates and installed
+packages in columnar or line-oriented formats, which can be written in a
+streaming manner and read back lazily:
+
+- jsonl: JSON Lines, a JSON object per line
+- csv: CSV with a header row, nested values are flattened
+- parquet: Apache Parquet (requires pyarrow)
+- arrow: Apache Arrow IPC file (requires pyarrow)
+"""
+from __future__ import absolute_import
+
+import csv
+import io
+import itertools
+import json
+import logging
+import os.path
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import fleure.utils
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv", "parquet", "arrow")
+BATCH_SIZE = 1000
+
+
+def _flatten(val):
+    """
+    Flatten a value to store in a column.
+
+    :param val: Any value
+    :return: A scalar value
+
+    >>> _flatten(["a", "b"]), _flatten([dict(id=1)]), _flatten(None)
+    ('a, b', '[{"id": 1}]', None)
+    """
+    if isinstance(val, (list, tuple)):
+        if all(isinstance(v, (str, type(u""))) for v in val):
+            return ", ".join(val)
+        return json.dumps(val)
+
+    if isinstance(val, dict):
+        return json.dumps(val)
+
+    return val
+
+
+def keys_of(items):
+    """
+    :param items: A list of dicts
+    :return: A list of keys of all items in order of appearance
+
+    >>> keys_of([dict(a=1), dict(a=2, b=3)])
+    ['a', 'b']
+    """
+    seen = set()
+    return [k for item in items for k in item
+            if not (k in seen or seen.add(k))]
+
+
+def _rows_g(items, keys):
+    """
+    :param items: An iterable yields dicts
+    :param keys: Keys to select
+    :return: A generator yields lists of flattened values
+    """
+    for item in items:
+        yield [_flatten(item.get(k)) for k in keys]
+
+
+def dump_jsonl(items, filepath):
+    """
+    :param items: An iterable yields dicts
+    :param filepath: Output file path
+    :return: Number of items written
+    """
+    nitems = 0
+    with fleure.utils.copen(filepath, 'w') as out:
+        for item in items:
+            out.write(json.dumps(item, ensure_ascii=False))
+            out.write("\n")
+            nitems += 1
+
+    return nitems
+
+
+def load_jsonl_g(filepath):
+    """
+    :param filepath: JSON Lines file path
+    :return: A generator yields dicts one by one
+    """
+    with fleure.utils.copen(filepath) as inp:
+        for line in inp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def dump_csv(items, filepath, keys):
+    """
+    :param items: An iterable yields dicts
+    :param filepath: Output file path
+    :param keys: Keys of items to be columns
+    :return: Number of items written
+    """
+    nitems = 0
+    with io.open(filepath, 'w', encoding="utf-8", newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(keys)
+        for row in _rows_g(items, keys):
+            writer.writerow(["" if v is None else v for v in row])
+            nitems += 1
+
+    return nitems
+
+
+def load_csv_g(filepath):
+    """
+    :param filepath: CSV file path
+    :return: A generator yields dicts one by one, values are strings
+    """
+    with io.open(filepath, encoding="utf-8", newline='') as inp:
+        for row in csv.DictReader(inp):
+            yield row
+
+
+def _array(vals, type_=None):
+    """
+    :param vals: A list of column values
+    :param type_: :class:`pyarrow.DataType` of the column or None (infer)
+    :return: :class:`pyarrow.Array` object
+    """
+    try:
+        arr = pyarrow.array(vals, type=type_)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, TypeError):
+        # Values of a column typed str, e.g. ints in a mixed column, are
+        # stored as str.
+        arr = pyarrow.array([None if v is None else str(v) for v in vals])
+        if type_ is not None:
+            arr = arr.cast(type_)
+
+    if type_ is None and arr.type == pyarrow.null():
+        arr = arr.cast(pyarrow.string())  # Take all null columns as str.
+
+    return arr
+
+
+def _column_types(items, keys):
+    """
+    Decide types of columns from all values in advance, as the schema cannot
+    be changed in the middle of files.
+
+    :param items: A list of dicts
+    :param keys: Keys of items to be columns
+    :return: A list of :class:`pyarrow.DataType` of columns or None (infer
+        from values)
+    """
+    tsets = [set() for _k in keys]
+    for row in _rows_g(items, keys):
+        for tset, val in zip(tsets, row):
+            if val is not None:
+                tset.add(type(val))
+
+    types = []
+    for tset in tsets:
+        if len(tset) < 2:
+            types.append(None)
+        elif all(t in (int, float) or t.__name__ == "long" for t in tset):
+            types.append(pyarrow.float64())  # ints and floats
+        else:
+            types.append(pyarrow.string())  # Mixed, e.g. ints and strs.
+
+    return types
+
+
+def _dump_arrow(items, filepath, keys, fmt):
+    """
+    Write items in batches. Types of columns of mixed types are decided in
+    advance and others are inferred from the first batch.
+
+    :param items: A list of dicts
+    :param filepath: Output file path
+    :param keys: Keys of items to be columns
+    :param fmt: 'parquet' or 'arrow'
+    :return: Number of items written
+    """
+    types = _column_types(items, keys)
+    (rows, schema, writer, nitems) = (_rows_g(items, keys), None, None, 0)
+    try:
+        while True:
+            chunk = list(itertools.islice(rows, BATCH_SIZE))
+            if not chunk:
+                break
+
+            cols = [list(c) for c in zip(*chunk)]
+            if schema is None:
+                arrs = [_array(c, t) for c, t in zip(cols, types)]
+                schema = pyarrow.schema([(k, a.type) for k, a
+                                         in zip(keys, arrs)])
+                if fmt == "parquet":
+                    writer = pyarrow.parquet.ParquetWriter(filepath, schema)
+                else:
+                    writer = pyarrow.ipc.new_file(filepath, schema)
+            else:
+                arrs = [_array(c, f.type) for c, f in zip(cols, schema)]
+
+            batch = pyarrow.RecordBatch.from_arrays(arrs, schema=schema)
+            if fmt == "parquet":
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            nitems += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return nitems
+
+
+def load_parquet_g(filepath, columns=None):
+    """
+    :param filepath: Parquet file path
+    :param columns: A list of columns to load or None (all columns)
+    :return: A generator yields dicts one by one
+    """
+    pfile = pyarrow.parquet.ParquetFile(filepath)
+    for batch in pfile.iter_batches(BATCH_SIZE, columns=columns):
+        for item in batch.to_pylist():
+            yield item
+
+
+def load_arrow_g(filepath):
+    """
+    :param filepath: Arrow IPC file path
+    :return: A generator yields dicts one by one
+    """
+    with pyarrow.memory_map(filepath) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for idx in range(reader.num_record_batches):
+            for item in reader.get_batch(idx).to_pylist():
+                yield item
+
+
+def export(items, filename, savedir, formats=FORMATS, keys=None):
+    """
+    Export a list of dicts in given formats.
+
+    :param items: A list of dicts
+    :param filename: File base name to save
+    :param savedir: Directory to save files
+    :param formats: A list of export formats, see `FORMATS`
+    :param keys: Keys of items to be columns, or None (all keys)
+    :return: A list of paths of files exported
+    """
+    if keys is None:
+        keys = keys_of(items)
+
+    paths = []
+    for fmt in formats:
+        if fmt not in FORMATS:
+            LOG.warning(_("Unknown export format: %s"), fmt)
+            continue
+
+        if fmt in ("parquet", "arrow") and pyarrow is None:
+            LOG.warning(_("pyarrow is not available, skip export in %s"),
+                        fmt)
+            continue
+
+        filepath = os.path.join(savedir, "%s.%s" % (filename, fmt))
+        if fmt == "jsonl":
+            dump_jsonl(items, filepath)
+        elif fmt == "csv":
+            dump_csv(items, filepath, keys)
+        elif keys:
+            _dump_arrow(items, filepath, keys, fmt)
+        else:
+            continue  # Nothing to export.
+
+        paths.append(filepath)
+
+    return paths
+
+
+def load_g(filepath):
+    """
+    Load data exported lazily.
+
+    :param filepath: File path exported with :func:`export`
+    :return: A generator yields dicts one by one
+    """
+    fmt = os.path.splitext(filepath)[-1][1:]
+    fnc = dict(jsonl=load_jsonl_g, csv=load_csv_g, parquet=load_parquet_g,
+               arrow=load_arrow_g).get(fmt)
+    if fnc is None:
+        raise ValueError("Unknown format: " + filepath)
+
+    return fnc(filepath)
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,289 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Fleet results database to keep analysis results of many hosts in an
+SQLite database with normalized tables:
+
+- hosts: Hosts analyzed
+- packages: Packages (NEVRAs) installed in or updates for any hosts
+- host_packages: Links between hosts and packages, installed or update
+- advisories: Errata
+- host_advisory: Links between hosts and applicable errata
+
+Fleet-level questions can be answered with a SQL query, for example, the
+number of hosts each critical security errata is applicable to:
+
+.. code-block:: sql
+
+    SELECT a.advisory, COUNT(*) FROM advisories AS a
+      JOIN host_advisory AS ha ON a.id = ha.advisory_id
+      WHERE a.severity = 'Critical' GROUP BY a.id;
+"""
+from __future__ import absolute_import
+
+import datetime
+import logging
+import sqlite3
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+NEVRA_KEYS = ("name", "epoch", "version", "release", "arch")
+ADV_KEYS = ("advisory", "type", "severity", "synopsis", "issue_date",
+            "update_date", "url", "cves", "score")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY, hid TEXT UNIQUE NOT NULL, workdir TEXT,
+    backend TEXT, repos TEXT, ref_hid TEXT, analyzed TEXT);
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, epoch TEXT, version TEXT,
+    release TEXT, arch TEXT, UNIQUE (name, epoch, version, release, arch));
+CREATE TABLE IF NOT EXISTS host_packages (
+    host_id INTEGER NOT NULL REFERENCES hosts (id) ON DELETE CASCADE,
+    package_id INTEGER NOT NULL REFERENCES packages (id),
+    kind TEXT NOT NULL, PRIMARY KEY (host_id, package_id, kind));
+CREATE TABLE IF NOT EXISTS advisories (
+    id INTEGER PRIMARY KEY, advisory TEXT UNIQUE NOT NULL, type TEXT,
+    severity TEXT, synopsis TEXT, issue_date TEXT, update_date TEXT,
+    url TEXT, cves TEXT, score REAL);
+CREATE TABLE IF NOT EXISTS host_advisory (
+    host_id INTEGER NOT NULL REFERENCES hosts (id) ON DELETE CASCADE,
+    advisory_id INTEGER NOT NULL REFERENCES advisories (id),
+    PRIMARY KEY (host_id, advisory_id));
+CREATE INDEX IF NOT EXISTS packages_name ON packages (name);
+CREATE INDEX IF NOT EXISTS host_packages_package
+    ON host_packages (package_id, kind);
+CREATE INDEX IF NOT EXISTS advisories_type_severity
+    ON advisories (type, severity);
+CREATE INDEX IF NOT EXISTS advisories_issue_date ON advisories (issue_date);
+CREATE INDEX IF NOT EXISTS host_advisory_advisory
+    ON host_advisory (advisory_id);
+"""
+
+INSTALLED = "installed"
+UPDATE = "update"
+
+
+def _nevra(pkg):
+    """
+    :param pkg: A dict represents a package
+    :return: A tuple of (name, epoch, version, release, arch) of `pkg`
+
+    >>> _nevra(dict(name="a", epoch=0, version="1", release="1",
+    ...             arch="x86_64"))
+    ('a', '0', '1', '1', 'x86_64')
+    """
+    return tuple(str(pkg.get(k, "")) for k in NEVRA_KEYS)
+
+
+def _advisory_row(ert):
+    """
+    :param ert: A dict represents an errata
+    :return: A tuple of values of `ert` in order of `ADV_KEYS`
+
+    >>> _advisory_row(dict(advisory="RHSA-2017:0001", severity="Important",
+    ...                    cves=[dict(cve="CVE-2017-0001", score="5.0"),
+    ...                          dict(cve="CVE-2017-0002")]))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    ('RHSA-2017:0001', None, 'Important', None, None, None, None,
+     'CVE-2017-0001, CVE-2017-0002', 5.0)
+    """
+    cves = ert.get("cves", [])
+    scores = [float(c["score"]) for c in cves if c.get("score") is not None]
+    return (ert["advisory"], ert.get("type"), ert.get("severity"),
+            ert.get("synopsis"), ert.get("issue_date"),
+            ert.get("update_date"), ert.get("url"),
+            ", ".join(c.get("cve", c.get("id", "")) for c in cves) or None,
+            max(scores) if scores else None)
+
+
+class FleetDB(object):
+    """Fleet results database.
+    """
+    def __init__(self, dbpath):
+        """
+        :param dbpath: Path to the database file
+        """
+        self.dbpath = dbpath
+        self._conn = sqlite3.connect(dbpath, timeout=300)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        self._pids = dict()  # {nevra: package_id}
+        self._aids = dict()  # {advisory: advisory_id}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _package_ids(self, cur, pkgs):
+        """
+        :param cur: :class:`sqlite3.Cursor` object
+        :param pkgs: A list of package dicts
+        :return: A list of package IDs
+        """
+        nevras = [_nevra(p) for p in pkgs]
+        missing = set(n for n in nevras if n not in self._pids)
+        if missing:
+            cur.executemany("INSERT OR IGNORE INTO packages (%s) VALUES "
+                            "(?, ?, ?, ?, ?)" % ", ".join(NEVRA_KEYS),
+                            missing)
+            stmt = ("SELECT id FROM packages WHERE name = ? AND epoch = ? "
+                    "AND version = ? AND release = ? AND arch = ?")
+            for nevra in missing:
+                self._pids[nevra] = cur.execute(stmt, nevra).fetchone()[0]
+
+        return [self._pids[n] for n in nevras]
+
+    def _advisory_ids(self, cur, ers):
+        """
+        :param cur: :class:`sqlite3.Cursor` object
+        :param ers: A list of errata dicts
+        :return: A list of advisory IDs
+        """
+        rows = [_advisory_row(e) for e in ers]
+        # Update with newer data, e.g. scores complemented later. UPSERT is
+        # not used as it needs SQLite >= 3.24 and RHEL 7 has 3.7.17.
+        cur.executemany("INSERT OR IGNORE INTO advisories (advisory) "
+                        "VALUES (?)", [r[:1] for r in rows])
+        cur.executemany("UPDATE advisories SET %s WHERE advisory = ?"
+                        % ", ".join("%s = COALESCE(?, %s)" % (k, k)
+                                    for k in ADV_KEYS[1:]),
+                        [r[1:] + r[:1] for r in rows])
+        stmt = "SELECT id FROM advisories WHERE advisory = ?"
+        for row in rows:
+            if row[0] not in self._aids:
+                self._aids[row[0]] = cur.execute(stmt, row[:1]).fetchone()[0]
+
+        return [self._aids[r[0]] for r in rows]
+
+    def _host_id(self, cur, host, ref=None):
+        """
+        Add or replace a host and remove its links.
+
+        :return: Host ID
+        """
+        cur.execute("DELETE FROM hosts WHERE hid = ?", (host.hid, ))
+        cur.execute("INSERT INTO hosts (hid, workdir, backend, repos, "
+                    "ref_hid, analyzed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (host.hid, getattr(host, "workdir", None),
+                     getattr(host, "backend", None),
+                     ", ".join(getattr(host, "repos", None) or []),
+                     None if ref is None else ref.hid,
+                     datetime.datetime.now().strftime("%F %T")))
+        return cur.lastrowid
+
+    def add_host(self, host, installed=None, errata=None, updates=None):
+        """
+        Add analysis results of a host in a transaction.
+
+        :param host: An instance of :class:`fleure.config.Host`
+        :param installed: A list of installed package dicts or None
+            (`host.installed`)
+        :param errata: A list of errata dicts or None (`host.errata`)
+        :param updates: A list of update package dicts or None
+            (`host.updates`)
+        """
+        if installed is None:
+            installed = getattr(host, "installed", None) or []
+        if errata is None:
+            errata = getattr(host, "errata", None) or []
+        if updates is None:
+            updates = getattr(host, "updates", None) or []
+
+        with self._conn:
+            cur = self._conn.cursor()
+            hid = self._host_id(cur, host)
+            links = ([(hid, p, INSTALLED) for p
+                      in self._package_ids(cur, installed)] +
+                     [(hid, p, UPDATE) for p
+                      in self._package_ids(cur, updates)])
+            cur.executemany("INSERT OR IGNORE INTO host_packages VALUES "
+                            "(?, ?, ?)", links)
+            cur.executemany("INSERT OR IGNORE INTO host_advisory VALUES "
+                            "(?, ?)", [(hid, a) for a
+                                       in self._advisory_ids(cur, errata)])
+
+        LOG.info(_("%s: Saved %d packages and %d errata into %s"), host.hid,
+                 len(links), len(errata), self.dbpath)
+
+    def add_same_hosts(self, ref, hosts):
+        """
+        Add hosts have the same results as the reference host.
+
+        :param ref: Reference host already added
+        :param hosts: A list of hosts same as `ref`
+        """
+        with self._conn:
+            cur = self._conn.cursor()
+            row = cur.execute("SELECT id FROM hosts WHERE hid = ?",
+                              (ref.hid, )).fetchone()
+            if row is None:
+                raise ValueError("Reference host not found: %s" % ref.hid)
+
+            for host in hosts:
+                hid = self._host_id(cur, host, ref)
+                cur.execute("INSERT INTO host_packages SELECT ?, package_id, "
+                            "kind FROM host_packages WHERE host_id = ?",
+                            (hid, row[0]))
+                cur.execute("INSERT INTO host_advisory SELECT ?, advisory_id "
+                            "FROM host_advisory WHERE host_id = ?",
+                            (hid, row[0]))
+
+    def query(self, stmt, params=()):
+        """
+        :param stmt: SQL statement
+        :param params: Parameters of `stmt`
+        :return: A list of result rows
+        """
+        return self._conn.execute(stmt, params).fetchall()
+
+    def hosts_by_advisory(self, advisory):
+        """
+        :param advisory: Advisory ID, e.g. "RHSA-2017:0001"
+        :return: A list of host IDs the errata is applicable to
+        """
+        return [r[0] for r in self.query(
+            "SELECT h.hid FROM hosts AS h "
+            "JOIN host_advisory AS ha ON h.id = ha.host_id "
+            "JOIN advisories AS a ON a.id = ha.advisory_id "
+            "WHERE a.advisory = ? ORDER BY h.hid", (advisory, ))]
+
+    def advisory_counts(self, severity=None):
+        """
+        :param severity: Severity to filter errata or None
+        :return: A list of (advisory, number of hosts) sorted by the number
+        """
+        stmt = ("SELECT a.advisory, COUNT(*) AS n FROM advisories AS a "
+                "JOIN host_advisory AS ha ON a.id = ha.advisory_id %s "
+                "GROUP BY a.id ORDER BY n DESC, a.advisory")
+        if severity is None:
+            return self.query(stmt % "")
+
+        return self.query(stmt % "WHERE a.severity = ?", (severity, ))
+
+    def close(self):
+        """Close the database.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def save_host(host, dbpath):
+    """
+    Save analysis results of a host into the fleet results database.
+
+    :param host: An instance of :class:`fleure.config.Host` analyzed
+    :param dbpath: Path to the database file
+    """
+    with FleetDB(dbpath) as fdb:
+        fdb.add_host(host)
+
+# vim:sw=4:ts=4:et:
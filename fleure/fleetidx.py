@@ -0,0 +1,314 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Fleet index, bitmaps of hosts per advisory and package, to answer
+fleet-level questions without loading results of each host.
+
+Each host is assigned to a bit position, and each advisory, installed
+package NEVRA and update package NEVRA has a bitmap of hosts, an integer
+with bits of the hosts set, kept compressed in an SQLite database with the
+number of the hosts. Bitmaps are updated incrementally as hosts finish, and
+unions, intersections and counts across thousands of hosts are bitwise
+operations of integers::
+
+    $ python -m fleure.fleetidx fleet.idx top -n 20
+    $ python -m fleure.fleetidx fleet.idx hosts RHSA-2017:0001
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import binascii
+import functools
+import logging
+import operator
+import sqlite3
+import sys
+import zlib
+
+import fleure.dedup
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+ADVISORY = "advisory"
+INSTALLED = "installed"
+UPDATE = "update"
+KINDS = (ADVISORY, INSTALLED, UPDATE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (pos INTEGER PRIMARY KEY,
+                                  hid TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS bitmaps (
+    kind TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL,
+    bits BLOB NOT NULL, PRIMARY KEY (kind, key));
+CREATE INDEX IF NOT EXISTS bitmaps_count ON bitmaps (kind, count);
+CREATE TABLE IF NOT EXISTS host_keys (
+    pos INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL,
+    PRIMARY KEY (pos, kind, key));
+"""
+
+
+def to_blob(bits):
+    """
+    :param bits: A bitmap, an integer
+    :return: Compressed bytes of `bits`
+
+    >>> from_blob(to_blob(0b1011)) == 0b1011
+    True
+    >>> from_blob(to_blob(1 << 3000)) == 1 << 3000
+    True
+    """
+    hexs = "%x" % bits
+    return zlib.compress(binascii.unhexlify("0" * (len(hexs) % 2) + hexs))
+
+
+def from_blob(blob):
+    """
+    :param blob: Compressed bytes made by :func:`to_blob`
+    :return: A bitmap, an integer
+    """
+    return int(binascii.hexlify(zlib.decompress(blob)), 16)
+
+
+def popcount(bits):
+    """
+    :param bits: A bitmap, an integer
+    :return: Number of bits set
+
+    >>> popcount(0b1011)
+    3
+    """
+    return bin(bits).count("1")
+
+
+def _keys(kind, objs):
+    """
+    :param kind: ADVISORY, INSTALLED or UPDATE
+    :param objs: A list of errata or packages
+    :return: A set of keys of `objs`
+    """
+    if kind == ADVISORY:
+        return set(e["advisory"] for e in objs)
+
+    return set(fleure.dedup.nevra_s(p) for p in objs)
+
+
+class FleetIndex(object):
+    """Fleet index of hosts.
+    """
+    def __init__(self, dbpath):
+        """
+        :param dbpath: Path to the database file
+        """
+        self.dbpath = dbpath
+        self._conn = sqlite3.connect(dbpath, timeout=300)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        self._hids = None  # {pos: hid}, loaded on demand.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _pos(self, cur, hid):
+        """
+        Assign a bit position to a host. Bits of the host added previously
+        are cleared to replace its results, only in bitmaps of keys the
+        host had, see the host_keys table.
+
+        :return: Bit position of the host
+        """
+        row = cur.execute("SELECT pos FROM hosts WHERE hid = ?",
+                          (hid, )).fetchone()
+        if row is None:
+            cur.execute("INSERT INTO hosts (pos, hid) SELECT "
+                        "COALESCE(MAX(pos) + 1, 0), ? FROM hosts", (hid, ))
+            return cur.execute("SELECT pos FROM hosts WHERE hid = ?",
+                               (hid, )).fetchone()[0]
+
+        # Clear bits of the host only in bitmaps of keys it had.
+        mask = 1 << row[0]
+        for kind, key in cur.execute("SELECT kind, key FROM host_keys "
+                                     "WHERE pos = ?", row).fetchall():
+            self._save(cur, kind, key, self._bitmap(cur, kind, key) & ~mask)
+        cur.execute("DELETE FROM host_keys WHERE pos = ?", row)
+
+        return row[0]
+
+    def _save(self, cur, kind, key, bits):
+        """Save a bitmap."""
+        cur.execute("INSERT OR REPLACE INTO bitmaps VALUES (?, ?, ?, ?)",
+                    (kind, key, popcount(bits), sqlite3.Binary(to_blob(bits))))
+
+    def add_hosts(self, hosts, installed=(), errata=(), updates=()):
+        """
+        Add hosts have same results in a transaction.
+
+        :param hosts: A list of :class:`fleure.config.Host` objects
+        :param installed: A list of installed package dicts
+        :param errata: A list of errata dicts
+        :param updates: A list of update package dicts
+        """
+        with self._conn:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")  # Other processes may add hosts.
+            poss = [self._pos(cur, h.hid) for h in hosts]
+            mask = functools.reduce(operator.or_, (1 << p for p in poss), 0)
+            for kind, objs in ((ADVISORY, errata), (INSTALLED, installed),
+                               (UPDATE, updates)):
+                keys = _keys(kind, objs)
+                for key in keys:
+                    self._save(cur, kind, key, self._bitmap(cur, kind, key) |
+                               mask)
+                cur.executemany("INSERT OR IGNORE INTO host_keys VALUES "
+                                "(?, ?, ?)", ((p, kind, k) for p in poss
+                                              for k in keys))
+
+        self._hids = None
+        LOG.info(_("Indexed %d errata and %d packages of %s"), len(errata),
+                 len(installed), ", ".join(h.hid for h in hosts))
+
+    def add_host(self, host):
+        """
+        Add analysis results of a host.
+
+        :param host: An instance of :class:`fleure.config.Host` analyzed
+        """
+        self.add_hosts([host], getattr(host, "installed", None) or [],
+                       getattr(host, "errata", None) or [],
+                       getattr(host, "updates", None) or [])
+
+    def _bitmap(self, cur, kind, key):
+        """Load a bitmap."""
+        row = cur.execute("SELECT bits FROM bitmaps WHERE kind = ? AND "
+                          "key = ?", (kind, key)).fetchone()
+        return 0 if row is None else from_blob(row[0])
+
+    def bitmap(self, key, kind=ADVISORY):
+        """
+        :param key: Advisory ID or NEVRA of a package, see
+            :func:`fleure.dedup.nevra_s`
+        :param kind: ADVISORY, INSTALLED or UPDATE
+        :return: A bitmap of hosts, an integer
+        """
+        return self._bitmap(self._conn.cursor(), kind, key)
+
+    def count(self, key, kind=ADVISORY):
+        """
+        :return: Number of hosts of `key`, see :meth:`bitmap`
+        """
+        row = self._conn.execute("SELECT count FROM bitmaps WHERE kind = ? "
+                                 "AND key = ?", (kind, key)).fetchone()
+        return 0 if row is None else row[0]
+
+    def union(self, keys, kind=ADVISORY):
+        """
+        :param keys: A list of keys, see :meth:`bitmap`
+        :return: A bitmap of hosts of any of `keys`
+        """
+        return functools.reduce(operator.or_,
+                                (self.bitmap(k, kind) for k in keys), 0)
+
+    def intersection(self, keys, kind=ADVISORY):
+        """
+        :param keys: A list of keys, see :meth:`bitmap`
+        :return: A bitmap of hosts of all of `keys`
+        """
+        bitmaps = [self.bitmap(k, kind) for k in keys]
+        return functools.reduce(operator.and_, bitmaps) if bitmaps else 0
+
+    def top(self, limit=20, kind=ADVISORY):
+        """
+        :param limit: Max number of results
+        :param kind: ADVISORY, INSTALLED or UPDATE
+        :return: A list of (key, number of hosts) sorted by the number
+        """
+        return self._conn.execute("SELECT key, count FROM bitmaps WHERE "
+                                  "kind = ? ORDER BY count DESC, key "
+                                  "LIMIT ?", (kind, limit)).fetchall()
+
+    def hosts(self, bits):
+        """
+        :param bits: A bitmap of hosts
+        :return: A list of host IDs of `bits` in order of bit positions
+        """
+        if self._hids is None:
+            self._hids = dict(self._conn.execute("SELECT pos, hid FROM "
+                                                 "hosts"))
+        hids = []
+        while bits:
+            low = bits & -bits
+            hids.append(self._hids[low.bit_length() - 1])
+            bits ^= low
+
+        return hids
+
+    def close(self):
+        """Close the database.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def save_host(host, dbpath):
+    """
+    Add analysis results of a host into the fleet index.
+
+    :param host: An instance of :class:`fleure.config.Host` analyzed
+    :param dbpath: Path to the database file
+    """
+    with FleetIndex(dbpath) as fidx:
+        fidx.add_host(host)
+
+
+def make_parser():
+    """Parse arguments.
+    """
+    defaults = dict(kind=ADVISORY, limit=20)
+    psr = argparse.ArgumentParser()
+    psr.set_defaults(**defaults)
+
+    add_arg = psr.add_argument
+    add_arg("-k", "--kind", choices=KINDS,
+            help="Kind of keys [%(kind)s]" % defaults)
+    add_arg("-n", "--limit", type=int,
+            help="Max number of keys with 'top' [%(limit)s]" % defaults)
+    add_arg("dbpath", help="Fleet index database file")
+    add_arg("command", choices=("top", "hosts", "count"),
+            help="'top': Keys by number of hosts, 'hosts': Hosts of any "
+                 "of keys, 'count': Number of hosts of any of keys")
+    add_arg("keys", nargs="*", help="Advisory IDs or package NEVRAs")
+
+    return psr
+
+
+def main(argv=None):
+    """Cli main.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = make_parser().parse_args(argv)
+    with FleetIndex(args.dbpath) as fidx:
+        if args.command == "top":
+            for key, count in fidx.top(args.limit, args.kind):
+                print("%s\t%d" % (key, count))
+        else:
+            bits = fidx.union(args.keys, args.kind)
+            if args.command == "count":
+                print(popcount(bits))
+            else:
+                for hid in fidx.hosts(bits):
+                    print(hid)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,315 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Streaming JSON writer and loader with optional gzip or zstd compression.
+
+Faster JSON encoder and decoder, orjson or ujson, are used if available
+instead of the standard json module. Lists in the top level dict are
+encoded and written item by item, so that the whole encoded string is never
+kept in memory, and items of such lists can be loaded lazily one by one
+with :func:`load_items_g`.
+"""
+from __future__ import absolute_import
+
+import codecs
+import gzip
+import io
+import json
+import logging
+import os.path
+import os
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+COMPRESSIONS = dict(gzip=".gz", zstd=".zst")
+CHUNK_SIZE = 65536
+
+
+def suffix(compress=None):
+    """
+    :param compress: Compression type, 'gzip', 'zstd' or None
+    :return: File suffix for the compression type
+
+    >>> suffix(), suffix("gzip")
+    ('', '.gz')
+    """
+    if not compress:
+        return ""
+
+    if compress == "zstd" and zstandard is None:
+        LOG.warning(_("zstandard is not available, use gzip instead"))
+        compress = "gzip"
+
+    return COMPRESSIONS[compress]
+
+
+def find(filepath):
+    """
+    :param filepath: JSON file path without compression suffix
+    :return: Path of the file may be compressed if found, or `filepath`
+    """
+    for sfx in ("", ) + tuple(COMPRESSIONS.values()):
+        if os.path.exists(filepath + sfx):
+            return filepath + sfx
+
+    return filepath
+
+
+def _open(filepath, mode='rb'):
+    """
+    Open a file may be compressed in binary mode.
+
+    :param filepath: File path, compression type is detected from its suffix
+    :param mode: 'rb' or 'wb'
+    """
+    if filepath.endswith(COMPRESSIONS["gzip"]):
+        return gzip.open(filepath, mode)
+
+    if filepath.endswith(COMPRESSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to open: " + filepath)
+        return zstandard.open(filepath, mode)
+
+    return io.open(filepath, mode)
+
+
+def dumps(obj, **kwargs):
+    """
+    Encode an object in JSON with the fastest encoder available.
+
+    :param obj: Object to encode
+    :param kwargs: Keyword arguments passed to :func:`json.dumps`. The
+        standard json module is used if it's given.
+    :return: JSON string :: bytes
+
+    >>> dumps(dict(a=[1, u"b"]))
+    b'{"a":[1,"b"]}'
+    """
+    if not kwargs:
+        try:
+            if orjson is not None:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            if ujson is not None:
+                return ujson.dumps(obj, ensure_ascii=False,
+                                   escape_forward_slashes=False
+                                   ).encode("utf-8")
+        except (TypeError, ValueError, OverflowError):
+            pass  # e.g. Objects not supported; try the standard one.
+
+        kwargs = dict(separators=(',', ':'))
+
+    return json.dumps(obj, ensure_ascii=False, **kwargs).encode("utf-8")
+
+
+def loads(content):
+    """
+    :param content: JSON string :: bytes
+    :return: Object decoded
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+
+    if ujson is not None:
+        return ujson.loads(content)
+
+    return json.loads(content.decode("utf-8"))
+
+
+def _iterencode(obj, **kwargs):
+    """
+    :param obj: Object to encode, lists in it may be iterators
+    :return: A generator yields JSON encoded chunks :: bytes
+    """
+    if isinstance(obj, dict):
+        yield b'{'
+        for idx, (key, val) in enumerate(obj.items()):
+            if idx:
+                yield b','
+            yield dumps(key if isinstance(key, type(u"")) else str(key))
+            yield b':'
+            for chunk in _iterencode(val, **kwargs):
+                yield chunk
+        yield b'}'
+
+    elif isinstance(obj, (list, tuple)) or hasattr(obj, "__next__") or \
+            hasattr(obj, "next"):  # Lists or iterators.
+        yield b'['
+        for idx, item in enumerate(obj):
+            if idx:
+                yield b','
+            yield dumps(item, **kwargs)
+        yield b']'
+
+    else:
+        yield dumps(obj, **kwargs)
+
+
+def dump(obj, filepath, **kwargs):
+    """
+    Dump an object into a JSON file in a streaming manner.
+
+    :param obj: Object to dump
+    :param filepath: Output file path, it will be compressed if its suffix is
+        '.gz' (gzip) or '.zst' (zstd)
+    :param kwargs: Keyword arguments passed to :func:`json.dumps`
+
+    The object is written into a temporary file and renamed to `filepath`,
+    so that an existing file, may be a link to shared objects, e.g. in the
+    store of :mod:`fleure.cas`, is replaced and never written through.
+    """
+    (pdir, fname) = os.path.split(filepath)
+    tmppath = os.path.join(pdir, ".%s.%s" % (uuid.uuid4().hex, fname))
+    try:
+        with _open(tmppath, 'wb') as out:
+            for chunk in _iterencode(obj, **kwargs):
+                out.write(chunk)
+        os.rename(tmppath, filepath)
+    except BaseException:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+
+
+def load(filepath):
+    """
+    :param filepath: JSON file path may be compressed
+    :return: Object loaded
+    """
+    with _open(filepath) as inp:
+        return loads(inp.read())
+
+
+class _ListFinder(object):
+    """Find the start of a list in JSON text fed chunk by chunk. Strings and
+    nested objects are skipped, so that only the list of the key in the top
+    level dict (or the top level list) is found.
+    """
+    def __init__(self, key=None):
+        """
+        :param key: Key of the list in the top level dict, or None if the top
+            level object is a list
+        """
+        self.key = key
+        self._depth = 0
+        (self._in_str, self._esc) = (False, False)
+        self._chars = []  # Chars of the string in the top level dict.
+        self._last = None  # The last string in the top level dict.
+        self._matched = False  # The key matched and ':' followed.
+
+    def _is_key(self):
+        """Is the last string in the top level dict the key?"""
+        return json.loads(u'"%s"' % self._last) == self.key
+
+    def feed(self, text):
+        """
+        :param text: JSON text next to text fed previously
+        :return: Position in `text` next to '[' of the list, or None
+        """
+        for pos, char in enumerate(text):
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif char == u'\\':
+                    self._esc = True
+                elif char == u'"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last = u"".join(self._chars)
+                    continue
+                if self._depth == 1:
+                    self._chars.append(char)
+                continue
+
+            if char in u" \t\r\n":
+                continue
+
+            if char == u'[' and (self._matched if self.key is not None
+                                 else self._depth == 0):
+                return pos + 1
+
+            self._matched = False
+            if char == u'"':
+                (self._in_str, self._chars) = (True, [])
+            elif char in u"{[":
+                self._depth += 1
+            elif char in u"}]":
+                self._depth -= 1
+            elif char == u':' and self._depth == 1 and \
+                    self._last is not None:
+                self._matched = self._is_key()
+            self._last = None
+
+        return None
+
+
+def load_items_g(filepath, key="data"):
+    """
+    Load items of a list in given JSON file lazily one by one.
+
+    :param filepath: JSON file path may be compressed
+    :param key: Key of the list in the top level dict, or None if the top
+        level object is a list
+    :return: A generator yields items of the list
+    """
+    decoder = json.JSONDecoder()
+    finder = _ListFinder(key)
+    with _open(filepath) as inp:
+        idec = codecs.getincrementaldecoder("utf-8")()
+        (buf, pos, eof) = (u"", None, False)
+
+        while True:
+            if eof and (pos is None or pos >= len(buf)):
+                if pos is not None:
+                    raise ValueError("Unexpected EOF: " + filepath)
+                return
+
+            chunk = inp.read(CHUNK_SIZE)
+            eof = not chunk
+            buf = buf[pos or 0:] + idec.decode(chunk, final=eof)
+            pos = 0 if pos is not None else None
+
+            if pos is None:  # Search the start of the list.
+                pos = finder.feed(buf)
+                if pos is None:
+                    buf = u""  # Fed already.
+                    continue
+
+            while True:
+                while pos < len(buf) and buf[pos] in u" \t\r\n,":
+                    pos += 1
+                if pos >= len(buf):
+                    break
+                if buf[pos] == u']':
+                    return
+                try:
+                    (item, end) = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    break  # Incomplete item; read more.
+                if end >= len(buf) and not eof:
+                    break  # Item such as a number may be incomplete.
+                yield item
+                pos = end
+
+# vim:sw=4:ts=4:et:
@@ -11,147 +11,69 @@
 from __future__ import absolute_import
 from operator import itemgetter
 
+import atexit
 import datetime
 import functools
 import logging
 import os.path
 import os
+import threading
 import tablib
 
 import fleure.analysis
 import fleure.archive
+import fleure.cas
 import fleure.config
+import fleure.cvecache
+import fleure.cvedb
+import fleure.cvefetch
+import fleure.dates
+import fleure.delta
 import fleure.depgraph
+import fleure.fleetdb
+import fleure.fleetidx
 import fleure.globals
 import fleure.datasets
+import fleure.reports
+import fleure.scheduler
 import fleure.utils
+import fleure.xlsx
 
 from fleure.globals import _, profile
-from fleure.datasets import make_dataset
 
 
 LOG = logging.getLogger("fleure")
 
 
 def dump_xls(dataset, filepath):
-    """XLS dump function"""
+    """Legacy XLS dump function, see also :func:`fleure.xlsx.dump_xlsx`"""
     book = tablib.Databook(dataset)
     with open(filepath, 'wb') as out:
         out.write(book.xls)
 
 
-def analyze_and_dump_results(host, rpms, errata, updates, dumpdir=None):
+def analyze_and_dump_results(host, rpms, errata, updates, dumpdir=None,
+                             depgraph=True, kwcache=None):
     """
-    Analyze and dump package level static analysis results.
+    Analyze and dump package level static analysis results. Only the sheets
+    and outputs requested with `host.reports` are made, see
+    :mod:`fleure.reports`.
 
     :param host: host object function :function:`prepare` returns
     :param rpms: A list of installed RPMs
     :param errata: A list of applicable errata
     :param updates: A list of update RPMs
     :param dumpdir: Dir to save results
+    :param depgraph: Dump RPM dependency graph also if True
+    :param kwcache: A dict to cache keywords matched for each errata shared
+        among analysis of subsets of same errata
     """
     if dumpdir is None:
         dumpdir = host.workdir
 
-    dargs = dict(score=host.cvss_min_score, keywords=host.errata_keywords,
-                 pkeywords=host.errata_pkeywords, core_rpms=host.core_rpms)
-    rpmkeys = host.rpmkeys
-
-    installed = dict(list=rpms, list_rebuilt=[], list_replaced=[],
-                     list_from_others=[])
-    for pkg in rpms:
-        for key in ("rebuilt", "replaced", "from_others"):
-            if pkg.get(key, False):
-                installed["list_" + key].append(pkg)
-
-    nps = len(rpms)
-    nus = len(updates)
-
-    ers = fleure.analysis.analyze_errata(errata, **dargs)
-    data = dict(errata=ers,
-                installed=installed,
-                updates=dict(list=updates,
-                             rate=[(_("packages need updates"), nus),
-                                   (_("packages not need updates"),
-                                    nps - nus)]))
-
-    host.save(data, "summary", dumpdir)
-    fleure.depgraph.dump_depgraph(host.root, ers, host.workdir,
-                                  tpaths=host.tpaths)
-    # TODO: Keep DRY principle.
-    lrpmkeys = [_("name"), _("epoch"), _("version"), _("release"), _("arch")]
-
-    rpmdkeys = list(rpmkeys) + ["summary", "vendor", "buildhost"]
-    lrpmdkeys = lrpmkeys + [_("summary"), _("vendor"), _("buildhost")]
-
-    sekeys = ("advisory", "severity", "synopsis", "url", "update_names")
-    lsekeys = (_("advisory"), _("severity"), _("synopsis"), _("url"),
-               _("update_names"))
-    bekeys = ("advisory", "keywords", "synopsis", "url", "update_names")
-    lbekeys = (_("advisory"), _("keywords"), _("synopsis"), _("url"),
-               _("update_names"))
-
-    mds = [fleure.analysis.mk_overview_dataset(data, **dargs),
-           make_dataset((data["errata"]["rhsa"]["list_latest_critical"] +
-                         data["errata"]["rhsa"]["list_latest_important"]),
-                        _("Cri-Important RHSAs (latests)"), sekeys, lsekeys),
-           make_dataset(sorted(data["errata"]["rhsa"]["list_critical"],
-                               key=itemgetter("update_names")) +
-                        sorted(data["errata"]["rhsa"]["list_important"],
-                               key=itemgetter("update_names")),
-                        _("Critical or Important RHSAs"), sekeys, lsekeys),
-           make_dataset(data["errata"]["rhba"]["list_by_kwds_of_core_rpms"],
-                        _("RHBAs (core rpms, keywords)"), bekeys, lbekeys),
-           make_dataset(data["errata"]["rhba"]["list_by_kwds"],
-                        _("RHBAs (keyword)"), bekeys, lbekeys),
-           make_dataset(data["errata"]["rhba"]["list_latests_of_core_rpms"],
-                        _("RHBAs (core rpms, latests)"), bekeys, lbekeys),
-           make_dataset(data["errata"]["rhsa"]["list_critical_updates"],
-                        _("Update RPMs by RHSAs (Critical)"), rpmkeys,
-                        lrpmkeys),
-           make_dataset(data["errata"]["rhsa"]["list_important_updates"],
-                        _("Updates by RHSAs (Important)"), rpmkeys, lrpmkeys),
-           make_dataset(data["errata"]["rhba"]["list_updates_by_kwds"],
-                        _("Updates by RHBAs (Keyword)"), rpmkeys, lrpmkeys)]
-
-    score = host.cvss_min_score
-    if score > 0:
-        cvss_ds = [
-            make_dataset(data["errata"]["rhsa"]["list_higher_cvss_score"],
-                         _("RHSAs (CVSS score >= %.1f)") % score,
-                         ("advisory", "severity", "synopsis",
-                          "cves", "cvsses_s", "url"),
-                         (_("advisory"), _("severity"), _("synopsis"),
-                          _("cves"), _("cvsses_s"), _("url"))),
-            make_dataset(data["errata"]["rhsa"]["list_higher_cvss_score"],
-                         _("RHBAs (CVSS score >= %.1f)") % score,
-                         ("advisory", "synopsis", "cves", "cvsses_s", "url"),
-                         (_("advisory"), _("synopsis"), _("cves"),
-                          _("cvsses_s"), _("url")))]
-        mds.extend(cvss_ds)
-
-    for key, title in (("list_rebuilt", _("Rebuilt RPMs")),
-                       ("list_replaced", _("Replaced RPMs")),
-                       ("list_from_others", _("RPMs from other vendors"))):
-        if data["installed"][key]:
-            mds.append(make_dataset(data["installed"][key], title, rpmdkeys,
-                                    lrpmdkeys))
-
-    dump_xls(mds, os.path.join(dumpdir, "errata_summary.xls"))
-
-    if host.details:
-        dds = [make_dataset(errata, _("Errata Details"),
-                            ("advisory", "type", "severity", "synopsis",
-                             "description", "issue_date", "update_date", "url",
-                             "cves", "bzs", "update_names"),
-                            (_("advisory"), _("type"), _("severity"),
-                             _("synopsis"), _("description"), _("issue_date"),
-                             _("update_date"), _("url"), _("cves"),
-                             _("bzs"), _("update_names"))),
-               make_dataset(updates, _("Update RPMs"), rpmkeys, lrpmkeys),
-               make_dataset(rpms, _("Installed RPMs"), rpmdkeys, lrpmdkeys)]
-
-        dump_xls(dds, os.path.join(dumpdir, "errata_details.xls"))
+    rep = fleure.reports.Report(host, rpms, errata, updates, kwcache=kwcache)
+    fleure.reports.dump_reports(rep, dumpdir, host.get("reports"),
+                                depgraph=depgraph)
 
 
 @profile
@@ -189,6 +111,9 @@ def prepare(host):
         LOG.error(_("Root dir is not ready. Error was: %s"), host.error)
         return
 
+    if host.get("castore"):
+        fleure.cas.unlink_results(host.workdir)  # Not to modify objects.
+
     LOG.info(_("%s: Start to initialize: root=%s, backend=%s"),
              host.hid, host.root, host.backend)
     base = host.init_base()
@@ -209,67 +134,207 @@ def prepare(host):
         host.available = True
 
 
+def _delta_subdir(ref, nrefs=1):
+    """
+    :param ref: An instance of :class:`fleure.delta.RefStore`
+    :param nrefs: Number of references
+    :return: Name of sub dir to save delta analysis results
+
+    >>> ref = fleure.delta.RefStore(name="/tmp/results/2017-10-01/")
+    >>> _delta_subdir(ref)
+    'delta'
+    >>> _delta_subdir(ref, 2)
+    'delta_2017-10-01'
+    """
+    if nrefs < 2:
+        return "delta"
+
+    return "delta_" + os.path.basename(os.path.normpath(ref.name))
+
+
+_CVE_SOURCES = dict()  # {(pid, options): (cache or None, fetcher)}
+_CVE_LOCK = threading.Lock()
+
+
+def _cve_sources(host):
+    """
+    Get the cache and the fetcher of CVSS data shared among hosts analyzed
+    in this process, so that pages fetched are revalidated with validators
+    kept in the cache and the rate of requests is limited among hosts, and
+    processes use the same cache also.
+
+    :param host: host object function :function:`prepare` returns
+    :return: A tuple of (:class:`fleure.cvecache.CveCache` object or None,
+        :class:`fleure.cvefetch.Fetcher` object)
+    """
+    cpath = None
+    if not host.offline:
+        cpath = host.cve_cache or os.path.join(host.cachedir,
+                                               "fleure_cves.db")
+    key = (os.getpid(), cpath, host.cve_cache_ttl, host.cve_timeout,
+           host.cve_rate)
+    with _CVE_LOCK:
+        if key not in _CVE_SOURCES:
+            (cache, pages, reserve) = (None, None, None)
+            if cpath is not None:
+                if not os.path.exists(os.path.dirname(cpath)):
+                    os.makedirs(os.path.dirname(cpath))
+                cache = fleure.cvecache.CveCache(cpath,
+                                                 ttl=host.cve_cache_ttl)
+                (pages, reserve) = (fleure.cvecache.Pages(cache),
+                                    cache.reserve)
+
+            limiter = fleure.cvefetch.RateLimiter(host.cve_rate, reserve)
+            fetcher = fleure.cvefetch.Fetcher(timeout=host.cve_timeout,
+                                              cache=pages, limiter=limiter)
+            _CVE_SOURCES[key] = (cache, fetcher)
+
+        return _CVE_SOURCES[key]
+
+
+@atexit.register
+def _close_cve_sources():
+    """Close the caches and the fetchers of CVSS data of this process."""
+    with _CVE_LOCK:
+        for key, objs in _CVE_SOURCES.items():
+            if key[0] == os.getpid():  # Not of the parent process forked.
+                for obj in objs:
+                    if obj is not None:
+                        obj.close()
+        _CVE_SOURCES.clear()
+
+
+def list_errata_and_updates(host):
+    """
+    List errata and updates of the host with its backend, and complement
+    CVSS data of CVEs of errata.
+
+    :param host: host object function :function:`prepare` returns
+    :return: A tuple of (a list of errata, a list of update packages)
+    """
+    if host.base is None:  # Released after prepared in low memory mode.
+        LOG.info(_("%s: Re-initialize the backend released"), host.hid)
+        host.init_base()
+        host.base.prepare()
+
+    LOG.info(_("%s: Analyzing errata and packages ..."), host.hid)
+    ups = host.base.list_updates()
+
+    p2na = itemgetter("name", "arch")
+    calls = (functools.partial(fleure.datasets.complement_an_errata,
+                               updates=set(p2na(u) for u in ups),
+                               to_update_fn=p2na))
+    ers = host.base.list_errata(calls)
+
+    if host.cvss_min_score > 0:
+        cvedb = None
+        try:
+            if host.cvedb:
+                LOG.info(_("%s: Lookup CVSS data from %s"), host.hid,
+                         host.cvedb)
+                cvedb = fleure.cvedb.CveStore(host.cvedb)
+
+            (cache, fetcher) = _cve_sources(host)
+            fleure.datasets.complement_cves(ers, cvedb, host.offline,
+                                            fetcher, cache)
+        finally:
+            if cvedb is not None:
+                cvedb.close()
+
+    return (ers, ups)
+
+
 @profile
-def analyze(host):
+def analyze(host, errata=None, updates=None):
     """
     :param host: host object function :function:`prepare` returns
+    :param errata: A list of errata of the host computed already or None
+    :param updates: A list of update packages of the host computed already
+        or None
     """
     metadata = dict(id=host.hid, root=host.root, workdir=host.workdir,
-                    repos=host.repos, backend=host.base.name,
+                    repos=host.repos, backend=host.backend,
                     score=host.cvss_min_score, keywords=host.errata_keywords,
                     pkeywords=host.errata_pkeywords,
                     installed=len(host.installed), hosts=[host.hid, ],
                     generated=datetime.datetime.now().strftime("%F %T"),
                     period=host.period, refdir=host.refdir)
-    host.save(metadata, "metadata")
+    if host.get("castore"):
+        fleure.cas.unlink_results(host.workdir)  # Not to modify objects.
 
-    LOG.info(_("%s: Analyzing errata and packages ..."), host.hid)
-    host.updates = ups = host.base.list_updates()
+    host.save(metadata, "metadata")
 
-    p2na = itemgetter("name", "arch")
-    calls = (functools.partial(fleure.datasets.complement_an_errata,
-                               updates=set(p2na(u) for u in ups),
-                               to_update_fn=p2na,
-                               score=host.cvss_min_score))
-    host.errata = ers = host.base.list_errata(calls)
+    if errata is None or updates is None:
+        (errata, updates) = list_errata_and_updates(host)
+    else:
+        LOG.info(_("%s: Reuse errata and updates given"), host.hid)
 
+    (host.errata, host.updates) = (ers, ups) = (errata, updates)
     host.save(ers, "errata")
     host.save(ups, "updates")
     LOG.info(_("%s: Found %d errata and %d updates, saved the lists"),
              host.hid, len(ers), len(ups))
 
     ips = host.installed
-    analyze_and_dump_results(host, ips, ers, ups)
-    LOG.info(_("%s: Saved analysis results in %s"), host.hid, host.workdir)
+    kwcache = dict()  # Keywords matched are same in any subsets of `ers`.
 
+    # Variants of reports, full, periods and deltas, are independent each
+    # other and will be analyzed and dumped in threads, so that I/O of
+    # dumping them overlaps, see fleure.scheduler.run_tasks.
+    tasks = [((host, ips, ers, ups), dict(kwcache=kwcache))]
+
+    # Errata are sorted by issue dates only once and sliced for each period.
     if host.period:
-        (start, end) = host.period
-        LOG.info(_("%s: Analyzing errata and packages [%s ~ %s]"),
-                 host.hid, start, end)
-        pdir = os.path.join(host.workdir, "%s_%s" % (start, end))
-        if not os.path.exists(pdir):
-            LOG.debug(_("%s: Creating period working dir %s"), host.hid, pdir)
-            os.makedirs(pdir)
-
-        pes = [e for e in ers
-               if fleure.dates.in_period(e["issue_date"], start, end)]
-        analyze_and_dump_results(host, ips, pes, ups, pdir)
-        LOG.info(_("%s [%s ~ %s]: Found %d errata and saved"),
-                 host.hid, start, end, len(pes))
+        periods = fleure.dates.slice_by_periods(ers, host.period)
+        for (start, end), pes in periods:
+            pdir = os.path.join(host.workdir, "%s_%s" % (start, end))
+            if not os.path.exists(pdir):
+                LOG.debug(_("%s: Creating period working dir %s"),
+                          host.hid, pdir)
+                os.makedirs(pdir)
+
+            LOG.info(_("%s [%s ~ %s]: Found %d errata"),
+                     host.hid, start, end, len(pes))
+            tasks.append(((host, ips, pes, ups, pdir),
+                          dict(depgraph=False, kwcache=kwcache)))
 
     if host.refdir:
+        refdirs = host.refdir
+        if not isinstance(refdirs, (list, tuple)):
+            refdirs = [refdirs]
+
         LOG.debug(_("%s [delta]: Analyze delta errata data by refering %s"),
-                  host.hid, host.refdir)
-        (ers, ups) = fleure.datasets.compute_delta(host.refdir, ers, ups)
-        host.save(ers, "errata", subdir="delta")
-        host.save(ups, "updates", subdir="delta")
-        LOG.info(_("%s [delta]: Found %d errata and %d updates, save the "
-                   "lists"), host.hid, len(ers), len(ups))
+                  host.hid, ", ".join(refdirs))
+        refs = [fleure.delta.RefStore.load(d, idxdir=host.cachedir)
+                for d in refdirs]
+
+        # Compute deltas against all references in one pass.
+        for ref, des, dus in fleure.delta.compute_deltas(refs, ers, ups):
+            ddir = os.path.join(host.workdir, _delta_subdir(ref, len(refs)))
+            if not os.path.exists(ddir):
+                os.makedirs(ddir)
+
+            host.save(des, "errata", ddir)
+            host.save(dus, "updates", ddir)
+            LOG.info(_("%s [delta]: Found %d errata and %d updates since %s, "
+                       "save the lists"), host.hid, len(des), len(dus),
+                     ref.name)
+            tasks.append(((host, ips, des, dus, ddir),
+                          dict(depgraph=False, kwcache=kwcache)))
+
+    LOG.info(_("%s: Analyzing %d variants of errata and packages ..."),
+             host.hid, len(tasks))
+    fleure.scheduler.run_tasks(analyze_and_dump_results, tasks, host.workers)
+    LOG.info(_("%s: Saved analysis results in %s"), host.hid, host.workdir)
+
+    if host.get("castore"):
+        fleure.cas.store_results(host.workdir, host.castore)
+
+    if host.get("fleetdb"):
+        fleure.fleetdb.save_host(host, host.fleetdb)
 
-        LOG.info(_("%s: Analyzing delta errata and packages ..."), host.hid)
-        analyze_and_dump_results(host, ips, ers, ups)
-        LOG.info(_("%s: Saved delta analysis results in %s"),
-                 host.hid, host.workdir)
+    if host.get("fleetidx"):
+        fleure.fleetidx.save_host(host, host.fleetidx)
 
 
 def set_loglevel(verbosity=0, backend=False):
@@ -292,18 +357,21 @@ def set_loglevel(verbosity=0, backend=False):
         getattr(mod, "LOG").setLevel(llvl)
 
 
-def archive_report(reportdir, output):
+def archive_report(reportdir, output, fmt="zip", level=None):
     """Archive analysis report.
 
     :reportdir: Dir where generated report files exist
     :output: Output filename
+    :fmt: Archive format, see :data:`fleure.archive.ARCHIVE_FORMATS`
+    :level: Compression level or None (default)
     :return:
         Absolute path of archive file made or None might indicates some
         failures before/during making archive.
     """
     filenames = fleure.globals.REPORT_FILES
     if all(os.path.exists(os.path.join(reportdir, fn)) for fn in filenames):
-        arcpath = fleure.archive.archive_report(reportdir, output)
+        arcpath = fleure.archive.archive_report(reportdir, output, fmt=fmt,
+                                                level=level)
         LOG.info(_("Archived results: %s"), arcpath)
         return arcpath
 
@@ -341,8 +409,11 @@ def main(root_or_arc_path, hid=None, verbosity=0, **kwargs):
         analyze(host)
 
     if kwargs.get("archive", False):
-        outname = "report-%s-%s.zip" % (host.hid, fleure.globals.TODAY)
-        return archive_report(host.workdir, outname)
+        fmt = kwargs.get("archive_format") or "zip"
+        outname = fleure.archive.archive_filename("%s-%s" % (
+            host.hid, fleure.globals.TODAY), fmt)
+        return archive_report(host.workdir, outname, fmt,
+                              kwargs.get("archive_level"))
 
     return host.workdir
 
@@ -11,8 +11,8 @@ A module to extend fleure.main for multiple host analysis.
 """
 from __future__ import absolute_import
 
+import collections
 import glob
-import itertools
 import logging
 import multiprocessing
 import operator
@@ -23,13 +23,31 @@ import shutil
 from fleure.globals import _, profile
 
 import fleure.archive
+import fleure.cas
+import fleure.checkpoint
+import fleure.dedup
+import fleure.fleetdb
+import fleure.fleetidx
+import fleure.globals
+import fleure.jsonio
 import fleure.main
+import fleure.pipeline
 import fleure.rpmutils
+import fleure.scheduler
+import fleure.spool
 import fleure.utils
 
 
 LOG = logging.getLogger(__name__)
 
+MIB = 1024 * 1024
+MEM_RESERVE = 1024  # MiB of memory to keep available in low memory mode.
+
+# Suffixes of RPM DB archives removed to compute host IDs, see hid_of_path.
+ARCHIVE_SUFFIXES = (".tar.xz", ".tar.gz", ".tar.bz2", ".tar.zst", ".tar",
+                    ".txz", ".tgz", ".tbz2", ".zip")
+RPMDB_SUFFIXES = ("_rpmdb", "_var_lib_rpm")
+
 
 def hosts_rpmroot_g(hosts_datadir):
     """
@@ -94,16 +112,65 @@ def _hids_from_apaths(apaths):
     return [_gen_hid(p, sfx) for p in apaths]
 
 
-@profile
-def configure(hosts_datadir, workdir=None, **kwargs):
+def hid_of_path(hpath):
     """
-    Scan and collect hosts' basic data (installed rpms list, etc.).
+    Compute host ID from the path of host's data archive by removing known
+    suffixes, or the name of dir in which host's data files are. Host IDs
+    do not depend on other archives unlike :func:`_hids_from_apaths`.
 
-    :param hosts_datadir: Dir in which rpm db roots of hosts exist
-    :param workdir: Working dir to save results
+    :param hpath: Path to host's data archive or dir
 
-    :return: A generator to yield a tuple,
-        (host_identity, host_rpmroot or None)
+    >>> hid_of_path("/tmp/r/rhel-6-1_var_lib_rpm.tar.xz")
+    'rhel-6-1'
+    >>> hid_of_path("/tmp/r/host1_rpmdb.zip"), hid_of_path("/tmp/r/h2.tgz")
+    ('host1', 'h2')
+    """
+    hid = os.path.basename(os.path.normpath(hpath))
+    if os.path.isdir(hpath):
+        return hid
+
+    for suffixes in (ARCHIVE_SUFFIXES, RPMDB_SUFFIXES):
+        sfx = next((s for s in suffixes if hid.endswith(s)), None)
+        if sfx is not None and hid != sfx:
+            hid = hid[:-len(sfx)]
+
+    return hid
+
+
+def extract_host(hid, hpath, hworkdir):
+    """
+    Extract the RPM DB archive of a host if needed.
+
+    :param hid: Host ID
+    :param hpath: Path to the RPM DB root dir or its archive of the host
+    :param hworkdir: Working dir of the host
+    :return: A tuple of (hid, the RPM DB root, hworkdir)
+    """
+    if not os.path.exists(hworkdir):
+        os.makedirs(hworkdir)
+
+    if os.path.isdir(hpath):
+        return (hid, hpath, hworkdir)
+
+    fleure.archive.extract_rpmdb_archive(hpath, hworkdir)
+    return (hid, hworkdir, hworkdir)
+
+
+def _input_hash(hid, hpath):
+    """
+    :return: A tuple of (hid, the input hash of the host)
+    """
+    return (hid, fleure.checkpoint.input_hash(hpath))
+
+
+def common_cachedir(workdir):
+    """Common cache dir of hosts."""
+    return os.path.join(workdir, "_cache")
+
+
+def setup_workdir(hosts_datadir, workdir=None):
+    """
+    :return: Absolute path of the working dir to save results made if needed
     """
     if workdir is None:
         LOG.info(_("Set workdir to hosts_datadir: %s"), hosts_datadir)
@@ -113,61 +180,151 @@ def configure(hosts_datadir, workdir=None, **kwargs):
             LOG.debug(_("Creating working dir: %s"), workdir)
             os.makedirs(workdir)
 
-    hpaths = sorted(glob.glob(os.path.join(hosts_datadir, '*')))
-    hids = _hids_from_apaths(hpaths)
-    cachedir = os.path.join(workdir, "_cache")  # Use common cache dir.
+    return os.path.abspath(workdir)  # Not depends on the current dir.
 
-    for hid, hpath in itertools.izip(hids, hpaths):
-        hworkdir = os.path.join(workdir, hid)
-        if not os.path.exists(hworkdir):
-            os.makedirs(hworkdir)
 
-        if os.path.isdir(hpath):
-            hroot = hpath
-        else:
-            hroot = hworkdir
-            fleure.archive.extract_rpmdb_archive(hpath, hworkdir)
+def list_hpaths(hosts_datadir, hpaths=None, hid_fn=None):
+    """
+    :param hosts_datadir: Dir in which rpm db roots of hosts exist
+    :param hpaths: A list of paths of hosts in `hosts_datadir` to list only
+        or None (all hosts)
+    :param hid_fn: A callable takes a path and returns the host ID, e.g.
+        :func:`hid_of_path`, or None to compute host IDs from the common
+        suffix of all paths, see :func:`_hids_from_apaths`
+    :return: A list of tuples of (hid, path to the RPM DB root or archive)
+    """
+    apaths = sorted(glob.glob(os.path.join(hosts_datadir, '*')))
+    hids = _hids_from_apaths(apaths) if hid_fn is None else \
+        [hid_fn(p) for p in apaths]
+    return [(h, p) for h, p in zip(hids, apaths)
+            if hpaths is None or p in hpaths]
+
+
+def configure_host(hid, hroot, hworkdir, digest=None, **kwargs):
+    """
+    :param hid: Host ID
+    :param hroot: The RPM DB root of the host extracted
+    :param hworkdir: Working dir of the host
+    :param digest: The input hash of the host, see :mod:`fleure.checkpoint`
+    :return: A :class:`~fleure.config.Host` object configured or None
+    """
+    kwargs["hid"] = hid
+    kwargs["workdir"] = hworkdir
+    host = fleure.main.configure(hroot, **kwargs)
+    if host is not None:
+        host.input_hash = digest
 
-        kwargs["hid"] = hid
-        kwargs["workdir"] = hworkdir
-        kwargs["cachedir"] = cachedir
+    return host
 
-        yield fleure.main.configure(hroot, **kwargs)
+
+@profile
+def configure(hosts_datadir, workdir=None, ckpt=None, hpaths=None,
+              hid_fn=None, **kwargs):
+    """
+    Scan and collect hosts' basic data (installed rpms list, etc.).
+
+    RPM DB archives of hosts are extracted in parallel with a bounded number
+    of workers, and hosts are configured and yielded as soon as each archive
+    is ready.
+
+    :param hosts_datadir: Dir in which rpm db roots of hosts exist
+    :param workdir: Working dir to save results
+    :param ckpt: A :class:`fleure.checkpoint.Checkpoint` object to skip
+        hosts done in previous runs with same inputs, or None
+    :param hpaths: See :func:`list_hpaths`
+    :param hid_fn: See :func:`list_hpaths`
+
+    :return: A generator to yield :class:`~fleure.config.Host` objects
+        configured in order of completion
+    """
+    workdir = setup_workdir(hosts_datadir, workdir)
+    hpaths = list_hpaths(hosts_datadir, hpaths, hid_fn)
+    kwargs["cachedir"] = common_cachedir(workdir)
+
+    digests = dict()
+    if ckpt is not None:
+        digests = dict(fleure.scheduler.run_tasks_g(
+            _input_hash, [(hp, {}) for hp in hpaths], kwargs.get("workers")))
+        done = [h for h, _p in hpaths if ckpt.is_done(h, digests[h])]
+        if done:
+            LOG.info(_("Skip %d hosts done in previous runs: %s"),
+                     len(done), ", ".join(done))
+            hpaths = [(h, p) for h, p in hpaths if h not in done]
+
+    tasks = [((hid, hpath, os.path.join(workdir, hid)), {}) for hid, hpath
+             in hpaths]
+    for hid, hroot, hworkdir in fleure.scheduler.run_tasks_g(
+            extract_host, tasks, kwargs.get("workers")):
+        host = configure_host(hid, hroot, hworkdir, digests.get(hid),
+                              **kwargs)
+        if host is not None:
+            yield host
+
+
+def prepare_host(host, refs):
+    """
+    Prepare a host. The first host of each set of repos populates repo
+    metadata and the rest of hosts refer the same repos reuse it.
+
+    :param host: A :class:`~fleure.config.Host` object configured
+    :param refs: A dict of {repos: the host populated repo metadata}
+    :return: True if the host is available
+    """
+    repos = tuple(host.repos)
+    ref = refs.get(repos)
+    if ref is None:
+        refs[repos] = host
+    else:  # It refers same repos as the host `ref`.
+        host.cachedir = ref.cachedir
+        host.cacheonly = True
+        host.configure()  # Re-configure it.
+
+    fleure.main.prepare(host)
+    return host.available
 
 
 @profile
-def prepare_itr(hosts):
+def prepare_itr(hosts, refs=None, release=False):
     """
     Prepare hosts, prepare cache dir, populate repo metadata, etc.
 
-    :param hosts: A list of :class:`~fleure.config.Host` objects
+    The first host of each set of repos populates repo metadata and the rest
+    of hosts refer the same repos reuse it, so that `hosts` may be an
+    iterator yields hosts as soon as each of them is configured.
 
-    :return: A list of available :class:`~fleure.config.Host` objects
+    :param hosts: An iterable of :class:`~fleure.config.Host` objects
+    :param refs: A dict of {repos: the host populated repo metadata} kept
+        to reuse the metadata in later calls, or None
+    :param release: Release backends of hosts prepared at once if True, as
+        they are analyzed in other processes, or their backends are made
+        again only while they are analyzed in low memory mode
+
+    :return: A generator yields available :class:`~fleure.config.Host`
+        objects
     """
-    for hgs in fleure.utils.sgroupby(hosts, operator.attrgetter("repos")):
-        if hgs:
-            (ref, rest) = (hgs[0], hgs[1:])
-            for host in rest:  # These refer same repos as the host `ref`.
-                host.cachedir = ref.cachedir
-                host.cacheonly = True
-                host.configure()  # Re-configure it.
+    if refs is None:
+        refs = dict()
 
     for host in hosts:
-        fleure.main.prepare(host)
-        if host.available:
+        available = prepare_host(host, refs)
+        if release:
+            host.release()
+        if available:
             yield host
 
 
 @profile
-def prepare(hosts):
+def prepare(hosts, refs=None, release=False):
     """
     Prepare hosts, prepare cache dir, populate repo metadata, etc.
 
     :param hosts: A list of :class:`~fleure.config.Host` objects
+    :param refs: See :func:`prepare_itr`
+    :param release: See :func:`prepare_itr`
 
     :return: A list of available :class:`~fleure.config.Host` objects
     """
-    return list(prepare_itr(hosts))
+    return list(prepare_itr(hosts, refs, release))
 
 
 def p2nevra(pkg):
@@ -180,34 +337,302 @@ def p2nevra(pkg):
 
 def mk_symlinks_to_ref(href, hsrest):
     """
+    Make relative symlinks to result files of the reference host. The
+    current dir is never changed as other threads may use relative paths.
+
     :param href: Reference host object
     :param hsrest: A list of hosts having same installed rpms as `href`
     """
-    orgdir = os.path.abspath(os.curdir)
     for hst in hsrest:
-        os.chdir(hst.workdir)
-        href_workdir = os.path.join('..', href.hid)  # TODO: Keep consistency.
         LOG.info(_("%s: Make symlinks to results in %s/"),
-                 hst.hid, href_workdir)
-        for src in glob.glob(os.path.join(href_workdir, '*.*')):
-            dst = os.path.basename(src)
-            if not os.path.exists(dst):
+                 hst.hid, href.workdir)
+        for src in glob.glob(os.path.join(href.workdir, '*.*')):
+            dst = os.path.join(hst.workdir, os.path.basename(src))
+            if not os.path.lexists(dst):
                 LOG.debug(_("Make a symlink to %s"), src)
-                os.symlink(src, dst)
+                os.symlink(os.path.relpath(src, hst.workdir), dst)
 
-        metadatafile = os.path.join(href_workdir, "metadata.json")
+        # It's replaced atomically not to be read while it's written.
+        metadatafile = fleure.jsonio.find(os.path.join(href.workdir,
+                                                       "metadata.json"))
         shutil.copy2(metadatafile, metadatafile + ".save")
         metadata = fleure.utils.json_load(metadatafile)
         metadata["hosts"].append(hst.hid)
         fleure.utils.json_dump(metadata, metadatafile)
 
-        os.chdir(orgdir)
+
+def mk_links_to_ref(href, hsrest, castore):
+    """
+    Make links to result files of the reference host in the content-addressed
+    store instead of symlinks to the files in its working dir.
+
+    :param href: Reference host object
+    :param hsrest: A list of hosts having same installed rpms as `href`
+    :param castore: Top dir of the content-addressed store
+    """
+    manifest = fleure.cas.load_manifest(href.workdir)
+    if manifest is None:
+        LOG.warning(_("%s: No manifest found"), href.hid)
+        return
+
+    metadata = fleure.utils.json_load(
+        fleure.jsonio.find(os.path.join(href.workdir, "metadata.json")))
+    for hst in hsrest:
+        LOG.info(_("%s: Make links to results of %s"), hst.hid, href.hid)
+        fleure.cas.link_results(manifest, castore, hst.workdir)
+        hst.save(dict(metadata, id=hst.hid, hosts=[hst.hid], ref=href.hid),
+                 "metadata")
+
+
+def link_same_hosts(href, hsrest, castore=None, fleetdb=None, fleetidx=None,
+                    **_kwargs):
+    """
+    Make links to the results of the reference host from hosts having same
+    installed RPMs as it, and save them into the fleet results database and
+    the fleet index.
+
+    :param href: Reference host object analyzed
+    :param hsrest: A list of hosts having same installed rpms as `href`
+    :param castore: Top dir of the content-addressed store or None
+    :param fleetdb: Path to the fleet results database or None
+    :param fleetidx: Path to the fleet index or None
+    """
+    if not hsrest:
+        return
+
+    LOG.info(_("Skip to analyze %s as its installed RPMs are exactly same "
+               "as %s's"), ','.join(x.hid for x in hsrest), href.hid)
+    if castore:
+        mk_links_to_ref(href, hsrest, castore)
+    else:
+        mk_symlinks_to_ref(href, hsrest)
+
+    if fleetdb:
+        with fleure.fleetdb.FleetDB(fleetdb) as fdb:
+            fdb.add_same_hosts(href, hsrest)
+
+    if fleetidx:
+        with fleure.fleetidx.FleetIndex(fleetidx) as fidx:
+            fidx.add_hosts(hsrest, hsrest[0].installed,
+                           _load_results(href, "errata"),
+                           _load_results(href, "updates"))
+
+
+# Reference hosts analyzed in other processes, see :func:`_load_results`.
+_RefHost = collections.namedtuple("_RefHost", "hid workdir")
+
+
+def _load_results(host, name):
+    """
+    :param host: Host object analyzed
+    :param name: Name of the results, "errata" or "updates"
+    :return: A list of the results of the host
+    """
+    res = getattr(host, name, None)
+    if res is None:  # Analyzed in other process.
+        path = fleure.jsonio.find(os.path.join(host.workdir, name + ".json"))
+        res = fleure.utils.json_load(path)["data"]
+
+    return res
+
+
+def analyze_near_host(host, href):
+    """
+    Analyze a host differs from the reference host only by a few RPMs
+    incrementally, see :mod:`fleure.dedup`.
+
+    :param host: Host object to analyze
+    :param href: Reference host object analyzed
+    """
+    (ers, ups) = fleure.dedup.apply_delta(_load_results(href, "errata"),
+                                          _load_results(href, "updates"),
+                                          host.installed)
+    fleure.main.analyze(host, ers, ups)
+
+
+def archive_reports(hosts, fmt="zip", level=None, workers=None):
+    """
+    Archive reports of hosts in parallel.
+
+    :param hosts: A list of :class:`fleure.config.Host` objects analyzed
+    :param fmt: Archive format, see :data:`fleure.archive.ARCHIVE_FORMATS`
+    :param level: Compression level or None (default)
+    :param workers: Max number of workers or None (number of CPUs)
+    :return: A list of paths of the archives made
+    """
+    hosts = [h for h in hosts
+             if all(os.path.exists(os.path.join(h.workdir, fn))
+                    for fn in fleure.globals.REPORT_FILES)]
+    outputs = [fleure.archive.archive_filename("%s-%s" % (
+        h.hid, fleure.globals.TODAY), fmt) for h in hosts]
+
+    arcpaths = fleure.archive.archive_reports([h.workdir for h in hosts],
+                                              outputs, fmt=fmt, level=level,
+                                              workers=workers)
+    LOG.info(_("Archived results of %d hosts"), len(arcpaths))
+    return arcpaths
+
+
+def analyze(host, href=None):
+    """Analyze a host in this process.
+
+    :param host: Host object to analyze
+    :param href: Reference host object analyzed to analyze `host`
+        incrementally from its results, or None to analyze it fully
+    :return: A record of the results, see :func:`analyze_job`
+    """
+    if href is None:
+        fleure.main.analyze(host)
+    else:
+        analyze_near_host(host, href)
+    return dict(hid=host.hid, available=True, errors=[],
+                errata=len(getattr(host, "errata", None) or []),
+                updates=len(getattr(host, "updates", None) or []))
+
+
+def mk_job(host, href=None):
+    """
+    Make a job spec to analyze a host in other process. Host objects hold
+    live backend objects, e.g. dnf.Base, cannot be passed to other processes
+    safely, so that a job has only plain data, the root, repos and options,
+    from which each worker makes its own backend.
+
+    :param host: A :class:`~fleure.config.Host` object configured
+    :param href: See :func:`analyze`
+    :return: A dict of the root and options of the host, can be pickled
+        and serialized in JSON
+    """
+    opts = dict(host)  # Configurations loaded from files already.
+    for key in ("conf_path", "backends"):  # Backends are made in workers.
+        opts.pop(key, None)
+    opts.update(hid=host.hid, workdir=host.workdir, repos=host.repos,
+                cachedir=host.cachedir, tpaths=host.tpaths)
+    job = dict(root=host.root, options=opts,
+               weight=len(getattr(host, "installed", None) or []))
+    if href is not None:  # Its results are loaded from files in workers.
+        job["ref"] = dict(hid=href.hid, workdir=href.workdir)
+
+    return job
+
+
+def analyze_job(job):
+    """
+    Analyze a host of the job, run in a worker process.
+
+    :param job: A dict of the job spec made by :func:`mk_job`
+    :return: A compact record of the results, a dict of host ID, its
+        availability, errors and the number of errata and updates found
+    """
+    host = fleure.main.configure(job["root"], **job["options"])
+    if host is not None:
+        fleure.main.prepare(host)
+        if host.available:
+            href = job.get("ref")
+            return analyze(host, None if href is None else _RefHost(**href))
+
+    hid = job["options"]["hid"]
+    LOG.error(_("%s: Failed to prepare the host in a worker"), hid)
+    return dict(hid=hid, available=False, errata=0, updates=0,
+                errors=[] if host is None else host.errors)
 
 
-def analyze(args):
-    """An wrapper to run fleure.main.analyze() in parallel.
+def spool_analyze_g(hosts, spooldir, hrefs=None):
     """
-    fleure.main.analyze(*args)
+    Analyze hosts with workers of the spool, see :mod:`fleure.spool`.
+
+    :param hosts: A list of :class:`~fleure.config.Host` objects to analyze
+        sorted in order to be analyzed
+    :param spooldir: Top dir of the spool shared with workers
+    :param hrefs: See :func:`analyze_g`
+    :return: Same as :func:`analyze_g`
+    """
+    hrefs = hrefs or dict()
+    spool = fleure.spool.Spool(spooldir)
+    jids = dict(("%06d-%s" % (idx, host.hid), host) for idx, host
+                in enumerate(hosts))
+    for jid, host in sorted(jids.items()):
+        spool.submit(jid, mk_job(host, hrefs.get(host.hid)))
+
+    LOG.info(_("Submitted %d jobs into the spool %s"), len(jids), spooldir)
+    for jid, res, done in spool.results_g(list(jids)):
+        if not done:
+            LOG.error(_("%s: Failed to analyze: %s"), jids[jid].hid,
+                      "\n".join(res.get("errors", [])))
+        yield (jids[jid], res)
+
+
+def job_weight(job):
+    """Weight of a job, roughly the memory needed to analyze the host."""
+    return job.get("weight") or 1
+
+
+def mk_pool(procs=None, low_memory=False, worker_max_tasks=None,
+            worker_max_rss=None, **_kwargs):
+    """
+    :param procs: Number of worker processes or None (number of CPUs)
+    :param low_memory: Admit jobs only if memory is enough for them
+    :param worker_max_tasks: Recycle workers after this number of jobs
+    :param worker_max_rss: Recycle workers once their RSS exceeded this MiB
+    :return: A pool of worker processes to run jobs made by :func:`mk_job`
+    """
+    if not (low_memory or worker_max_tasks or worker_max_rss):
+        return multiprocessing.Pool(procs, fleure.scheduler.set_worker)
+
+    return fleure.scheduler.RecyclingPool(
+        procs, worker_max_tasks,
+        worker_max_rss * MIB if worker_max_rss else None,
+        MEM_RESERVE * MIB if low_memory else None, job_weight)
+
+
+def analyze_g(hosts, multiproc=False, procs=None, spool=None, hrefs=None,
+              **kwargs):
+    """
+    Analyze hosts, in a pool of processes if `multiproc`. Hosts are fed into
+    the pool from a single queue in descending order of the number of
+    installed RPMs, roughly the cost of the analysis, so that larger jobs
+    start early and smaller ones fill cores idle at the end. Each worker
+    takes one job at a time and results come back in order of completion.
+
+    :param hosts: A list of :class:`~fleure.config.Host` objects to analyze
+    :param multiproc: Analyze hosts in parallel if True
+    :param procs: Number of worker processes or None (number of CPUs)
+    :param spool: Top dir of the spool to analyze hosts with workers on
+        multiple nodes, see :mod:`fleure.spool`, or None
+    :param hrefs: A dict of {host ID: reference host analyzed} to analyze
+        hosts incrementally from the results of reference hosts, see
+        :func:`analyze`, or None
+    :param kwargs: Options of the pool, see :func:`mk_pool`
+
+    :return: A generator yields tuples of (host, a record of the results,
+        see :func:`analyze_job`) in order of completion
+    """
+    hrefs = hrefs or dict()
+    hosts = sorted(hosts, key=ilen, reverse=True)
+    if spool:
+        for hres in spool_analyze_g(hosts, spool, hrefs):
+            yield hres
+        return
+
+    if not multiproc or len(hosts) < 2:
+        for host in hosts:
+            yield (host, analyze(host, hrefs.get(host.hid)))
+        return
+
+    hmap = dict((h.hid, h) for h in hosts)
+    procs = min(procs or multiprocessing.cpu_count(), len(hosts))
+    LOG.info(_("Analyze %d hosts with %d processes"), len(hosts), procs)
+
+    pool = mk_pool(procs, **kwargs)
+    try:
+        jobs = [mk_job(h, hrefs.get(h.hid)) for h in hosts]
+        for res in pool.imap_unordered(analyze_job, jobs, chunksize=1):
+            yield (hmap[res["hid"]], res)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
 
 
 def ilen(host):
@@ -215,14 +640,85 @@ def ilen(host):
     return len(host.installed)
 
 
-def hps(host):
-    """Host packages"""
-    return [p2nevra(p) for p in host.installed]
+def process(hosts, multiproc=False, ckpt=None, prefs=None, **kwargs):
+    """
+    Prepare, de-duplicate and analyze hosts configured.
+
+    :param hosts: An iterable of :class:`~fleure.config.Host` objects
+        configured
+    :param multiproc: Analyze hosts in parallel if True
+    :param ckpt: A :class:`fleure.checkpoint.Checkpoint` object to record
+        states of hosts processed, or None
+    :param prefs: `refs` of :func:`prepare_itr` to reuse repo metadata
+        populated in previous calls, or None
+    :return: A list of available :class:`~fleure.config.Host` objects
+    """
+    all_hosts = []  # Hosts configured including unavailable ones.
+
+    def _configure_g():
+        """Keep hosts configured."""
+        for host in hosts:
+            all_hosts.append(host)
+            yield host
+
+    def _mark(hosts, done=True):
+        """Record states of hosts processed."""
+        if ckpt is not None:
+            for host in hosts:
+                ckpt.mark(host, done)
 
+    # Backends of hosts are released just after they were prepared in low
+    # memory mode, not to keep them of all hosts until they are analyzed.
+    low_memory = kwargs.get("low_memory")
+    hosts = prepare(_configure_g(), prefs, low_memory)
 
-def gby(itms, keyfun):
-    """Groupby."""
-    return itertools.groupby(sorted(itms, key=keyfun), keyfun)
+    LOG.info(_("Analyze %d/%d hosts"), len(hosts), len(all_hosts))
+    _mark([h for h in all_hosts if not h.available], False)
+
+    # Group hosts by fingerprints of installed rpms to degenerate these hosts
+    # and avoid to analyze for same installed RPMs more than once.
+    hset = dict((h.hid, hs) for h, hs
+                in fleure.dedup.group_by_fingerprint(hosts))
+    (refs, nears) = fleure.dedup.find_near_hosts(
+        [h for h in hosts if h.hid in hset],
+        kwargs.get("max_diffs", fleure.dedup.MAX_DIFFS))
+
+    # Reference hosts are analyzed fully at first, and then hosts near to
+    # them incrementally from their results, in the pool or the spool also.
+    # Hosts near to or same as hosts failed are analyzed fully instead.
+    hrefs = dict()  # {hid: the reference host of the near host}
+    while refs:
+        (orphans, rest) = ([], [])
+        for host, res in analyze_g(refs, multiproc, hrefs=hrefs, **kwargs):
+            hsame = hset.pop(host.hid, [])
+            if low_memory:
+                host.release()  # Results are loaded from files if needed.
+
+            if not res["available"]:
+                _mark([host], False)
+                orphans.extend(nears.pop(host.hid, []))
+                if hsame:
+                    hset[hsame[0].hid] = hsame[1:]
+                    orphans.append(hsame[0])
+                continue
+
+            link_same_hosts(host, hsame, **kwargs)
+            _mark([host] + hsame)
+            for near in nears.pop(host.hid, []):
+                hrefs[near.hid] = host
+                rest.append(near)
+
+        if orphans:
+            LOG.warning(_("Analyze %d hosts fully as their reference hosts "
+                          "failed: %s"), len(orphans),
+                        ", ".join(h.hid for h in orphans))
+        refs = orphans + rest
+
+    if kwargs.get("archive"):
+        archive_reports(hosts, kwargs.get("archive_format") or "zip",
+                        kwargs.get("archive_level"), kwargs.get("workers"))
+
+    return hosts
 
 
 def main(hosts_datadir, workdir=None, verbosity=0, multiproc=False, **kwargs):
@@ -236,31 +732,18 @@ def main(hosts_datadir, workdir=None, verbosity=0, multiproc=False, **kwargs):
         in parallel as much as possible if True
     """
     fleure.main.set_loglevel(verbosity)
-    all_hosts = list(configure(hosts_datadir, workdir=workdir, **kwargs))
-    hosts = prepare(all_hosts)
-
-    LOG.info(_("Analyze %d/%d hosts"), len(hosts), len(all_hosts))
 
-    # Group hosts by installed rpms to degenerate these hosts and avoid to
-    # analyze for same installed RPMs more than once. his :: [[[h]]]
-    his = [[list(t1[1]) for t1 in gby(t0[1], hps)] for t0 in gby(hosts, ilen)]
+    ckpt = None
+    if kwargs.get("resume"):
+        topdir = workdir or hosts_datadir
+        ckpt = fleure.checkpoint.Checkpoint(topdir, kwargs,
+                                            common_cachedir(topdir))
 
-    for hss in his:
-        hset = [(hs[0], hs[1:]) for hs in hss]
-        hsdata = [hs[0] for hs in hset]
+    if kwargs.get("pipeline") and not kwargs.get("spool"):
+        fleure.pipeline.run(hosts_datadir, workdir, multiproc, ckpt, **kwargs)
+        return
 
-        if multiproc:
-            pool = multiprocessing.Pool(multiprocessing.cpu_count())
-            pool.map(fleure.main.analyze, hsdata)
-        else:
-            for host in hsdata:
-                fleure.main.analyze(host)
-
-        for hid, hsrest in hset:
-            if hsrest:
-                LOG.info(_("Skip to analyze %s as its installed RPMs are "
-                           "exactly same as %s's"),
-                         ','.join(x.hid for x in hsrest), hid)
-                mk_symlinks_to_ref(hid, hsrest)
+    process(configure(hosts_datadir, workdir=workdir, ckpt=ckpt, **kwargs),
+            multiproc, ckpt, **kwargs)
 
 # vim:sw=4:ts=4:et:
@@ -0,0 +1,248 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Staged pipeline of multihost analysis.
+
+Hosts flow through these stages connected with bounded queues, so that
+different hosts are in different stages at the same time and memory and
+disk usage are capped, see :func:`fleure.scheduler.run_stages`:
+
+- extract: Extract RPM DB archives, I/O bound, in `workers` threads
+- prepare: Configure and prepare hosts and de-duplicate them, in a thread
+  as it populates repo metadata shared among hosts
+- analyze: Analyze hosts fully or incrementally from results of reference
+  hosts, CPU bound, in processes if `multiproc`
+- finish: Link results of hosts same as others and record states of hosts,
+  in a thread as it updates results of reference hosts
+- archive: Archive reports, I/O bound, in `workers` threads
+
+Hosts are de-duplicated incrementally in order of arrival, instead of
+sorting them by the number of RPMs as :func:`fleure.multihosts.process`
+does, see :mod:`fleure.dedup`.
+"""
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import os.path
+import threading
+
+import fleure.checkpoint
+import fleure.dedup
+import fleure.multihosts
+import fleure.scheduler
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+REF = "ref"  # Hosts analyzed fully.
+SAME = "same"  # Hosts have same installed RPMs as some host.
+NEAR = "near"  # Hosts analyzed incrementally from the results of a ref.
+
+
+class Groups(object):
+    """Groups of hosts de-duplicated incrementally.
+    """
+    def __init__(self, max_diffs=fleure.dedup.MAX_DIFFS):
+        """
+        :param max_diffs: See :func:`fleure.dedup.find_near_hosts`
+        """
+        self.max_diffs = max_diffs
+        self._fprs = dict()  # {fingerprint: host}
+        self._refs = []
+        self._cache = dict()
+        self._done = dict()  # {hid: True if done or False if failed}
+        self._waiting = dict()  # {hid: [(kind, host waiting for it)]}
+        self._lock = threading.Lock()
+
+    def classify(self, host):
+        """
+        :param host: A :class:`~fleure.config.Host` object prepared
+        :return: A list of tuples of (kind, host, the reference host or None)
+            ready to process, empty if it should wait for the reference
+        """
+        fpr = fleure.dedup.fingerprint(host.installed)
+        (kind, ref) = (SAME, self._fprs.get(fpr))
+        if ref is None:
+            self._fprs[fpr] = host
+            if self.max_diffs > 0:
+                ref = next((r for r in self._refs if fleure.dedup.is_near(
+                    r, host, self.max_diffs, self._cache)), None)
+            if ref is None:
+                self._refs.append(host)
+                return [(REF, host, None)]
+            kind = NEAR
+
+        with self._lock:
+            if ref.hid not in self._done:
+                self._waiting.setdefault(ref.hid, []).append((kind, host))
+                return []
+
+        return [(kind, host, ref)]
+
+    def is_done(self, host):
+        """
+        :return: True if `host` was done or False if failed
+        """
+        with self._lock:
+            return self._done.get(host.hid, False)
+
+    def finish(self, host, done=True):
+        """
+        :param host: A :class:`~fleure.config.Host` object processed
+        :param done: True if it was done or False if failed
+        :return: A list of tuples of (kind, host) waiting for `host`
+        """
+        with self._lock:
+            self._done[host.hid] = done
+            return self._waiting.pop(host.hid, [])
+
+
+def run(hosts_datadir, workdir=None, multiproc=False, ckpt=None, hpaths=None,
+        procs=None, prefs=None, **kwargs):
+    """
+    Analyze hosts in the staged pipeline.
+
+    :param hosts_datadir: Dir in which rpm db roots of hosts exist
+    :param workdir: Working dir to save results
+    :param multiproc: Analyze hosts in processes if True
+    :param ckpt: See :func:`fleure.multihosts.configure`
+    :param hpaths: See :func:`fleure.multihosts.configure`
+    :param procs: Number of worker processes or None (number of CPUs)
+    :param prefs: See :func:`fleure.multihosts.process`
+    :param kwargs: Other options, see :func:`fleure.multihosts.main`
+
+    :return: A list of :class:`~fleure.config.Host` objects done
+    """
+    workdir = fleure.multihosts.setup_workdir(hosts_datadir, workdir)
+    kwargs["cachedir"] = fleure.multihosts.common_cachedir(workdir)
+    workers = kwargs.get("workers") or multiprocessing.cpu_count()
+    groups = Groups(kwargs.get("max_diffs", fleure.dedup.MAX_DIFFS))
+    lock = threading.Lock()
+    low_memory = kwargs.get("low_memory")
+    if prefs is None:
+        prefs = dict()
+
+    def _mark(host, done=True):
+        """Record the state of a host processed."""
+        if ckpt is not None:
+            with lock:
+                ckpt.mark(host, done)
+
+    def _extract(hpath):
+        """Extract the RPM DB archive of a host not done."""
+        (hid, path) = hpath
+        digest = None
+        if ckpt is not None:
+            digest = fleure.checkpoint.input_hash(path)
+            if ckpt.is_done(hid, digest):
+                LOG.info(_("%s: Skip as done in previous runs"), hid)
+                return []
+
+        return [fleure.multihosts.extract_host(
+            hid, path, os.path.join(workdir, hid)) + (digest, )]
+
+    def _prepare(args):
+        """Configure, prepare and classify a host."""
+        host = fleure.multihosts.configure_host(*args, **kwargs)
+        if host is None:
+            return []
+        available = fleure.multihosts.prepare_host(host, prefs)
+        if low_memory:
+            host.release()  # Made again only while it's analyzed if needed.
+        if not available:
+            _mark(host, False)
+            return []
+
+        return groups.classify(host)
+
+    pool = None
+    if multiproc:
+        procs = procs or multiprocessing.cpu_count()
+        pool = fleure.multihosts.mk_pool(procs, **kwargs)
+
+    def _submit(host, ref=None):
+        """
+        Start to analyze a host, incrementally from the results of `ref` if
+        given, and return a function to get its result.
+        """
+        if pool is None:
+            res = fleure.multihosts.analyze(host, ref)
+            return lambda: res
+
+        job = fleure.multihosts.mk_job(host, ref)
+        return pool.apply_async(fleure.multihosts.analyze_job, (job, )).get
+
+    def _analyze(item):
+        """Analyze a host and hosts near to it waiting for it."""
+        (items, done) = ([item], [])
+        while items:
+            started = []
+            for kind, host, ref in items:
+                if kind == SAME:
+                    done.append((kind, host, ref, None))
+                    continue
+                if kind == NEAR and not groups.is_done(ref):
+                    LOG.warning(_("%s: Analyze fully as its reference host "
+                                  "%s failed"), host.hid, ref.hid)
+                    (kind, ref) = (REF, None)
+                started.append((kind, host, ref, _submit(host, ref)))
+
+            items = []
+            for kind, host, ref, get in started:
+                res = get()
+                done.append((kind, host, ref, res))
+                items.extend((k, h, host) for k, h
+                             in groups.finish(host, res["available"]))
+
+        return done
+
+    def _finish(item):
+        """Link results of a host same as other and record its state."""
+        (kind, host, ref, res) = item
+        if kind == SAME:
+            ok = groups.is_done(ref)
+            if ok:
+                fleure.multihosts.link_same_hosts(ref, [host], **kwargs)
+        else:
+            ok = res["available"]
+
+        _mark(host, ok)
+        if low_memory:
+            host.release()
+
+        return [host] if ok else []
+
+    def _archive(host):
+        """Archive reports of a host."""
+        fleure.multihosts.archive_reports([host],
+                                          kwargs.get("archive_format") or
+                                          "zip", kwargs.get("archive_level"),
+                                          workers=1)
+        return [host]
+
+    stages = [(_extract, workers), (_prepare, 1),
+              (_analyze, procs if multiproc else 1), (_finish, 1)]
+    if kwargs.get("archive"):
+        stages.append((_archive, workers))
+
+    try:
+        hosts = list(fleure.scheduler.run_stages(
+            fleure.multihosts.list_hpaths(hosts_datadir, hpaths), stages))
+        if pool is not None:
+            pool.close()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
+
+    LOG.info(_("Analyzed %d hosts in the pipeline"), len(hosts))
+    return hosts
+
+# vim:sw=4:ts=4:et:
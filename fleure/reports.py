@@ -0,0 +1,328 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Registry of report sheets and outputs made on demand.
+
+Sheets and outputs are registered with names, and callers may request a
+subset of them, e.g. only 'overview' and 'rhsa_critical'. Analysis views of
+errata are computed lazily, see :func:`fleure.analysis.analyze_errata_lazy`,
+so that only the views needed by the sheets requested are computed.
+"""
+from __future__ import absolute_import
+from operator import itemgetter
+
+import logging
+import os.path
+
+import fleure.analysis
+import fleure.depgraph
+import fleure.xlsx
+
+from fleure.datasets import make_sheet
+from fleure.globals import _, REPORT_FILES
+
+
+LOG = logging.getLogger(__name__)
+
+SUMMARY = 0  # Index of the summary book in REPORT_FILES.
+DETAILS = 1  # Likewise but the details book.
+
+SHEETS = []  # [(name, book, fn)]
+OUTPUTS = ("summary", "depgraph")  # Other outputs than sheets.
+
+SEKEYS = ("advisory", "severity", "synopsis", "url", "update_names")
+BEKEYS = ("advisory", "keywords", "synopsis", "url", "update_names")
+
+
+def register(name, book=SUMMARY):
+    """
+    Decorator to register a function makes a sheet from a :class:`Report`
+    object. The function may return None not to make the sheet.
+
+    :param name: Name of the sheet
+    :param book: Index of the book in REPORT_FILES to add the sheet to
+    """
+    def _register(fnc):
+        SHEETS.append((name, book, fnc))
+        return fnc
+
+    return _register
+
+
+def names():
+    """
+    :return: A list of names of all sheets and outputs
+
+    >>> names()[:2]
+    ['overview', 'rhsa_latest']
+    >>> names()[-2:]
+    ['summary', 'depgraph']
+    """
+    return [sht[0] for sht in SHEETS] + list(OUTPUTS)
+
+
+def select(requested=None):
+    """
+    :param requested: A list of names of sheets or outputs, or None (all)
+    :return: A set of names selected
+
+    >>> sorted(select(["rhsa_critical", "overview"]))
+    ['overview', 'rhsa_critical']
+    >>> select(["foo"])
+    Traceback (most recent call last):
+    ValueError: Unknown report[s]: foo
+    """
+    if not requested:
+        return set(names())
+
+    unknowns = [n for n in requested if n not in names()]
+    if unknowns:
+        raise ValueError("Unknown report[s]: %s" % ", ".join(unknowns))
+
+    return set(requested)
+
+
+class Report(object):
+    """Context to make report sheets of a host.
+    """
+    def __init__(self, host, rpms, errata, updates, kwcache=None):
+        """
+        :param host: host object function :func:`fleure.main.prepare` returns
+        :param rpms: A list of installed RPMs
+        :param errata: A list of applicable errata
+        :param updates: A list of update RPMs
+        :param kwcache: See :func:`fleure.analysis.errata_of_keywords_g`
+        """
+        (self.host, self.rpms, self.errata) = (host, rpms, errata)
+        self.updates = updates
+        self.dargs = dict(score=host.cvss_min_score,
+                          keywords=host.errata_keywords,
+                          pkeywords=host.errata_pkeywords,
+                          core_rpms=host.core_rpms)
+
+        installed = dict(list=rpms, list_rebuilt=[], list_replaced=[],
+                         list_from_others=[])
+        for pkg in rpms:
+            for key in ("rebuilt", "replaced", "from_others"):
+                if pkg.get(key, False):
+                    installed["list_" + key].append(pkg)
+
+        (nps, nus) = (len(rpms), len(updates))
+        ers = fleure.analysis.analyze_errata_lazy(errata, kwcache=kwcache,
+                                                  **self.dargs)
+        self.data = dict(errata=ers, installed=installed,
+                         updates=dict(list=updates,
+                                      rate=[(_("packages need updates"), nus),
+                                            (_("packages not need updates"),
+                                             nps - nus)]))
+
+        # TODO: Keep DRY principle.
+        self.rpmkeys = host.rpmkeys
+        self.lrpmkeys = [_("name"), _("epoch"), _("version"), _("release"),
+                         _("arch")]
+        self.rpmdkeys = list(self.rpmkeys) + ["summary", "vendor",
+                                              "buildhost"]
+        self.lrpmdkeys = self.lrpmkeys + [_("summary"), _("vendor"),
+                                          _("buildhost")]
+
+    @property
+    def rhsa(self):
+        """Analyzed data of RHSAs"""
+        return self.data["errata"]["rhsa"]
+
+    @property
+    def rhba(self):
+        """Analyzed data of RHBAs"""
+        return self.data["errata"]["rhba"]
+
+
+def _lsekeys():
+    """Localized version of `SEKEYS`"""
+    return (_("advisory"), _("severity"), _("synopsis"), _("url"),
+            _("update_names"))
+
+
+def _lbekeys():
+    """Localized version of `BEKEYS`"""
+    return (_("advisory"), _("keywords"), _("synopsis"), _("url"),
+            _("update_names"))
+
+
+@register("overview")
+def _overview(rep):
+    return fleure.analysis.mk_overview_dataset(rep.data, **rep.dargs)
+
+
+@register("rhsa_latest")
+def _rhsa_latest(rep):
+    return make_sheet(rep.rhsa["list_latest_critical"] +
+                      rep.rhsa["list_latest_important"],
+                      _("Cri-Important RHSAs (latests)"), SEKEYS, _lsekeys())
+
+
+@register("rhsa_critical")
+def _rhsa_critical(rep):
+    return make_sheet(sorted(rep.rhsa["list_critical"],
+                             key=itemgetter("update_names")) +
+                      sorted(rep.rhsa["list_important"],
+                             key=itemgetter("update_names")),
+                      _("Critical or Important RHSAs"), SEKEYS, _lsekeys())
+
+
+@register("rhba_core_kwds")
+def _rhba_core_kwds(rep):
+    return make_sheet(rep.rhba["list_by_kwds_of_core_rpms"],
+                      _("RHBAs (core rpms, keywords)"), BEKEYS, _lbekeys())
+
+
+@register("rhba_kwds")
+def _rhba_kwds(rep):
+    return make_sheet(rep.rhba["list_by_kwds"], _("RHBAs (keyword)"),
+                      BEKEYS, _lbekeys())
+
+
+@register("rhba_core_latest")
+def _rhba_core_latest(rep):
+    return make_sheet(rep.rhba["list_latests_of_core_rpms"],
+                      _("RHBAs (core rpms, latests)"), BEKEYS, _lbekeys())
+
+
+@register("updates_rhsa_critical")
+def _updates_rhsa_critical(rep):
+    return make_sheet(rep.rhsa["list_critical_updates"],
+                      _("Update RPMs by RHSAs (Critical)"), rep.rpmkeys,
+                      rep.lrpmkeys)
+
+
+@register("updates_rhsa_important")
+def _updates_rhsa_important(rep):
+    return make_sheet(rep.rhsa["list_important_updates"],
+                      _("Updates by RHSAs (Important)"), rep.rpmkeys,
+                      rep.lrpmkeys)
+
+
+@register("updates_rhba_kwds")
+def _updates_rhba_kwds(rep):
+    return make_sheet(rep.rhba["list_updates_by_kwds"],
+                      _("Updates by RHBAs (Keyword)"), rep.rpmkeys,
+                      rep.lrpmkeys)
+
+
+@register("rhsa_cvss")
+def _rhsa_cvss(rep):
+    score = rep.host.cvss_min_score
+    if score <= 0:
+        return None
+
+    return make_sheet(rep.rhsa["list_higher_cvss_score"],
+                      _("RHSAs (CVSS score >= %.1f)") % score,
+                      ("advisory", "severity", "synopsis", "cves",
+                       "cvsses_s", "url"),
+                      (_("advisory"), _("severity"), _("synopsis"),
+                       _("cves"), _("cvsses_s"), _("url")))
+
+
+@register("rhba_cvss")
+def _rhba_cvss(rep):
+    score = rep.host.cvss_min_score
+    if score <= 0:
+        return None
+
+    return make_sheet(rep.rhba["list_higher_cvss_score"],
+                      _("RHBAs (CVSS score >= %.1f)") % score,
+                      ("advisory", "synopsis", "cves", "cvsses_s", "url"),
+                      (_("advisory"), _("synopsis"), _("cves"),
+                       _("cvsses_s"), _("url")))
+
+
+def _register_installed(key, name, title):
+    """Register a sheet of installed RPMs of `key`"""
+    def _installed(rep):
+        rpms = rep.data["installed"][key]
+        if not rpms:
+            return None
+
+        return make_sheet(rpms, title, rep.rpmdkeys, rep.lrpmdkeys)
+
+    register(name)(_installed)
+
+
+_register_installed("list_rebuilt", "rpms_rebuilt", _("Rebuilt RPMs"))
+_register_installed("list_replaced", "rpms_replaced", _("Replaced RPMs"))
+_register_installed("list_from_others", "rpms_from_others",
+                    _("RPMs from other vendors"))
+
+
+@register("errata_details", DETAILS)
+def _errata_details(rep):
+    return make_sheet(rep.errata, _("Errata Details"),
+                      ("advisory", "type", "severity", "synopsis",
+                       "description", "issue_date", "update_date", "url",
+                       "cves", "bzs", "update_names"),
+                      (_("advisory"), _("type"), _("severity"),
+                       _("synopsis"), _("description"), _("issue_date"),
+                       _("update_date"), _("url"), _("cves"),
+                       _("bzs"), _("update_names")))
+
+
+@register("updates", DETAILS)
+def _updates(rep):
+    return make_sheet(rep.updates, _("Update RPMs"), rep.rpmkeys,
+                      rep.lrpmkeys)
+
+
+@register("installed", DETAILS)
+def _installed(rep):
+    return make_sheet(rep.rpms, _("Installed RPMs"), rep.rpmdkeys,
+                      rep.lrpmdkeys)
+
+
+def make_sheets(rep, selected):
+    """
+    :param rep: A :class:`Report` object
+    :param selected: A set of names of sheets to make
+    :return: A list of lists of sheets of each book in REPORT_FILES
+    """
+    books = [[] for _fn in REPORT_FILES]
+    for name, book, fnc in SHEETS:
+        if name in selected:
+            sheet = fnc(rep)
+            if sheet is not None:
+                books[book].append(sheet)
+
+    return books
+
+
+def dump_reports(rep, dumpdir, requested=None, depgraph=True):
+    """
+    Make and dump sheets and outputs requested.
+
+    :param rep: A :class:`Report` object
+    :param dumpdir: Dir to save results
+    :param requested: A list of names of sheets or outputs, or None (all)
+    :param depgraph: Dump RPM dependency graph also if True and requested
+    """
+    selected = select(requested)
+    host = rep.host
+
+    if "summary" in selected:
+        rep.data["errata"].materialize()
+        host.save(rep.data, "summary", dumpdir)
+
+    if depgraph and "depgraph" in selected:
+        fleure.depgraph.dump_depgraph(host.root, rep.data["errata"],
+                                      host.workdir, tpaths=host.tpaths)
+
+    books = make_sheets(rep, selected)
+    if not host.details:
+        books[DETAILS] = []
+
+    for sheets, filename in zip(books, REPORT_FILES):
+        if sheets:
+            fleure.xlsx.dump_xlsx(sheets, os.path.join(dumpdir, filename))
+
+    LOG.debug("%s: Made %d sheets in %s", host.hid,
+              sum(len(b) for b in books), dumpdir)
+
+# vim:sw=4:ts=4:et:
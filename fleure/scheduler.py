@@ -0,0 +1,493 @@
+#
+# Copyright (C) 2017 Red Hat, Inc.
+# Red Hat Author(s): Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Schedulers to run tasks concurrently.
+"""
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import multiprocessing.pool
+import os
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # python 2
+
+
+LOG = logging.getLogger(__name__)
+
+_END = object()  # Tell the end of items to stages.
+_STATE = dict(worker=False)  # Is this process a worker, see set_worker.
+
+
+def _nworkers(workers, ntasks):
+    """
+    :param workers: Max number of workers or None (number of CPUs)
+    :param ntasks: Number of tasks
+
+    >>> _nworkers(4, 2)
+    2
+    >>> _nworkers(0, 3)
+    1
+    >>> _nworkers(None, 1)
+    1
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    return max(1, min(workers, ntasks))
+
+
+def set_worker(worker=True):
+    """
+    Tell whether this process is a worker process runs along with others,
+    e.g. of pools or the spool, see :func:`run_tasks`.
+
+    :param worker: True if this process is a worker process
+    :return: The previous state
+    """
+    (prev, _STATE["worker"]) = (_STATE["worker"], worker)
+    return prev
+
+
+def run_tasks(fnc, tasks, workers=None):
+    """
+    Run `fnc` for each task concurrently in a bounded pool of threads. Tasks
+    should only share read-only inputs.
+
+    Tasks run in threads, so that only their I/O, e.g. dumping results,
+    overlaps and CPU bound parts of them are serialized by the GIL. Tasks
+    are run in this thread one by one by default in worker processes, see
+    :func:`set_worker`, not to run threads as many as CPUs in each of them.
+
+    :param fnc: A callable to run
+    :param tasks: A list of tuples of (args, kwargs) passed to `fnc`
+    :param workers: Max number of workers or None (number of CPUs, or 1 in
+        worker processes)
+
+    :return: A list of results of `fnc` in the same order as `tasks`
+
+    >>> run_tasks(pow, [((2, 3), {}), ((3, 2), {})], 2)
+    [8, 9]
+    >>> run_tasks(int, [(("10", ), dict(base=2))])
+    [2]
+    """
+    if workers is None and _STATE["worker"]:
+        workers = 1
+
+    workers = _nworkers(workers, len(tasks))
+    if workers == 1:
+        return [fnc(*args, **kwargs) for args, kwargs in tasks]
+
+    LOG.debug("Run %d tasks with %d workers", len(tasks), workers)
+    pool = multiprocessing.pool.ThreadPool(workers)
+    try:
+        ress = [pool.apply_async(fnc, args, kwargs) for args, kwargs in tasks]
+        return [res.get() for res in ress]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _run_task(args):
+    """
+    :param args: A tuple of (fnc, args, kwargs)
+    """
+    (fnc, fargs, kwargs) = args
+    return fnc(*fargs, **kwargs)
+
+
+def run_tasks_g(fnc, tasks, workers=None):
+    """
+    Similar to :func:`run_tasks` but yields results as soon as each task
+    finishes, so that the next stage can start to process them without
+    waiting for all tasks to finish.
+
+    :param fnc: A callable to run
+    :param tasks: A list of tuples of (args, kwargs) passed to `fnc`
+    :param workers: Max number of workers or None (number of CPUs)
+
+    :return: A generator yields results of `fnc` in order of completion
+
+    >>> sorted(run_tasks_g(pow, [((2, 3), {}), ((3, 2), {})], 2))
+    [8, 9]
+    """
+    workers = _nworkers(workers, len(tasks))
+    if workers == 1:
+        for args, kwargs in tasks:
+            yield fnc(*args, **kwargs)
+        return
+
+    LOG.debug("Run %d tasks with %d workers", len(tasks), workers)
+    pool = multiprocessing.pool.ThreadPool(workers)
+    try:
+        for res in pool.imap_unordered(_run_task, [(fnc, a, k) for a, k
+                                                   in tasks]):
+            yield res
+    finally:
+        pool.terminate()  # Nothing left to do if all tasks were done.
+        pool.join()
+
+
+def _feed(items, outq, stop, errors):
+    """Feed `items` into the first stage."""
+    try:
+        for item in items:
+            if stop.is_set():
+                break
+            outq.put(item)
+    except Exception:  # pylint: disable=broad-except
+        errors.append(sys.exc_info()[1])
+        stop.set()
+    finally:
+        outq.put(_END)
+
+
+def _work(fnc, inq, outq, stop, errors, nworkers, lock):
+    """
+    Process items from `inq` and put results into `outq` until the end. Once
+    any stage failed, items are only drained without processing them not to
+    block stages before it.
+
+    :param nworkers: A list of the number of workers of this stage running
+    """
+    while True:
+        item = inq.get()
+        if item is _END:
+            inq.put(_END)  # Tell the end to other workers of this stage.
+            with lock:
+                nworkers[0] -= 1
+                if nworkers[0] == 0:
+                    outq.put(_END)
+            return
+
+        if stop.is_set():
+            continue
+        try:
+            for res in fnc(item):
+                outq.put(res)
+        except Exception:  # pylint: disable=broad-except
+            errors.append(sys.exc_info()[1])
+            stop.set()
+
+
+def run_stages(items, stages, maxsize=None):
+    """
+    Run a pipeline of stages, each of them runs in its own bounded number of
+    threads, connected with bounded queues, so that items are processed in
+    different stages at the same time and stages waiting for slower next
+    stages are blocked (backpressure) instead of keeping many items.
+
+    :param items: An iterable of inputs of the first stage
+    :param stages: A list of tuples of (fnc, workers): `fnc` takes an item
+        and returns an iterable of outputs to the next stage, and `workers`
+        is the number of threads to run it
+    :param maxsize: Max number of items waiting in each queue or None
+        (twice the number of workers of the next stage)
+
+    :return: A generator yields outputs of the last stage in order of
+        completion, raises the first error occurred in any stage
+
+    >>> stages = [(lambda x: [x, x * 10], 2), (lambda x: [x + 1], 3)]
+    >>> sorted(run_stages(range(3), stages))
+    [1, 1, 2, 3, 11, 21]
+    """
+    (stop, errors, lock) = (threading.Event(), [], threading.Lock())
+    queues = [queue.Queue(maxsize or 2 * w) for _f, w in stages]
+    queues.append(queue.Queue(maxsize or 2))
+
+    threads = [threading.Thread(target=_feed,
+                                args=(items, queues[0], stop, errors))]
+    for idx, (fnc, workers) in enumerate(stages):
+        nworkers = [workers]
+        threads.extend(threading.Thread(target=_work,
+                                        args=(fnc, queues[idx],
+                                              queues[idx + 1], stop, errors,
+                                              nworkers, lock))
+                       for _i in range(workers))
+    for thr in threads:
+        thr.daemon = True
+        thr.start()
+
+    res = None
+    try:
+        while True:
+            res = queues[-1].get()
+            if res is _END:
+                break
+            yield res
+    finally:
+        stop.set()
+        while res is not _END:  # Closed before the end.
+            res = queues[-1].get()
+        for thr in threads:
+            thr.join()
+
+    if errors:
+        raise errors[0]
+
+
+def rss():
+    """
+    :return: Resident set size of this process in bytes or None if unknown
+    """
+    try:
+        with open("/proc/self/statm") as inp:
+            return int(inp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def mem_available():
+    """
+    :return: Memory available without swapping in bytes or None if unknown
+    """
+    try:
+        with open("/proc/meminfo") as inp:
+            for line in inp:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+
+    return None
+
+
+def _proc_main(conn, max_tasks=None, max_rss=None):
+    """
+    Main loop of worker processes of :class:`RecyclingPool`. It exits after
+    `max_tasks` tasks or once its RSS exceeded `max_rss` bytes to return
+    memory to the OS.
+    """
+    set_worker()
+    ntasks = 0
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        (fnc, args) = task
+        try:
+            (res, ok) = (fnc(*args), True)
+        except Exception as exc:  # pylint: disable=broad-except
+            (res, ok) = (exc, False)
+
+        ntasks += 1
+        size = rss()
+        recycle = bool((max_tasks and ntasks >= max_tasks) or
+                       (max_rss and size and size > max_rss))
+        conn.send((res, ok, size, recycle))
+        if recycle:
+            break
+
+    conn.close()
+
+
+class _AsyncResult(object):
+    """
+    Result of a call run in a thread, similar to
+    :class:`multiprocessing.pool.AsyncResult`.
+    """
+    def __init__(self, fnc, args=()):
+        """
+        :param fnc: A callable to run
+        :param args: Arguments passed to `fnc`
+        """
+        (self._res, self._exc) = (None, None)
+        self._thread = threading.Thread(target=self._run, args=(fnc, args))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, fnc, args):
+        """Run `fnc` and keep its result or the error raised."""
+        try:
+            self._res = fnc(*args)
+        except BaseException:  # pylint: disable=broad-except
+            self._exc = sys.exc_info()[1]
+
+    def get(self):
+        """
+        :return: The result of the call, raises the error raised in it
+        """
+        self._thread.join()
+        if self._exc is not None:
+            raise self._exc
+        return self._res
+
+
+class RecyclingPool(object):
+    """
+    Pool of worker processes recycled after some tasks or once they used
+    much memory, and admits tasks only if memory is enough for them.
+
+    Memory needed by a task is estimated from its weight, e.g. the number of
+    RPMs of a host, and the max RSS per weight of tasks done so far. A task
+    is admitted if nothing is running or the memory available would not go
+    below `reserve` by running it, and tasks not admitted wait for others to
+    finish.
+    """
+    def __init__(self, procs=None, max_tasks=None, max_rss=None,
+                 reserve=None, weight=None):
+        """
+        :param procs: Number of worker processes or None (number of CPUs)
+        :param max_tasks: Recycle workers after this number of tasks or None
+        :param max_rss: Recycle workers once their RSS exceeded this bytes
+            or None
+        :param reserve: Bytes of memory to keep available or None (no
+            admission control)
+        :param weight: A callable takes args of a task and returns its weight
+            or None (1 for any tasks)
+        """
+        self.procs = procs or multiprocessing.cpu_count()
+        (self.max_tasks, self.max_rss) = (max_tasks, max_rss)
+        (self.reserve, self.weight) = (reserve, weight)
+        self._idle = []  # [(process, connection)]
+        self._busy = []  # Workers running tasks, [(process, connection)]
+        self._nworkers = 0
+        self._nrunning = 0
+        self._unit = 0  # Max RSS per weight.
+        self._cond = threading.Condition()
+        self._closed = False
+        self._terminated = False
+
+    def _admit(self, need):
+        """Can a task needs `need` bytes of memory run now?"""
+        if self.reserve is None or not self._nrunning:
+            return True
+
+        avail = mem_available()
+        return avail is None or avail - need >= self.reserve
+
+    def _acquire(self, weight):
+        """Get a worker to run a task of `weight`."""
+        with self._cond:
+            while not ((self._idle or self._nworkers < self.procs) and
+                       self._admit(weight * self._unit) or
+                       self._terminated):
+                self._cond.wait(1)  # Memory available may change also.
+
+            if self._terminated:
+                raise RuntimeError("The pool was terminated")
+
+            self._nrunning += 1
+            if self._idle:
+                worker = self._idle.pop()
+                self._busy.append(worker)
+                return worker
+
+            self._nworkers += 1
+            (pconn, cconn) = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_proc_main,
+                                           args=(cconn, self.max_tasks,
+                                                 self.max_rss))
+            proc.daemon = True
+            proc.start()
+            self._busy.append((proc, pconn))
+
+        cconn.close()
+        return (proc, pconn)
+
+    def _release(self, worker, weight, size=None, recycle=True):
+        """Return a worker or drop it if it should be recycled."""
+        with self._cond:
+            self._nrunning -= 1
+            self._busy.remove(worker)
+            if size and weight:
+                self._unit = max(self._unit, float(size) / weight)
+            if recycle or self._closed:
+                self._nworkers -= 1
+            else:
+                self._idle.append(worker)
+            self._cond.notify_all()
+
+        if recycle or self._closed:
+            (proc, conn) = worker
+            conn.close()
+            proc.join(5)
+
+    def apply(self, fnc, args=()):
+        """
+        Run `fnc` with `args` in a worker. It is safe to call this from
+        multiple threads.
+
+        :return: The result of `fnc`, raises the error raised in the worker
+        """
+        weight = self.weight(*args) if self.weight else 1
+        worker = self._acquire(weight)
+        (size, recycle) = (None, True)
+        try:
+            worker[1].send((fnc, args))
+            (res, ok, size, recycle) = worker[1].recv()
+        except (EOFError, IOError, OSError):
+            raise RuntimeError("A worker died while running %r" % fnc)
+        finally:
+            self._release(worker, weight, size, recycle)
+
+        if not ok:
+            raise res
+        return res
+
+    def apply_async(self, fnc, args=()):
+        """
+        Similar to :meth:`multiprocessing.pool.Pool.apply_async`, `fnc` is
+        run with :meth:`apply` in a thread waiting for its result.
+
+        :return: An object has `get` method to get the result of `fnc`
+        """
+        return _AsyncResult(self.apply, (fnc, args))
+
+    def imap_unordered(self, fnc, iterable, chunksize=1):
+        """
+        Similar to :meth:`multiprocessing.pool.Pool.imap_unordered`.
+
+        :param chunksize: Not used, only for the compatibility
+        """
+        return run_tasks_g(self.apply, [((fnc, (arg, )), {}) for arg
+                                        in iterable], self.procs)
+
+    def close(self):
+        """Stop workers once they finished tasks.
+        """
+        with self._cond:
+            self._closed = True
+            workers = self._idle
+            self._idle = []
+
+        for proc, conn in workers:
+            conn.send(None)
+            conn.close()
+            proc.join(5)
+
+    def terminate(self):
+        """Stop workers, including ones running tasks not to wait for them.
+        Tasks running or waiting for workers fail with RuntimeError.
+        """
+        with self._cond:
+            (self._closed, self._terminated) = (True, True)
+            workers = self._idle
+            self._idle = []
+            busy = list(self._busy)
+            self._cond.notify_all()
+
+        for proc, _conn in busy:  # Connections are closed in :meth:`apply`.
+            proc.terminate()
+
+        for proc, conn in workers:
+            proc.terminate()
+            conn.close()
+
+    def join(self):
+        """Same as :meth:`close` for the compatibility.
+        """
+        self.close()
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,348 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Filesystem spool to analyze hosts with workers on multiple nodes.
+
+A coordinator, :func:`fleure.multihosts.main` with the 'spool' option,
+writes jobs of hosts into a spool dir shared among nodes, e.g. on NFS, and
+waits for results. Any number of workers, on the same or other nodes, claim
+jobs by renaming job files atomically, analyze the hosts and publish
+results::
+
+    $ python -m fleure.spool /shared/spool  # Run a worker on each node.
+
+The spool dir has these sub dirs:
+
+- jobs/: Jobs not claimed yet, claimed in order of names
+- claimed/: Jobs claimed and being processed by workers, their mtimes are
+  updated periodically by the workers to tell they are alive
+- done/: Results of jobs done
+- failed/: Results of jobs failed
+- stop: Written with --stop to tell workers running to stop, and workers
+  started later ignore it
+
+Working dirs and RPM DB roots of hosts must be accessible with same paths
+from all nodes. No services other than the file system are needed.
+"""
+from __future__ import absolute_import
+
+import argparse
+import logging
+import os.path
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+import fleure.multihosts
+import fleure.scheduler
+import fleure.utils
+
+from fleure.globals import _
+
+
+LOG = logging.getLogger(__name__)
+
+JOBS = "jobs"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+STOP = "stop"
+
+INTERVAL = 5  # Interval in seconds to poll the spool.
+HEARTBEAT = 60  # Interval in seconds to tell workers are alive.
+STALE = 10 * HEARTBEAT  # Jobs claimed but not alive will be requeued.
+
+
+class Spool(object):
+    """Filesystem spool of jobs.
+    """
+    def __init__(self, topdir):
+        """
+        :param topdir: Top dir of the spool
+        """
+        self.topdir = topdir
+        for sub in (JOBS, CLAIMED, DONE, FAILED):
+            subdir = os.path.join(topdir, sub)
+            if not os.path.exists(subdir):
+                try:
+                    os.makedirs(subdir)
+                except OSError:  # Made by other process at the same time.
+                    pass
+
+    def _path(self, sub, jid):
+        """
+        :param sub: Sub dir, JOBS, CLAIMED, DONE or FAILED
+        :param jid: Job ID
+        """
+        return os.path.join(self.topdir, sub, jid + ".json")
+
+    def _jids(self, sub):
+        """
+        :return: A sorted list of IDs of jobs in `sub` dir
+        """
+        return sorted(fn[:-5] for fn in os.listdir(os.path.join(self.topdir,
+                                                                sub))
+                      if fn.endswith(".json"))
+
+    def _write(self, sub, jid, obj):
+        """
+        Write `obj` into a temporary file and rename it to publish
+        atomically, not to be read by others while writing it.
+        """
+        (fd, tmp) = tempfile.mkstemp(dir=self.topdir, prefix=".tmp-")
+        os.close(fd)
+        fleure.utils.json_dump(obj, tmp)
+        os.rename(tmp, self._path(sub, jid))
+
+    def submit(self, jid, job):
+        """
+        :param jid: Job ID, jobs are claimed in order of their IDs
+        :param job: A dict of the job, must be serialized in JSON
+        """
+        for sub in (DONE, FAILED):  # Results of previous runs.
+            if os.path.exists(self._path(sub, jid)):
+                os.remove(self._path(sub, jid))
+
+        self._write(JOBS, jid, job)
+
+    def claim(self):
+        """
+        Claim a job. Renaming a file is atomic so that only one of workers
+        trying to claim the same job at the same time can get it.
+
+        :return: A tuple of (job ID, job) or None if no jobs left
+        """
+        for jid in self._jids(JOBS):
+            path = self._path(CLAIMED, jid)
+            try:
+                os.rename(self._path(JOBS, jid), path)
+            except OSError:
+                continue  # Claimed by others.
+
+            os.utime(path, None)
+            return (jid, fleure.utils.json_load(path))
+
+        return None
+
+    def heartbeat(self, jid):
+        """Tell the job claimed is being processed.
+        """
+        try:
+            os.utime(self._path(CLAIMED, jid), None)
+        except OSError:
+            pass  # Requeued.
+
+    def _finish(self, sub, jid, result):
+        """Publish the result of a job claimed."""
+        self._write(sub, jid, result)
+        try:
+            os.remove(self._path(CLAIMED, jid))
+        except OSError:
+            pass
+
+    def complete(self, jid, result):
+        """
+        :param jid: Job ID
+        :param result: Result of the job, must be serialized in JSON
+        """
+        self._finish(DONE, jid, result)
+
+    def fail(self, jid, result):
+        """
+        :param jid: Job ID
+        :param result: Result of the job, must be serialized in JSON
+        """
+        self._finish(FAILED, jid, result)
+
+    def requeue_stale(self, stale=STALE):
+        """
+        Requeue jobs claimed by workers died.
+
+        :param stale: Jobs not alive for this seconds are requeued
+        :return: A list of IDs of jobs requeued
+        """
+        (jids, now) = ([], time.time())
+        for jid in self._jids(CLAIMED):
+            path = self._path(CLAIMED, jid)
+            try:
+                if now - os.stat(path).st_mtime > stale:
+                    os.rename(path, self._path(JOBS, jid))
+                    jids.append(jid)
+            except OSError:
+                continue  # Finished just now.
+
+        if jids:
+            LOG.warning(_("Requeued stale jobs: %s"), ", ".join(jids))
+        return jids
+
+    def results_g(self, jids, interval=None, stale=STALE):
+        """
+        Wait for the results of jobs.
+
+        :param jids: A list of IDs of jobs
+        :param interval: Interval in seconds to poll the spool or None
+            (:data:`INTERVAL`)
+        :param stale: See :meth:`requeue_stale`
+        :return: A generator yields tuples of (job ID, result, True if the
+            job was done or False if failed) in order of completion
+        """
+        if interval is None:
+            interval = INTERVAL
+
+        pending = set(jids)
+        while pending:
+            for sub in (DONE, FAILED):
+                for jid in sorted(pending.intersection(self._jids(sub))):
+                    pending.remove(jid)
+                    path = self._path(sub, jid)
+                    yield (jid, fleure.utils.json_load(path), sub == DONE)
+
+            if pending:
+                self.requeue_stale(stale)
+                time.sleep(interval)
+
+    def stop(self):
+        """Tell workers running to stop. Workers started later ignore it.
+        """
+        self._write_stop(str(uuid.uuid4()))
+
+    def _write_stop(self, token):
+        """Write the stop file atomically."""
+        path = os.path.join(self.topdir, STOP)
+        (fd, tmp) = tempfile.mkstemp(dir=self.topdir, prefix=".stop-")
+        with os.fdopen(fd, 'w') as out:
+            out.write(token)
+        os.rename(tmp, path)
+
+    def stop_token(self):
+        """
+        :return: Token written in the stop file by the last :meth:`stop`, or
+            None if workers were never told to stop
+        """
+        try:
+            with open(os.path.join(self.topdir, STOP)) as inp:
+                return inp.read()
+        except (IOError, OSError):
+            return None
+
+    def stopped(self, token=None):
+        """
+        :param token: Stop token when the worker started, see
+            :meth:`stop_token`
+        :return: True if workers were told to stop after that
+        """
+        current = self.stop_token()
+        return current is not None and current != token
+
+
+def _heartbeat(spool, jid, event, interval):
+    """Tell the job is being processed until `event` is set."""
+    while not event.wait(interval):
+        spool.heartbeat(jid)
+
+
+def work(topdir, fnc=None, once=False, interval=INTERVAL,
+         heartbeat=HEARTBEAT):
+    """
+    Run a worker to process jobs in the spool.
+
+    :param topdir: Top dir of the spool
+    :param fnc: A callable to process a job and return the result, or None
+        (:func:`fleure.multihosts.analyze_job`)
+    :param once: Exit if no jobs left instead of waiting for new jobs
+    :param interval: Interval in seconds to poll the spool
+    :param heartbeat: Interval in seconds to tell jobs are being processed
+
+    :return: Number of jobs processed
+    """
+    if fnc is None:
+        fnc = fleure.multihosts.analyze_job
+
+    was_worker = fleure.scheduler.set_worker()
+    (spool, njobs) = (Spool(topdir), 0)
+    worker = "%s:%d" % (socket.gethostname(), os.getpid())
+    token = spool.stop_token()  # Ignore stops told before started.
+    try:
+        while not spool.stopped(token):
+            claimed = spool.claim()
+            if claimed is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            (jid, job) = claimed
+            LOG.info(_("%s: Claimed the job %s"), worker, jid)
+            event = threading.Event()
+            thr = threading.Thread(target=_heartbeat,
+                                   args=(spool, jid, event, heartbeat))
+            thr.daemon = True
+            thr.start()
+            try:
+                spool.complete(jid, fnc(job))
+            except Exception:  # pylint: disable=broad-except
+                LOG.error(_("%s: Failed to process the job %s"), worker, jid)
+                spool.fail(jid, dict(hid=jid, available=False, errata=0,
+                                     updates=0, worker=worker,
+                                     errors=[traceback.format_exc()]))
+            finally:
+                event.set()
+                thr.join()
+
+            njobs += 1
+    finally:
+        fleure.scheduler.set_worker(was_worker)
+
+    LOG.info(_("%s: Processed %d jobs"), worker, njobs)
+    return njobs
+
+
+def make_parser():
+    """Parse arguments.
+    """
+    defaults = dict(interval=INTERVAL, verbosity=0)
+    psr = argparse.ArgumentParser()
+    psr.set_defaults(**defaults)
+
+    add_arg = psr.add_argument
+    add_arg("--once", action="store_true",
+            help="Exit if no jobs left instead of waiting for new jobs")
+    add_arg("--stop", action="store_true",
+            help="Tell all workers of the spool to stop and exit")
+    add_arg("-i", "--interval", type=int,
+            help="Interval in seconds to poll the spool [%(interval)s]"
+            % defaults)
+    add_arg("-v", "--verbose", action="count", dest="verbosity",
+            help="Verbose mode")
+    add_arg("spooldir", help="Spool dir shared with the coordinator")
+
+    return psr
+
+
+def main(argv=None):
+    """Worker main.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = make_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbosity
+                        else logging.WARN)
+
+    if args.stop:
+        Spool(args.spooldir).stop()
+        return
+
+    work(args.spooldir, once=args.once, interval=args.interval)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim:sw=4:ts=4:et:
@@ -5,6 +5,8 @@
 # pylint: disable=missing-docstring, protected-access, invalid-name
 from __future__ import absolute_import
 
+import gzip
+import io
 import os.path
 import os
 
@@ -24,6 +26,33 @@ def touch(filepath):
     open(filepath, 'w').write("\n")
 
 
+def _add_file(tar, name, content=b"\n"):
+    info = TT.tarfile.TarInfo(name)
+    info.size = len(content)
+    tar.addfile(info, io.BytesIO(content))
+
+
+def _mk_rpmdb_tar(arcfile, fmt="gz"):
+    """Make an RPM DB archive with some bad members."""
+    with open(arcfile, 'wb') as out:
+        if fmt == "zst":
+            stream = TT.zstandard.ZstdCompressor().stream_writer(out)
+        elif fmt == "xz":
+            stream = TT.lzma.LZMAFile(out, 'wb')
+        else:
+            stream = gzip.GzipFile(fileobj=out, mode='wb')
+
+        with TT.tarfile.open(fileobj=stream, mode="w|") as tar:
+            _add_file(tar, "../evil")
+            _add_file(tar, "var/lib/rpm/../../../../evil2")
+            info = TT.tarfile.TarInfo("var/lib/rpm/Name")
+            (info.type, info.linkname) = (TT.tarfile.SYMTYPE, "/etc/passwd")
+            tar.addfile(info)
+            for fname in fleure.globals.RPMDB_FILENAMES[1:]:
+                _add_file(tar, "./var/lib/rpm/" + fname, fname.encode())
+        stream.close()
+
+
 class Test00(fleure.tests.common.TestsWithWorkdir):
 
     def test_10__is_link__symlink(self):
@@ -73,6 +102,62 @@ class Test00(fleure.tests.common.TestsWithWorkdir):
         self.assertFalse(os.path.exists(filepath))
         self.assertFalse(os.path.isfile(filepath))
 
+    def _assert_extract_rpmdb_archive__tar(self, fmt):
+        arcfile = os.path.join(self.workdir, "rpmdb.tar." + fmt)
+        _mk_rpmdb_tar(arcfile, fmt)
+        root = os.path.join(self.workdir, "a", "root")
+
+        (root2, errors) = TT.extract_rpmdb_archive(arcfile, root)
+        self.assertEqual(root2, root)
+        self.assertEqual(len(errors), 1, errors)  # The symlink.
+
+        rpmdir = os.path.join(root, fleure.globals.RPMDB_SUBDIR)
+        self.assertEqual(sorted(os.listdir(rpmdir)),
+                         sorted(fleure.globals.RPMDB_FILENAMES[1:]))
+        with open(os.path.join(rpmdir, "Dirnames")) as inp:
+            self.assertEqual(inp.read(), "Dirnames")
+
+        for fname in ("evil", "evil2"):
+            self.assertFalse(os.path.exists(os.path.join(self.workdir, "a",
+                                                         fname)))
+
+    def test_42_safe_untar__gz(self):
+        self._assert_extract_rpmdb_archive__tar("gz")
+
+    @fleure.tests.common.skip_if_not(TT.lzma is not None)
+    def test_44_safe_untar__xz(self):
+        self._assert_extract_rpmdb_archive__tar("xz")
+
+    @fleure.tests.common.skip_if_not(TT.lzma is not None)
+    def test_45_safe_untar__xz_by_tar(self):
+        arcfile = os.path.join(self.workdir, "rpmdb.tar.xz")
+        _mk_rpmdb_tar(arcfile, "xz")
+        fleure.tests.common.patch(self, TT, lzma=None)
+
+        destdir = os.path.join(self.workdir, "out")
+        os.makedirs(destdir)
+        self.assertEqual(TT.safe_untar(arcfile, destdir), [])
+
+        rpmdir = os.path.join(destdir, fleure.globals.RPMDB_SUBDIR)
+        self.assertEqual(sorted(os.listdir(rpmdir)),
+                         sorted(fleure.globals.RPMDB_FILENAMES[1:]))
+        self.assertEqual(os.listdir(destdir), ["var"])  # Not evil*.
+        with open(os.path.join(rpmdir, "Name")) as inp:
+            self.assertEqual(inp.read(), "Name")  # Not the symlink.
+
+    @fleure.tests.common.skip_if_not(TT.zstandard is not None)
+    def test_46_safe_untar__zstd(self):
+        self._assert_extract_rpmdb_archive__tar("zst")
+
+    def test_48_safe_untar__broken(self):
+        arcfile = os.path.join(self.workdir, "broken.tar.xz")
+        with open(arcfile, 'wb') as out:
+            out.write(TT.XZ_MAGIC + b"broken")
+
+        errors = TT.safe_untar(arcfile, self.workdir)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Failed to extract"), errors)
+
     def test_50_safe_unzip(self):
         thisfile = os.path.abspath(__file__)
         otherfile = "aaa.txt"
@@ -111,6 +196,63 @@ class Test00(fleure.tests.common.TestsWithWorkdir):
 
         with TT.zipfile.ZipFile(output) as zipf:
             self.assertEqual(sorted(zipf.namelist()), paths)
+            ctypes = [zipf.getinfo(p).compress_type for p in paths]
+            self.assertEqual(ctypes, [TT.zipfile.ZIP_STORED] * len(paths))
+
+    def test_71_archive_report__zip_level(self):
+        touch(os.path.join(self.workdir, "errata.json"))
+        (has_level, TT.ZIP_HAS_LEVEL) = (TT.ZIP_HAS_LEVEL, False)
+        try:  # Ignored in python < 3.7.
+            output = TT.archive_report(self.workdir,
+                                       filenames=["errata.json"], level=1)
+        finally:
+            TT.ZIP_HAS_LEVEL = has_level
+
+        with TT.zipfile.ZipFile(output) as zipf:
+            self.assertEqual(len(zipf.namelist()), 1)
+
+    def _assert_archive_report__tar(self, fmt):
+        filenames = ("errata_summary.xlsx", "errata.json")
+        for fname in filenames:
+            touch(os.path.join(self.workdir, fname))
+
+        output = TT.archive_report(self.workdir, filenames=filenames,
+                                   fmt=fmt, level=1)
+        self.assertTrue(output.endswith(fmt))
+
+        topdir = os.path.basename(self.workdir)
+        with open(output, 'rb') as inp:
+            if fmt == "tar.zst":
+                inp = TT.zstandard.ZstdDecompressor().stream_reader(inp)
+            else:
+                inp = TT.lzma.LZMAFile(inp)
+            with TT.tarfile.open(fileobj=inp, mode="r|") as tar:
+                self.assertEqual(sorted(m.name for m in tar),
+                                 sorted(os.path.join(topdir, fn)
+                                        for fn in filenames))
+
+    @fleure.tests.common.skip_if_not(TT.zstandard is not None)
+    def test_72_archive_report__zstd(self):
+        self._assert_archive_report__tar("tar.zst")
+
+    @fleure.tests.common.skip_if_not(TT.lzma is not None)
+    def test_74_archive_report__xz(self):
+        self._assert_archive_report__tar("tar.xz")
+
+    def test_76_archive_report__unknown_format(self):
+        self.assertRaises(ValueError, TT.archive_report, self.workdir,
+                          fmt="rar")
+
+    def test_80_archive_reports(self):
+        rdirs = [os.path.join(self.workdir, h) for h in ("h1", "h2", "h3")]
+        for rdir in rdirs:
+            os.makedirs(rdir)
+            for fname in fleure.globals.REPORT_FILES:
+                touch(os.path.join(rdir, fname))
+
+        outputs = TT.archive_reports(rdirs, ["a.zip"] * 3, workers=3)
+        self.assertEqual(outputs, [os.path.join(d, "a.zip") for d in rdirs])
+        self.assertTrue(all(os.path.exists(o) for o in outputs))
 
 
 class Test10(fleure.tests.common.TestsWithWorkdir):
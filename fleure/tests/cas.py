@@ -0,0 +1,133 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import os
+
+import fleure.cas as TT
+import fleure.config
+import fleure.jsonio
+import fleure.main
+import fleure.tests.common
+
+from fleure.tests.common import mk_pkg
+
+
+def _write(path, content):
+    pdir = os.path.dirname(path)
+    if not os.path.exists(pdir):
+        os.makedirs(pdir)
+    with open(path, 'w') as out:
+        out.write(content)
+
+
+def _read(path):
+    with open(path) as inp:
+        return inp.read()
+
+
+class _Base(object):
+    name = "fake"
+
+    def __init__(self, installed):
+        self.installed = installed
+
+    def prepare(self):
+        pass
+
+    def list_installed(self):
+        return self.installed
+
+    def ready(self):
+        return True
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.topdir = os.path.join(self.workdir, "store")
+        self.hdirs = [os.path.join(self.workdir, h) for h in ("h1", "h2")]
+        for hdir, extra in zip(self.hdirs, ("1", "2")):
+            _write(os.path.join(hdir, "errata.json"), '{"data": []}')
+            _write(os.path.join(hdir, "delta", "updates.json"), extra)
+            _write(os.path.join(hdir, "metadata.json"), extra)
+            _write(os.path.join(hdir, "rpms.rpmdb"), extra)
+
+    def test_10_store_results(self):
+        mfs = [TT.store_results(d, self.topdir) for d in self.hdirs]
+        self.assertEqual(sorted(mfs[0].keys()),
+                         ["delta/updates.json", "errata.json"])
+        self.assertEqual(mfs[0]["errata.json"], mfs[1]["errata.json"])
+        self.assertNotEqual(mfs[0]["delta/updates.json"],
+                            mfs[1]["delta/updates.json"])
+
+        objs = [os.path.join(d, f) for d, _ds, fs
+                in os.walk(os.path.join(self.topdir, "objects")) for f in fs]
+        self.assertEqual(len(objs), 3)  # errata.json is stored once.
+
+        path = os.path.join(self.hdirs[1], "errata.json")
+        self.assertEqual(_read(path), '{"data": []}')
+        self.assertEqual(os.stat(path).st_ino,
+                         os.stat(os.path.join(self.hdirs[0],
+                                              "errata.json")).st_ino)
+        self.assertEqual(TT.load_manifest(self.hdirs[0]), mfs[0])
+
+    def test_20_link_results(self):
+        manifest = TT.store_results(self.hdirs[0], self.topdir)
+        hdir = os.path.join(self.workdir, "h3")
+        TT.link_results(manifest, self.topdir, hdir)
+
+        self.assertEqual(_read(os.path.join(hdir, "delta/updates.json")), "1")
+        self.assertEqual(TT.load_manifest(hdir), manifest)
+
+    def test_30_unlink_results(self):
+        TT.store_results(self.hdirs[0], self.topdir)
+        TT.unlink_results(self.hdirs[0])
+
+        self.assertFalse(os.path.exists(os.path.join(self.hdirs[0],
+                                                     "errata.json")))
+        self.assertTrue(TT.load_manifest(self.hdirs[0]) is None)
+        self.assertTrue(TT.digest_of(os.path.join(self.hdirs[1],
+                                                  "errata.json"))
+                        in TT.Store(self.topdir))
+
+    def test_40_prepare__linked_host(self):
+        for hdir in self.hdirs:
+            fleure.jsonio.dump(dict(data=[mk_pkg("a")]),
+                               os.path.join(hdir, "packages.json"))
+            TT.store_results(hdir, self.topdir)
+
+        paths = [os.path.join(d, "packages.json") for d in self.hdirs]
+        digest = TT.load_manifest(self.hdirs[0])["packages.json"]["digest"]
+        content = _read(paths[1])
+
+        # Analyze h1 again and its installed RPMs changed.
+        host = fleure.config.Host(self.hdirs[0], conf_path=None, hid="h1",
+                                  workdir=self.hdirs[0],
+                                  castore=self.topdir)
+        host.init_base = lambda: _Base([mk_pkg("a", "2")])
+        fleure.main.prepare(host)
+
+        self.assertEqual(_read(paths[1]), content)
+        self.assertEqual(TT.digest_of(TT.Store(self.topdir).path_of(digest)),
+                         digest)
+        self.assertNotEqual(os.stat(paths[0]).st_ino,
+                            os.stat(paths[1]).st_ino)
+
+    def test_42_jsonio_dump__linked_file(self):
+        TT.store_results(self.hdirs[0], self.topdir)
+        TT.store_results(self.hdirs[1], self.topdir)
+
+        path = os.path.join(self.hdirs[0], "errata.json")
+        fleure.jsonio.dump(dict(data=[1]), path)
+        self.assertEqual(_read(os.path.join(self.hdirs[1], "errata.json")),
+                         '{"data": []}')
+        self.assertEqual([f for f in os.listdir(self.hdirs[0])
+                          if f.startswith('.')], [])  # No temporary files.
+
+# vim:sw=4:ts=4:et:
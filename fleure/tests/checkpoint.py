@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import os
+
+import fleure.checkpoint as TT
+import fleure.tests.common
+
+
+def _host(hid, digest):
+    return fleure.tests.common.Host(hid, repos=["rhel-7-server-rpms"],
+                                    input_hash=digest)
+
+
+def _write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as out:
+        out.write(content)
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.cachedir = os.path.join(self.workdir, "_cache")
+        self.repomd = os.path.join(self.cachedir, "rhel-7-server-rpms-0123",
+                                   "repodata", "repomd.xml")
+        _write(self.repomd, "<repomd/>\n")
+
+    def _ckpt(self, **options):
+        return TT.Checkpoint(self.workdir, options, self.cachedir)
+
+    def test_10_input_hash(self):
+        arc = os.path.join(self.workdir, "h1.tar.gz")
+        _write(arc, "a")
+        digest = TT.input_hash(arc)
+        self.assertEqual(TT.input_hash(arc), digest)
+
+        _write(arc, "b")
+        self.assertNotEqual(TT.input_hash(arc), digest)
+
+    def test_20_mark_and_is_done(self):
+        ckpt = self._ckpt(max_diffs=1)
+        ckpt.mark(_host("h1", "d1"))
+        ckpt.mark(_host("h2", "d2"), False)
+
+        ckpt = self._ckpt(max_diffs=1, workers=4)  # Loaded from the file.
+        self.assertTrue(ckpt.is_done("h1", "d1"))
+        self.assertFalse(ckpt.is_done("h1", "d0"))
+        self.assertFalse(ckpt.is_done("h2", "d2"))
+        self.assertFalse(ckpt.is_done("h3", "d3"))
+        self.assertFalse(self._ckpt(max_diffs=0).is_done("h1", "d1"))
+
+        _write(self.repomd, "<repomd>refreshed</repomd>\n")
+        self.assertFalse(self._ckpt(max_diffs=1).is_done("h1", "d1"))
+
+    def test_30_load__broken_line(self):
+        ckpt = self._ckpt()
+        ckpt.mark(_host("h1", "d1"))
+        with open(ckpt.path, 'a') as out:
+            out.write('{"hid": "h2", "sta')  # The run died while writing.
+
+        self._ckpt().mark(_host("h3", "d3"))
+        ckpt = self._ckpt()
+        self.assertTrue(ckpt.is_done("h1", "d1"))
+        self.assertTrue(ckpt.is_done("h3", "d3"))
+        self.assertFalse("h2" in ckpt.states)
+
+# vim:sw=4:ts=4:et:
@@ -61,6 +61,18 @@ class Test(unittest.TestCase):
         args = TT.parse_args([root, "--period", period])
         self.assertEqual(args.period, period.split(','))
 
+    @fleure.tests.common.skip_if_not(TT is not None)
+    def test_13_parse_args__periods(self):
+        root = "/tmp/dummy_root"
+
+        periods = "2015-01-01,2015-03-31;2015-04-01,2015-06-30"
+        args = TT.parse_args([root, "--period", periods])
+        self.assertEqual(args.period,
+                         [p.split(',') for p in periods.split(';')])
+
+        args = TT.parse_args([root, "--period", "quarterly"])
+        self.assertEqual(args.period, "quarterly")
+
     @fleure.tests.common.skip_if_not(TT is not None)
     def test_24_main__no_root_arg(self):
         raised = False
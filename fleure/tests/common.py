@@ -122,6 +122,63 @@ def is_rhel_or_fedora(relfile="/etc/redhat-release"):
     return os.path.exists(relfile)
 
 
+def mk_pkg(name, version="1", **kwargs):
+    """
+    >>> mk_pkg("a")["version"], mk_pkg("a", "2", arch="noarch")["arch"]
+    ('1', 'noarch')
+    """
+    pkg = dict(name=name, epoch=0, version=version, release="1",
+               arch="x86_64")
+    pkg.update(kwargs)
+    return pkg
+
+
+class Host(dict):
+    """Host like object for tests, other attributes are given as keyword
+    arguments.
+    """
+    def __init__(self, hid="h1", installed=None, root="/tmp", **kwargs):
+        super(Host, self).__init__(rpmkeys=("name", ))
+        (self.hid, self.installed) = (hid, installed or [])
+        (self.root, self.workdir, self.cachedir) = (root, root, root)
+        (self.repos, self.tpaths) = ([], [])
+        (self.available, self.errors) = (True, [])
+        self.__dict__.update(kwargs)
+
+    def configure(self):
+        pass
+
+    def release(self):
+        pass
+
+
+def patch(testcase, obj, **attrs):
+    """Replace attributes of `obj` until `testcase` finishes.
+    """
+    for name, val in attrs.items():
+        testcase.addCleanup(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, val)
+
+
+def patch_main(testcase, analyze=None, installed=None):
+    """
+    Patch :mod:`fleure.main` to configure :class:`Host` objects, not to
+    prepare and analyze them with `analyze` until `testcase` finishes.
+
+    :param analyze: A callable takes a host or None (do nothing)
+    :param installed: A callable takes a host ID and returns installed
+        packages of the host, or None (no packages)
+    """
+    import fleure.main
+
+    def configure(root, hid=None, **_kwargs):
+        return Host(hid, installed(hid) if installed else [], root)
+
+    patch(testcase, fleure.main, configure=configure,
+          prepare=lambda host: None,
+          analyze=analyze or (lambda host: None))
+
+
 class Chdir(object):
 
     def __init__(self, chdir=None):
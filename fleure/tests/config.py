@@ -33,6 +33,13 @@ class FunctionsTest00(unittest.TestCase):
             self.assertEqual(cnf[key], cnf_ref[key], key)
 
 
+class _Base(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
 class HostTest00(unittest.TestCase):
 
     def test_10___init__(self):
@@ -51,6 +58,17 @@ class HostTest00(unittest.TestCase):
         self.assertFalse(host.available)
         self.assertEqual(host.errors, [])
 
+    def test_20_release(self):
+        host = TT.Host("/tmp", conf_path=None, workdir="/tmp/out")
+        base = host.base = _Base()
+        (host.errata, host.updates) = ([dict(advisory="A")], [])
+        host.release()
+
+        self.assertTrue(base.closed)
+        self.assertTrue(host.base is None)
+        self.assertFalse("errata" in host.__dict__)
+        self.assertFalse("updates" in host.__dict__)
+
 
 class HostTest10(fleure.tests.common.TestsWithRpmDB):
 
@@ -0,0 +1,102 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import time
+
+import fleure.cvecache as TT
+import fleure.datasets
+import fleure.tests.common
+
+
+def _dcve(cve):
+    return dict(cve=cve, score="5.0", metrics="AV:N/AC:L/Au:N/C:N/I:N/A:P",
+                url="http://nvd.nist.gov/")
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.dbpath = os.path.join(self.workdir, "cves.db")
+
+    def test_10_persistent(self):
+        cache = TT.CveCache(self.dbpath)
+        cache.update({"CVE-2017-0001": _dcve("CVE-2017-0001"),
+                      "CVE-2017-0002": None})
+        cache.close()
+
+        cache = TT.CveCache(self.dbpath)  # e.g. run for other hosts later.
+        (found, missing) = cache.lookup(["CVE-2017-0001", "CVE-2017-0002"])
+        self.assertEqual(found, {"CVE-2017-0001": _dcve("CVE-2017-0001"),
+                                 "CVE-2017-0002": None})
+        self.assertEqual(missing, [])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["negative_hits"], 1)
+        cache.close()
+
+    def test_20_ttl(self):
+        cache = TT.CveCache(self.dbpath, ttl=0.2, negative_ttl=0.2)
+        cache.update({"CVE-2017-0001": _dcve("CVE-2017-0001")})
+        self.assertTrue(cache.get("CVE-2017-0001"))
+
+        time.sleep(0.3)
+        self.assertTrue(cache.get("CVE-2017-0001") is None)
+        self.assertEqual(cache.stats()["misses"], 1)
+        cache.close()
+
+    def test_30_eviction(self):
+        cache = TT.CveCache(self.dbpath, max_entries=2)
+        for idx in range(1, 4):
+            cve = "CVE-2017-%04d" % idx
+            cache.update({cve: _dcve(cve)})
+            time.sleep(0.01)
+
+        (found, missing) = cache.lookup(["CVE-2017-%04d" % i for i
+                                         in range(1, 4)])
+        self.assertEqual(missing, ["CVE-2017-0001"])  # LRU one evicted.
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.close()
+
+    def test_40_complement_cves__cached(self):
+        cache = TT.CveCache(self.dbpath)
+        cache.update({"CVE-2017-0001": _dcve("CVE-2017-0001"),
+                      "CVE-2017-0002": None})
+        ers = [dict(advisory="RHSA-2017:0001",
+                    cves=[dict(id="CVE-2017-0001", url="http://a"),
+                          dict(id="CVE-2017-0002", url="http://b")])]
+
+        # No network access as all CVEs were cached.
+        ers = fleure.datasets.complement_cves(ers, cache=cache)
+        self.assertEqual(ers[0]["cves"][0]["score"], "5.0")
+        self.assertFalse("score" in ers[0]["cves"][1])
+        self.assertEqual(cache.stats()["misses"], 0)
+        cache.close()
+
+    def test_50_pages(self):
+        page = dict(body=b"<html/>", etag='"a"', last_modified=None)
+        cache = TT.CveCache(self.dbpath)
+        TT.Pages(cache)["http://a"] = page
+        cache.close()
+
+        cache = TT.CveCache(self.dbpath)
+        self.assertEqual(TT.Pages(cache).get("http://a"), page)
+        self.assertTrue(TT.Pages(cache).get("http://b") is None)
+        cache.close()
+
+    def test_52_reserve(self):
+        # Slots are shared among processes use the same database.
+        caches = [TT.CveCache(self.dbpath) for _i in range(2)]
+        delays = [c.reserve(10) for c in caches + caches[:1]]
+        for cache in caches:
+            cache.close()
+
+        self.assertTrue(delays[0] <= 0, delays)
+        self.assertTrue(9 < delays[1] <= 10, delays)
+        self.assertTrue(19 < delays[2] <= 20, delays)
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,93 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import gzip
+import json
+import os.path
+
+import fleure.cvedb as TT
+import fleure.datasets
+import fleure.tests.common
+
+
+_V2 = "AV:N/AC:L/Au:N/C:N/I:N/A:P"
+_V3 = "CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H"
+
+NVD_1_1 = {"CVE_Items": [
+    {"cve": {"CVE_data_meta": {"ID": "CVE-2017-0001"}},
+     "impact": {"baseMetricV2": {"cvssV2": {"vectorString": _V2,
+                                            "baseScore": 5.0}}}},
+    {"cve": {"CVE_data_meta": {"ID": "CVE-2017-0002"}}, "impact": {}}]}
+
+CSAF = {"document": {"title": "test"},
+        "vulnerabilities": [
+            {"cve": "CVE-2017-0001",
+             "scores": [{"cvss_v3": {"vectorString": _V3,
+                                     "baseScore": 7.5}}]},
+            {"cve": "CVE-2017-0003",
+             "scores": [{"cvss_v3": {"vectorString": _V3,
+                                     "baseScore": 7.5}}]}]}
+
+OVAL = """<?xml version="1.0" encoding="UTF-8"?>
+<oval_definitions xmlns="http://oval.mitre.org/XMLSchema/oval-definitions-5">
+ <definitions>
+  <definition id="oval:com.redhat.rhsa:def:20170001">
+   <metadata><advisory>
+    <cve cvss2="4.3/AV:N/AC:M/Au:N/C:N/I:P/A:N">CVE-2017-0004</cve>
+   </advisory></metadata>
+  </definition>
+ </definitions>
+</oval_definitions>
+"""
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.feeds = [os.path.join(self.workdir, fn) for fn
+                      in ("nvd.json.gz", "csaf.json", "oval.xml")]
+        with gzip.open(self.feeds[0], 'wb') as out:
+            out.write(json.dumps(NVD_1_1).encode("utf-8"))
+        with open(self.feeds[1], 'w') as out:
+            out.write(json.dumps(CSAF))
+        with open(self.feeds[2], 'w') as out:
+            out.write(OVAL)
+
+        self.dbpath = os.path.join(self.workdir, "cves.db")
+
+    def test_10_import_feeds(self):
+        self.assertEqual(TT.import_feeds(self.feeds, self.dbpath), 5)
+        store = TT.CveStore(self.dbpath)
+
+        dcve = store.get("CVE-2017-0001")
+        self.assertEqual(dcve["score"], 5.0)
+        self.assertEqual(dcve["metrics"], _V2)
+        self.assertEqual(dcve["score_v3"], 7.5)  # Complemented.
+
+        self.assertEqual(store.get("CVE-2017-0003")["score"], 7.5)
+        self.assertEqual(store.get("CVE-2017-0004")["score"], 4.3)
+        self.assertTrue(store.get("CVE-2017-0002") is None)  # No CVSS.
+        self.assertTrue(store.get("CVE-2017-9999") is None)
+        store.close()
+
+    def test_20__cve_details__offline(self):
+        TT.import_feeds(self.feeds, self.dbpath)
+        store = TT.CveStore(self.dbpath)
+        url = "https://access.redhat.com/security/cve/CVE-2017-0001"
+
+        cve = fleure.datasets._cve_details(dict(id="CVE-2017-0001", url=url),
+                                           store, offline=True)
+        self.assertEqual(cve["score"], 5.0)
+        self.assertEqual(cve["url"], url)
+
+        cve = fleure.datasets._cve_details(dict(id="CVE-2017-9999", url=url),
+                                           store, offline=True)
+        self.assertFalse("score" in cve)
+        store.close()
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,166 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import threading
+import time
+import unittest
+
+try:
+    import http.server as BaseHTTPServer  # python 3
+    from socketserver import ThreadingMixIn
+except ImportError:
+    import BaseHTTPServer
+    from SocketServer import ThreadingMixIn
+
+import fleure.cvecache
+import fleure.cvefetch as TT
+import fleure.tests.common
+
+
+_PAGE = """<html><body>
+<a href="http://nvd.nist.gov/cvss.cfm?name=%(cve)s">%(vector)s</a>
+<table><tr><th>Base Score:</th><td>5.0</td></tr></table>
+</body></html>
+"""
+
+_VECTOR = "AV:N/AC:L/Au:N/C:N/I:N/A:P"
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Stub handler serves CVE pages with ETag.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive.
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+
+        time.sleep(server.delay)
+        cve = self.path.rsplit('/', 1)[-1]
+        if self.path.startswith("/old/"):
+            self.send_response(302)
+            self.send_header("Location", "../cve/" + cve)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"%s"' % cve
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = (_PAGE % dict(cve=cve, vector=_VECTOR)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Local stub HTTP server for tests.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.clients = set()
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class Test00(unittest.TestCase):
+
+    def test_10_get_cvss_for_cves(self):
+        cves = ["CVE-2017-%04d" % i for i in range(1, 21)]
+        with StubServer(delay=0.1) as server:
+            fetcher = TT.Fetcher(workers=10)
+            url_fn = lambda c: "%s/cve/%s" % (server.url, c)  # noqa: E731
+            res = TT.get_cvss_for_cves(cves, fetcher, url_fn)
+            fetcher.close()
+
+        self.assertEqual(sorted(res.keys()), cves)
+        self.assertTrue(all(d["score"] == "5.0" for d in res.values()))
+        # Connections are reused: one per worker thread at most.
+        self.assertTrue(len(server.clients) <= 10, server.clients)
+
+    def test_20_fetch__conditional_request(self):
+        with StubServer() as server:
+            fetcher = TT.Fetcher(workers=1)
+            url = server.url + "/cve/CVE-2017-0001"
+            body = fetcher.fetch(url)
+            self.assertTrue(url in fetcher.cache)
+            self.assertEqual(fetcher.fetch(url), body)  # 304 -> cached.
+            fetcher.close()
+
+        self.assertEqual(len(server.requests), 2)
+
+    def test_21_fetch__conditional_request__persistent(self):
+        workdir = fleure.tests.common.setup_workdir()
+        self.addCleanup(fleure.tests.common.cleanup_workdir, workdir)
+        dbpath = os.path.join(workdir, "cves.db")
+
+        with StubServer() as server:
+            url = server.url + "/cve/CVE-2017-0001"
+            bodies = []
+            for _i in range(2):  # e.g. other hosts or runs.
+                cache = fleure.cvecache.CveCache(dbpath)
+                fetcher = TT.Fetcher(workers=1,
+                                     cache=fleure.cvecache.Pages(cache))
+                bodies.append(fetcher.fetch(url))
+                fetcher.close()
+                cache.close()
+
+        self.assertTrue(bodies[0] and bodies[0] == bodies[1])
+        self.assertEqual(len(server.requests), 2)  # 200 and 304.
+
+    def test_22_fetch__relative_redirect(self):
+        with StubServer() as server:
+            fetcher = TT.Fetcher(workers=1)
+            body = fetcher.fetch(server.url + "/old/CVE-2017-0001")
+            fetcher.close()
+
+        self.assertTrue(body and b"CVE-2017-0001" in body)
+        self.assertEqual(server.requests, ["/old/CVE-2017-0001",
+                                           "/cve/CVE-2017-0001"])
+
+    def test_30_fetch__error(self):
+        fetcher = TT.Fetcher(timeout=1)
+        self.assertTrue(fetcher.fetch("http://127.0.0.1:1/") is None)
+
+    def test_40_rate_limiter(self):
+        limiter = TT.RateLimiter(rate=20)
+        start = time.time()
+        for _i in range(5):
+            limiter.wait()
+
+        self.assertTrue(time.time() - start >= 0.2)
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,57 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import unittest
+
+import fleure.analysis
+import fleure.cvss as TT
+
+
+# (vector, score) from NVD.
+VECTORS = [("AV:N/AC:L/Au:N/C:N/I:N/A:P", 5.0),
+           ("AV:N/AC:M/Au:N/C:N/I:P/A:N", 4.3),
+           ("AV:N/AC:L/Au:N/C:C/I:C/A:C", 10.0),
+           ("AV:L/AC:L/Au:N/C:P/I:P/A:P", 4.6),
+           ("AV:N/AC:L/Au:N/C:N/I:N/A:N", 0.0),
+           ("CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H", 7.5),
+           ("CVSS:3.1/AV:L/AC:L/PR:L/UI:N/S:U/C:H/I:H/A:H", 7.8),
+           ("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:C/C:H/I:H/A:H", 10.0),
+           ("CVSS:3.1/AV:N/AC:L/PR:N/UI:R/S:C/C:L/I:L/A:N", 6.1),
+           ("CVSS:3.1/AV:N/AC:L/PR:L/UI:N/S:C/C:H/I:N/A:N", 7.7),
+           ("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:N", 0.0)]
+
+
+class Test00(unittest.TestCase):
+
+    def test_10_base_scores(self):
+        (vectors, scores) = zip(*VECTORS)
+        self.assertEqual(TT.base_scores(list(vectors)), list(scores))
+
+    def test_12_base_scores__pure_python(self):
+        (numpy, TT.numpy) = (TT.numpy, None)
+        try:
+            self.test_10_base_scores()
+        finally:
+            TT.numpy = numpy
+
+    def test_14_base_scores__invalid(self):
+        self.assertEqual(TT.base_scores(["", "AV:N", "CVSS:3.1/AV:X"]),
+                         [None, None, None])
+        self.assertEqual(TT.base_scores([]), [])
+
+    def test_20_higher_score_cve_errata_g(self):
+        ers = [dict(advisory="RHSA-2017:0001", updates=[],
+                    cves=[dict(cve="CVE-2017-0001", url="",
+                               metrics=VECTORS[0][0])]),
+               dict(advisory="RHSA-2017:0002", updates=[],
+                    cves=[dict(cve="CVE-2017-0002", url="",
+                               metrics=VECTORS[1][0])])]
+        res = list(fleure.analysis.higher_score_cve_errata_g(ers, 4.5))
+        self.assertEqual([e["advisory"] for e in res], ["RHSA-2017:0001"])
+        self.assertEqual(ers[1]["cves"][0]["score"], 4.3)
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,69 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import unittest
+
+import fleure.dedup as TT
+
+from fleure.tests.common import Host, mk_pkg
+
+
+def _ert(advisory, *updates):
+    return dict(advisory=advisory, updates=list(updates),
+                update_names=[u["name"] for u in updates])
+
+
+class Test00(unittest.TestCase):
+
+    def setUp(self):
+        self.ref = Host("h1", [mk_pkg("a"), mk_pkg("b"), mk_pkg("c")])
+
+    def test_10_group_by_fingerprint(self):
+        hosts = [self.ref, Host("h2", [mk_pkg("a")]),
+                 Host("h3", self.ref.installed[::-1])]
+        grps = TT.group_by_fingerprint(hosts)
+        self.assertEqual([(h.hid, [x.hid for x in hs]) for h, hs in grps],
+                         [("h1", ["h3"]), ("h2", [])])
+
+    def test_20_is_near(self):
+        near = Host("h2", [mk_pkg("a", "2"), mk_pkg("b"), mk_pkg("c")])
+        self.assertTrue(TT.is_near(self.ref, near))
+        self.assertFalse(TT.is_near(self.ref, near, 0))
+
+        # Older, new and different repos.
+        for host in (Host("h3", [mk_pkg("a", "0"), mk_pkg("b")]),
+                     Host("h4", [mk_pkg("a"), mk_pkg("d")]),
+                     Host("h5", self.ref.installed, repos=["a"])):
+            self.assertFalse(TT.is_near(self.ref, host), host.hid)
+
+    def test_30_apply_delta(self):
+        (ua2, ua3, ub2) = (mk_pkg("a", "2"), mk_pkg("a", "3"),
+                           mk_pkg("b", "2"))
+        errata = [_ert("RHBA-1", ua2), _ert("RHBA-2", ua3),
+                  _ert("RHBA-3", ub2, ua3)]
+        installed = [mk_pkg("a", "2"), mk_pkg("b"), mk_pkg("c")]
+
+        (ers, ups) = TT.apply_delta(errata, [ua3, ub2], installed)
+        self.assertEqual([e["advisory"] for e in ers], ["RHBA-2", "RHBA-3"])
+        self.assertEqual(ups, [ua3, ub2])
+
+        (ers, ups) = TT.apply_delta(errata, [ua3, ub2], [mk_pkg("a", "3")])
+        self.assertEqual((ers, ups), ([], []))
+
+    def test_40_find_near_hosts(self):
+        hosts = [Host("h2", [mk_pkg("a", "2"), mk_pkg("b"), mk_pkg("c")]),
+                 self.ref, Host("h3", [mk_pkg("x")])]
+        # h1 is older than h2 and cannot be analyzed from h2's results.
+        (refs, nears) = TT.find_near_hosts(hosts, 1)
+        self.assertEqual([h.hid for h in refs], ["h2", "h1", "h3"])
+        self.assertEqual(nears, {})
+
+        (refs, nears) = TT.find_near_hosts([self.ref, hosts[0]], 1)
+        self.assertEqual([h.hid for h in refs], ["h1"])
+        self.assertEqual([h.hid for h in nears["h1"]], ["h2"])
+
+# vim:sw=4:ts=4:et:
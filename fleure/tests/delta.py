@@ -0,0 +1,78 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+
+import fleure.delta as TT
+import fleure.datasets
+import fleure.jsonio
+import fleure.tests.common
+import fleure.utils
+
+
+def _pkg(name, version="1.0", release="1"):
+    return dict(name=name, epoch=0, version=version, release=release,
+                arch="x86_64")
+
+
+ERS = [dict(advisory="RHSA-2017:0001"), dict(advisory="RHBA-2017:0002")]
+UPS = [_pkg("bash", "4.2"), _pkg("glibc", "2.17")]
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.refdir = os.path.join(self.workdir, "ref")
+        self.idxdir = os.path.join(self.workdir, "cache")
+        os.makedirs(self.refdir)
+        fleure.utils.json_dump(dict(data=ERS[:1]),
+                               os.path.join(self.refdir, "errata.json"))
+        fleure.utils.json_dump(dict(data=UPS[:1]),
+                               os.path.join(self.refdir, "updates.json"))
+
+    def test_10_load__make_index(self):
+        ref = TT.RefStore.load(self.refdir, idxdir=self.idxdir)
+        self.assertTrue(os.path.exists(TT.index_path(self.refdir,
+                                                     self.idxdir)))
+        self.assertEqual(sorted(os.listdir(self.refdir)),
+                         ["errata.json", "updates.json"])  # Not written.
+        self.assertTrue(ERS[0] in ref)
+        self.assertFalse(ERS[1] in ref)
+        self.assertTrue(UPS[0] in ref)
+        self.assertFalse(UPS[1] in ref)
+
+    def test_12_load__from_index(self):
+        ref0 = TT.RefStore.load(self.refdir, idxdir=self.idxdir)
+
+        def load_items_g(*_args, **_kwargs):
+            raise AssertionError("The index was not reused")
+
+        # Reference data files are not loaded again.
+        fleure.tests.common.patch(self, fleure.jsonio,
+                                  load_items_g=load_items_g)
+        ref1 = TT.RefStore.load(self.refdir, idxdir=self.idxdir)
+        self.assertEqual(ref0.advisories, ref1.advisories)
+        self.assertEqual(ref0.nevras, ref1.nevras)
+
+    def test_13_load__no_idxdir(self):
+        ref = TT.RefStore.load(self.refdir)
+        self.assertTrue(ERS[0] in ref)
+        self.assertFalse(os.path.exists(self.idxdir))
+        self.assertEqual(sorted(os.listdir(self.refdir)),
+                         ["errata.json", "updates.json"])
+
+    def test_14_load__not_found(self):
+        self.assertRaises(IOError, TT.RefStore.load,
+                          os.path.join(self.workdir, "not_exist"))
+
+    def test_20_compute_delta(self):
+        (ers, ups) = fleure.datasets.compute_delta(self.refdir, ERS, UPS)
+        self.assertEqual(ers, ERS[1:])
+        self.assertEqual(ups, UPS[1:])
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+
+import fleure.export as TT
+import fleure.tests.common
+
+
+ERS = [dict(advisory="RHSA-2017:%04d" % i, severity="Important",
+            cves=[dict(cve="CVE-2017-%04d" % i, score=5.0)],
+            update_names=["kernel", "glibc"], epoch=i)
+       for i in range(1, 2501)]
+ERS[1500]["epoch"] = "1"  # Type differs from others.
+ERS[2000]["extra"] = None
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def _export_and_load(self, fmt):
+        paths = TT.export(ERS, "errata", self.workdir, [fmt])
+        self.assertEqual(paths, [os.path.join(self.workdir,
+                                              "errata." + fmt)])
+        return list(TT.load_g(paths[0]))
+
+    def test_10_jsonl(self):
+        self.assertEqual(self._export_and_load("jsonl"), ERS)
+
+    def test_20_csv(self):
+        res = self._export_and_load("csv")
+        self.assertEqual(len(res), len(ERS))
+        self.assertEqual(res[0]["update_names"], "kernel, glibc")
+        self.assertEqual(res[0]["cves"],
+                         '[{"cve": "CVE-2017-0001", "score": 5.0}]')
+        self.assertEqual(res[0]["extra"], "")
+
+    @fleure.tests.common.skip_if_not(TT.pyarrow is not None)
+    def test_30_parquet(self):
+        res = self._export_and_load("parquet")
+        self.assertEqual(len(res), len(ERS))
+        self.assertEqual(res[0]["advisory"], ERS[0]["advisory"])
+        self.assertEqual(res[1500]["epoch"], "1")  # Mixed column as str.
+        self.assertEqual(res[0]["epoch"], "1")
+        self.assertTrue(res[2000]["extra"] is None)
+
+        res = list(TT.load_parquet_g(os.path.join(self.workdir,
+                                                  "errata.parquet"),
+                                     ["advisory"]))
+        self.assertEqual(res[-1], dict(advisory=ERS[-1]["advisory"]))
+
+    @fleure.tests.common.skip_if_not(TT.pyarrow is not None)
+    def test_40_arrow(self):
+        res = self._export_and_load("arrow")
+        self.assertEqual([r["advisory"] for r in res],
+                         [e["advisory"] for e in ERS])
+
+    @fleure.tests.common.skip_if_not(TT.pyarrow is not None)
+    def test_50_parquet__type_changed_across_batches(self):
+        items = ([dict(a=i, b=i) for i in range(TT.BATCH_SIZE)] +
+                 [dict(a="abc", b=0.5)])
+        paths = TT.export(items, "mixed", self.workdir, ["parquet"])
+        res = list(TT.load_g(paths[0]))
+
+        self.assertEqual(len(res), len(items))
+        self.assertEqual(res[1], dict(a="1", b=1.0))
+        self.assertEqual(res[-1], dict(a="abc", b=0.5))
+
+# vim:sw=4:ts=4:et:
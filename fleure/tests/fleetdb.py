@@ -0,0 +1,77 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+
+import fleure.fleetdb as TT
+import fleure.tests.common
+
+from fleure.tests.common import Host, mk_pkg
+
+
+def _ert(advisory, severity="N/A", score=None):
+    return dict(advisory=advisory, severity=severity, synopsis=advisory,
+                cves=[dict(cve="CVE-2017-0001", score=score)])
+
+
+def _host(hid, installed, errata, updates):
+    return Host(hid, installed, errata=errata, updates=updates,
+                backend="dnf", repos=["a"])
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.dbpath = os.path.join(self.workdir, "fleet.db")
+        self.hosts = [_host("h1", [mk_pkg("a"), mk_pkg("b")],
+                            [_ert("RHSA-2017:0001", "Critical"),
+                             _ert("RHBA-2017:0002")], [mk_pkg("a", "2")]),
+                      _host("h2", [mk_pkg("a")],
+                            [_ert("RHSA-2017:0001", "Critical", "5.0")],
+                            [mk_pkg("a", "2")])]
+
+    def test_10_add_host(self):
+        with TT.FleetDB(self.dbpath) as fdb:
+            for host in self.hosts:
+                fdb.add_host(host)
+
+            self.assertEqual(fdb.hosts_by_advisory("RHSA-2017:0001"),
+                             ["h1", "h2"])
+            self.assertEqual(fdb.advisory_counts(),
+                             [("RHSA-2017:0001", 2), ("RHBA-2017:0002", 1)])
+            self.assertEqual(fdb.advisory_counts("Critical"),
+                             [("RHSA-2017:0001", 2)])
+            self.assertEqual(fdb.query("SELECT COUNT(*) FROM packages"),
+                             [(3, )])
+            # Score complemented later.
+            self.assertEqual(fdb.query("SELECT score FROM advisories WHERE "
+                                       "advisory = 'RHSA-2017:0001'"),
+                             [(5.0, )])
+
+    def test_20_add_host__replace(self):
+        TT.save_host(self.hosts[0], self.dbpath)
+        self.hosts[0].errata = self.hosts[0].errata[:1]
+        TT.save_host(self.hosts[0], self.dbpath)
+
+        with TT.FleetDB(self.dbpath) as fdb:
+            self.assertEqual(fdb.advisory_counts(), [("RHSA-2017:0001", 1)])
+            self.assertEqual(fdb.query("SELECT COUNT(*) FROM hosts"), [(1, )])
+
+    def test_30_add_same_hosts(self):
+        with TT.FleetDB(self.dbpath) as fdb:
+            fdb.add_host(self.hosts[0])
+            fdb.add_same_hosts(self.hosts[0], [_host("h3", [], [], [])])
+
+            self.assertEqual(fdb.hosts_by_advisory("RHBA-2017:0002"),
+                             ["h1", "h3"])
+            self.assertEqual(fdb.query("SELECT ref_hid FROM hosts WHERE "
+                                       "hid = 'h3'"), [("h1", )])
+            self.assertRaises(ValueError, fdb.add_same_hosts,
+                              self.hosts[1], [])
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,78 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+
+import fleure.fleetidx as TT
+import fleure.tests.common
+
+from fleure.tests.common import Host, mk_pkg
+
+
+def _ert(advisory):
+    return dict(advisory=advisory)
+
+
+def _host(hid, installed, errata, updates):
+    return Host(hid, installed, errata=errata, updates=updates)
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.dbpath = os.path.join(self.workdir, "fleet.idx")
+        self.hosts = [_host("h1", [mk_pkg("a"), mk_pkg("b")],
+                            [_ert("RHSA-1"), _ert("RHBA-2")],
+                            [mk_pkg("a", "2")]),
+                      _host("h2", [mk_pkg("a")], [_ert("RHSA-1")],
+                            [mk_pkg("a", "2")]),
+                      _host("h3", [mk_pkg("c")], [], [])]
+        with TT.FleetIndex(self.dbpath) as fidx:
+            for host in self.hosts:
+                fidx.add_host(host)
+
+    def test_10_count_and_hosts(self):
+        with TT.FleetIndex(self.dbpath) as fidx:
+            self.assertEqual(fidx.count("RHSA-1"), 2)
+            self.assertEqual(fidx.count("RHSA-0"), 0)
+            self.assertEqual(fidx.hosts(fidx.bitmap("RHBA-2")), ["h1"])
+            self.assertEqual(fidx.hosts(fidx.bitmap("a-0:1-1.x86_64",
+                                                    TT.INSTALLED)),
+                             ["h1", "h2"])
+
+    def test_20_union_and_intersection(self):
+        with TT.FleetIndex(self.dbpath) as fidx:
+            keys = ["a-0:1-1.x86_64", "c-0:1-1.x86_64"]
+            self.assertEqual(fidx.hosts(fidx.union(keys, TT.INSTALLED)),
+                             ["h1", "h2", "h3"])
+            self.assertEqual(fidx.hosts(fidx.intersection(["RHSA-1",
+                                                           "RHBA-2"])),
+                             ["h1"])
+            self.assertEqual(fidx.intersection([]), 0)
+
+    def test_30_top(self):
+        with TT.FleetIndex(self.dbpath) as fidx:
+            self.assertEqual(fidx.top(), [("RHSA-1", 2), ("RHBA-2", 1)])
+            self.assertEqual(fidx.top(1, TT.UPDATE),
+                             [("a-0:2-1.x86_64", 2)])
+
+    def test_40_add_hosts__replace_and_same_hosts(self):
+        with TT.FleetIndex(self.dbpath) as fidx:
+            # h1 was updated and h4 and h5 are same as it.
+            fidx.add_host(_host("h1", [mk_pkg("a", "2"), mk_pkg("b")],
+                                [_ert("RHBA-2")], []))
+            fidx.add_hosts([_host("h4", [], [], []),
+                            _host("h5", [], [], [])],
+                           [mk_pkg("a", "2")], [_ert("RHBA-2")])
+
+            self.assertEqual(fidx.top(), [("RHBA-2", 3), ("RHSA-1", 1)])
+            self.assertEqual(fidx.hosts(fidx.bitmap("RHBA-2")),
+                             ["h1", "h4", "h5"])
+            self.assertEqual(fidx.count("a-0:1-1.x86_64", TT.INSTALLED), 1)
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,81 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import json
+import os.path
+
+import fleure.jsonio as TT
+import fleure.tests.common
+
+
+DATA = dict(data=[dict(advisory="RHSA-2017:%04d" % i, score=i / 10.0,
+                       synopsis=u"テスト [%d]" % i,
+                       cves=[dict(cve="CVE-2017-%04d" % i)])
+                  for i in range(5000)] + [1, "]", None],
+            generated="2017-10-01 00:00:00")
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def _assert_dump_and_load(self, filename):
+        path = os.path.join(self.workdir, filename)
+        TT.dump(DATA, path)
+        self.assertEqual(TT.find(os.path.join(self.workdir, "test.json")),
+                         path)
+        self.assertEqual(TT.load(path), DATA)
+        self.assertEqual(list(TT.load_items_g(path)), DATA["data"])
+
+    def test_10_dump_and_load(self):
+        self._assert_dump_and_load("test.json")
+
+    def test_12_dump_and_load__gzip(self):
+        self._assert_dump_and_load("test.json.gz")
+
+    @fleure.tests.common.skip_if_not(TT.zstandard is not None)
+    def test_14_dump_and_load__zstd(self):
+        self._assert_dump_and_load("test.json.zst")
+
+    def test_20_dump__stdlib_kwargs(self):
+        path = os.path.join(self.workdir, "test.json")
+        TT.dump(DATA, path, indent=2)
+        with open(path) as inp:
+            self.assertEqual(json.load(inp), DATA)
+
+    def test_30_load_items_g__small_chunks(self):
+        path = os.path.join(self.workdir, "test.json")
+        TT.dump(dict(generated="x", data=[123456, dict(a=u"あ")]), path)
+        (size, TT.CHUNK_SIZE) = (TT.CHUNK_SIZE, 3)
+        try:
+            self.assertEqual(list(TT.load_items_g(path)),
+                             [123456, dict(a=u"あ")])
+            self.assertEqual(list(TT.load_items_g(path, "none")), [])
+        finally:
+            TT.CHUNK_SIZE = size
+
+    def test_32_load_items_g__top_level_key(self):
+        path = os.path.join(self.workdir, "test.json")
+        with open(path, 'w') as out:
+            out.write('{"meta": {"data": [0]}, "note": "\\"data\\": [1]", '
+                      '"list": [{"data": [2]}], "data" : [3, {"data": [4]}]}')
+
+        (size, TT.CHUNK_SIZE) = (TT.CHUNK_SIZE, 5)
+        try:
+            self.assertEqual(list(TT.load_items_g(path)),
+                             [3, dict(data=[4])])
+            self.assertEqual(list(TT.load_items_g(path, "list")),
+                             [dict(data=[2])])
+        finally:
+            TT.CHUNK_SIZE = size
+
+    def test_34_load_items_g__truncated(self):
+        path = os.path.join(self.workdir, "test.json")
+        with open(path, 'w') as out:
+            out.write('{"data": [{"a": 1}, {"b":')
+
+        self.assertRaises(ValueError, list, TT.load_items_g(path))
+
+# vim:sw=4:ts=4:et:
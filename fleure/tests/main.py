@@ -32,4 +32,46 @@ class Test00(fleure.tests.common.TestsWithWorkdir):
 
         self.assertTrue(os.path.exists(xlspath))
 
+    @fleure.tests.common.skip_if_not(TT is not None)
+    def test_20__cve_sources(self):
+        self.addCleanup(TT._close_cve_sources)
+        hosts = [fleure.tests.common.Host(
+            hid, root=self.workdir, offline=False, cve_cache=None,
+            cve_cache_ttl=10, cve_timeout=1, cve_rate=5)
+            for hid in ("h1", "h2")]
+
+        # Shared among hosts to revalidate pages and limit the rate.
+        (cache, fetcher) = TT._cve_sources(hosts[0])
+        self.assertEqual(TT._cve_sources(hosts[1]), (cache, fetcher))
+        self.assertEqual(fetcher.cache.cache, cache)
+        self.assertEqual(fetcher.limiter.reserve, cache.reserve)
+        self.assertTrue(os.path.exists(os.path.join(self.workdir,
+                                                    "fleure_cves.db")))
+
+    @fleure.tests.common.skip_if_not(TT is not None)
+    def test_30_list_errata_and_updates__released(self):
+        calls = []
+
+        class Base(object):
+            def prepare(self):
+                calls.append("prepare")
+
+            def list_updates(self):
+                return []
+
+            def list_errata(self, _calls):
+                return []
+
+        def init_base():
+            host.base = Base()
+            return host.base
+
+        host = fleure.tests.common.Host(base=None, init_base=init_base,
+                                        cvss_min_score=0)
+
+        # The backend released after prepared was made again on demand.
+        self.assertEqual(TT.list_errata_and_updates(host), ([], []))
+        self.assertEqual(calls, ["prepare"])
+        self.assertTrue(isinstance(host.base, Base))
+
 # vim:sw=4:ts=4:et:
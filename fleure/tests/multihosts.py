@@ -0,0 +1,234 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import multiprocessing
+import os.path
+import os
+import pickle
+import tarfile
+
+import fleure.checkpoint
+import fleure.config
+import fleure.globals
+import fleure.main
+import fleure.multihosts as TT
+import fleure.spool
+import fleure.tests.common
+import fleure.utils
+
+from fleure.tests.common import mk_pkg
+
+
+def _analyze(host):
+    host.errata = [host.hid]
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.hosts = [fleure.tests.common.Host("h%d" % i, list(range(i)),
+                                               base=lambda: None)
+                      for i in range(5)]  # base cannot be pickled.
+        fleure.tests.common.patch_main(self, _analyze)
+
+    def _mk_archives(self, hids=("h1", "h2", "h3")):
+        datadir = os.path.join(self.workdir, "data")
+        rpmdir = os.path.join(self.workdir, "root",
+                              fleure.globals.RPMDB_SUBDIR)
+        os.makedirs(datadir)
+        os.makedirs(rpmdir)
+        for fname in fleure.globals.RPMDB_FILENAMES:
+            with open(os.path.join(rpmdir, fname), 'w') as out:
+                out.write("\n")
+
+        for hid in hids:
+            arcpath = os.path.join(datadir, hid + "_rpmdb.tar.gz")
+            with tarfile.open(arcpath, "w:gz") as tar:
+                tar.add(rpmdir, arcname=fleure.globals.RPMDB_SUBDIR)
+
+        return datadir
+
+    def test_09_setup_workdir(self):
+        with fleure.tests.common.Chdir(self.workdir):
+            workdir = TT.setup_workdir("data", "out")
+
+        self.assertEqual(workdir, os.path.join(self.workdir, "out"))
+        self.assertTrue(os.path.isdir(workdir))
+
+    def test_10_configure(self):
+        datadir = self._mk_archives()
+        workdir = os.path.join(self.workdir, "out")
+        hosts = list(TT.configure(datadir, workdir, workers=3))
+        self.assertEqual(sorted(h.hid for h in hosts), ["h1", "h2", "h3"])
+        for host in hosts:
+            self.assertEqual(host.root, os.path.join(workdir, host.hid))
+            self.assertTrue(os.path.exists(os.path.join(
+                host.root, fleure.globals.RPMDB_SUBDIR, "Packages")))
+
+    def test_11_configure__ckpt(self):
+        datadir = self._mk_archives()
+        workdir = os.path.join(self.workdir, "out")
+        os.makedirs(workdir)
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        for host in TT.configure(datadir, workdir, ckpt=ckpt):
+            if host.hid != "h2":
+                ckpt.mark(host)
+
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        hosts = list(TT.configure(datadir, workdir, ckpt=ckpt))
+        self.assertEqual([h.hid for h in hosts], ["h2"])
+
+    def test_12_mk_job(self):
+        host = fleure.config.Host(self.workdir, conf_path=None, hid="h1",
+                                  repos=["rhel-7-server-rpms"])
+        host.base = lambda: None
+        job = pickle.loads(pickle.dumps(TT.mk_job(host)))
+
+        host2 = fleure.config.Host(job["root"], **job["options"])
+        for key in ("hid", "root", "workdir", "repos", "cachedir"):
+            self.assertEqual(getattr(host2, key), getattr(host, key))
+
+    def test_13_mk_symlinks_to_ref(self):
+        (href, host) = [fleure.tests.common.Host(
+            hid, root=os.path.join(self.workdir, "out", hid))
+            for hid in ("h1", "h2")]
+        os.makedirs(href.workdir)
+        os.makedirs(host.workdir)
+        fleure.utils.json_dump(dict(hosts=["h1"]),
+                               os.path.join(href.workdir, "metadata.json"))
+        fleure.utils.json_dump(dict(data=[]),
+                               os.path.join(href.workdir, "errata.json"))
+
+        def chdir(path):
+            raise AssertionError("Changed the current dir to " + path)
+
+        fleure.tests.common.patch(self, TT.os, chdir=chdir)
+        TT.mk_symlinks_to_ref(href, [host])
+
+        path = os.path.join(host.workdir, "errata.json")
+        self.assertEqual(os.readlink(path), os.path.join("..", "h1",
+                                                         "errata.json"))
+        self.assertEqual(fleure.utils.json_load(path), dict(data=[]))
+        self.assertEqual(fleure.utils.json_load(os.path.join(
+            host.workdir, "metadata.json"))["hosts"], ["h1", "h2"])
+
+    def _process(self, vers, **kwargs):
+        ress = []
+
+        def analyze(host, href=None):
+            ress.append((host.hid, href and href.hid))
+            return dict(hid=host.hid, available=len(ress) > 1)
+
+        fleure.tests.common.patch(self, TT, analyze=analyze)
+        hosts = [fleure.tests.common.Host(hid, [mk_pkg("a", ver), mk_pkg("b")],
+                                          os.path.join(self.workdir, hid))
+                 for hid, ver in vers]
+        TT.process(hosts, max_diffs=1, **kwargs)
+        return sorted(ress)
+
+    def test_14_process__ref_failed(self):
+        # The near host was analyzed fully instead of from the results of
+        # the reference host failed.
+        self.assertEqual(self._process((("h1", "1"), ("h2", "2"))),
+                         [("h1", None), ("h2", None)])
+
+    def test_15_process__ref_failed__same_hosts(self):
+        # The host same as the reference host failed was analyzed fully.
+        self.assertEqual(self._process((("h1", "1"), ("h2", "1"),
+                                        ("h3", "2"))),
+                         [("h1", None), ("h2", None), ("h3", None)])
+
+    def test_16_process__near_hosts_multiproc(self):
+        calls = os.path.join(self.workdir, "calls")
+        os.makedirs(calls)
+
+        def analyze_near_host(host, href):
+            with open(os.path.join(calls, host.hid), 'w') as out:
+                out.write("%s %d" % (href.hid, os.getpid()))
+
+        fleure.tests.common.patch(self, TT,
+                                  analyze_near_host=analyze_near_host)
+        installed = dict(h1=[mk_pkg("a"), mk_pkg("b"), mk_pkg("c")],
+                         h2=[mk_pkg("a"), mk_pkg("b")],
+                         h3=[mk_pkg("a", "2"), mk_pkg("b")])
+        fleure.tests.common.patch_main(self, _analyze, installed.get)
+        hosts = [fleure.tests.common.Host(h, installed[h],
+                                          os.path.join(self.workdir, h),
+                                          base=lambda: None)
+                 for h in sorted(installed)]
+        TT.process(hosts, True, max_diffs=1, procs=2)
+
+        # Near hosts were analyzed in worker processes from the results of
+        # the reference host h1.
+        ress = dict((h, open(os.path.join(calls, h)).read().split())
+                    for h in os.listdir(calls))
+        self.assertEqual(sorted(ress), ["h2", "h3"])
+        self.assertTrue(all(r == "h1" and int(p) != os.getpid()
+                            for r, p in ress.values()))
+
+    def test_17_process__low_memory(self):
+        events = []
+
+        def mk_host(hid, ver):
+            return fleure.tests.common.Host(
+                hid, [mk_pkg("a", ver), mk_pkg("b")],
+                os.path.join(self.workdir, hid),
+                release=lambda: events.append(("release", hid)))
+
+        def analyze(host, href=None):
+            events.append(("analyze", host.hid))
+            return dict(hid=host.hid, available=True)
+
+        fleure.tests.common.patch(self, TT, analyze=analyze)
+        fleure.tests.common.patch(
+            self, fleure.main,
+            prepare=lambda host: events.append(("prepare", host.hid)))
+        TT.process([mk_host("h1", "1"), mk_host("h2", "2")], max_diffs=1,
+                   low_memory=True)
+
+        # Backends of hosts were released just after they were prepared.
+        self.assertEqual(events,
+                         [("prepare", "h1"), ("release", "h1"),
+                          ("prepare", "h2"), ("release", "h2"),
+                          ("analyze", "h1"), ("release", "h1"),
+                          ("analyze", "h2"), ("release", "h2")])
+
+    def test_20_analyze_g(self):
+        ress = list(TT.analyze_g(self.hosts))
+        self.assertEqual([h.hid for h, _r in ress],
+                         ["h4", "h3", "h2", "h1", "h0"])
+        self.assertEqual(ress[0][1], dict(hid="h4", available=True,
+                                          errors=[], errata=1, updates=0))
+
+    def test_30_analyze_g__multiproc(self):
+        ress = list(TT.analyze_g(self.hosts, True, 2))
+        self.assertEqual(sorted(r["hid"] for _h, r in ress),
+                         ["h0", "h1", "h2", "h3", "h4"])
+        self.assertTrue(all(h in self.hosts and r["errata"] == 1
+                            for h, r in ress))
+
+    def test_40_analyze_g__spool(self):
+        spooldir = os.path.join(self.workdir, "spool")
+        proc = multiprocessing.Process(target=fleure.spool.work,
+                                       args=(spooldir, ),
+                                       kwargs=dict(interval=0.05))
+        proc.start()
+        (interval, fleure.spool.INTERVAL) = (fleure.spool.INTERVAL, 0.05)
+        try:
+            ress = list(TT.analyze_g(self.hosts, spool=spooldir))
+        finally:
+            fleure.spool.INTERVAL = interval
+            fleure.spool.Spool(spooldir).stop()
+            proc.join()
+
+        self.assertEqual(sorted(h.hid for h, _r in ress),
+                         ["h0", "h1", "h2", "h3", "h4"])
+        self.assertTrue(all(r["available"] and r["errata"] == 1
+                            for _h, r in ress))
+
+# vim:sw=4:ts=4:et:
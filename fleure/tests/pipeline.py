@@ -0,0 +1,116 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import os
+
+import fleure.globals
+import fleure.multihosts
+import fleure.pipeline as TT
+import fleure.tests.common
+
+from fleure.tests.common import Host, mk_pkg
+
+
+INSTALLED = dict(h1=[mk_pkg("a"), mk_pkg("b")], h2=[mk_pkg("a"), mk_pkg("b")],
+                 h3=[mk_pkg("a", "2"), mk_pkg("b")], h4=[mk_pkg("c")])
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.calls = []
+        fleure.tests.common.patch_main(
+            self, lambda h: self.calls.append(("ref", h.hid)), INSTALLED.get)
+        fleure.tests.common.patch(
+            self, fleure.multihosts,
+            link_same_hosts=lambda r, hs, **kw: self.calls.append(
+                ("same", hs[0].hid, r.hid)),
+            analyze_near_host=lambda h, r: self.calls.append(
+                ("near", h.hid, r.hid)))
+
+    def test_10_groups(self):
+        (h1, h2, h3, h4) = [Host(h, INSTALLED[h]) for h
+                            in ("h1", "h2", "h3", "h4")]
+        groups = TT.Groups(1)
+        self.assertEqual(groups.classify(h1), [(TT.REF, h1, None)])
+        self.assertEqual(groups.classify(h2), [])  # Waiting for h1.
+        self.assertEqual(groups.classify(h4), [(TT.REF, h4, None)])
+        self.assertEqual(groups.finish(h1), [(TT.SAME, h2)])
+        self.assertEqual(groups.classify(h3), [(TT.NEAR, h3, h1)])
+
+        groups.finish(h4, False)
+        self.assertFalse(groups.is_done(h4))
+        self.assertTrue(groups.is_done(h1))
+
+    def _mk_datadir(self):
+        datadir = os.path.join(self.workdir, "data")
+        for hid in ("h1", "h2", "h3", "h4"):
+            rpmdir = os.path.join(datadir, hid, fleure.globals.RPMDB_SUBDIR)
+            os.makedirs(rpmdir)
+            for fname in fleure.globals.RPMDB_FILENAMES:
+                with open(os.path.join(rpmdir, fname), 'w') as out:
+                    out.write(hid)
+
+        return datadir
+
+    def test_20_run(self):
+        # Hosts arrive in order of names with a worker per stage.
+        hosts = TT.run(self._mk_datadir(), os.path.join(self.workdir, "out"),
+                       workers=1, max_diffs=1)
+        self.assertEqual(sorted(h.hid for h in hosts),
+                         ["h1", "h2", "h3", "h4"])
+        self.assertEqual(sorted(self.calls),
+                         [("near", "h3", "h1"), ("ref", "h1"),
+                          ("ref", "h4"), ("same", "h2", "h1")])
+
+    def test_22_run__ref_failed(self):
+        def analyze(host, href=None):
+            self.calls.append((host.hid, href and href.hid))
+            return dict(hid=host.hid, available=host.hid != "h1")
+
+        fleure.tests.common.patch(self, fleure.multihosts, analyze=analyze)
+        hosts = TT.run(self._mk_datadir(), os.path.join(self.workdir, "out"),
+                       workers=1, max_diffs=1)
+
+        # The near host h3 was analyzed fully instead of from the results of
+        # h1 failed, and h2 same as h1 failed too.
+        self.assertEqual(sorted(h.hid for h in hosts), ["h3", "h4"])
+        self.assertEqual(sorted(self.calls),
+                         [("h1", None), ("h3", None), ("h4", None)])
+
+    def _assert_run__multiproc(self, **kwargs):
+        # Analyzed in other processes, so that calls are recorded in files.
+        calls = os.path.join(self.workdir, "calls")
+        os.makedirs(calls)
+
+        def record(*args):
+            open(os.path.join(calls, "-".join(args)), 'w').close()
+
+        fleure.tests.common.patch_main(
+            self, lambda h: record("ref", h.hid), INSTALLED.get)
+        fleure.tests.common.patch(
+            self, fleure.multihosts,
+            analyze_near_host=lambda h, r: record("near", h.hid, r.hid))
+
+        hosts = TT.run(self._mk_datadir(), os.path.join(self.workdir, "out"),
+                       multiproc=True, procs=2, workers=1, max_diffs=1,
+                       **kwargs)
+        self.assertEqual(sorted(h.hid for h in hosts),
+                         ["h1", "h2", "h3", "h4"])
+        self.assertEqual(sorted(os.listdir(calls)),
+                         ["near-h3-h1", "ref-h1", "ref-h4"])
+        self.assertEqual(self.calls, [("same", "h2", "h1")])
+
+    def test_24_run__multiproc(self):
+        self._assert_run__multiproc()
+
+    def test_26_run__multiproc_recycling_pool(self):
+        self._assert_run__multiproc(low_memory=True, worker_max_tasks=1)
+
+# vim:sw=4:ts=4:et:
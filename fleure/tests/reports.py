@@ -0,0 +1,59 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+
+import fleure.globals
+import fleure.reports as TT
+import fleure.tests.common
+
+
+def _ert(advisory, severity="N/A"):
+    return dict(advisory=advisory, severity=severity, synopsis=advisory,
+                url="", issue_date="2017-01-01", cves=[],
+                updates=[dict(name="a", epoch=0, version="2", release="1",
+                              arch="x86_64")],
+                update_names=["a"])
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.host = fleure.tests.common.Host(
+            "h1", root=self.workdir, details=True, cvss_min_score=0,
+            errata_keywords=fleure.globals.ERRATA_KEYWORDS,
+            errata_pkeywords=None, core_rpms=fleure.globals.CORE_RPMS,
+            rpmkeys=fleure.globals.RPM_KEYS)
+        ers = [_ert("RHSA-2017:0001", "Critical"), _ert("RHBA-2017:0002")]
+        self.rep = TT.Report(self.host, [], ers, [])
+
+    def test_10_select(self):
+        self.assertEqual(TT.select(None), set(TT.names()))
+        self.assertRaises(ValueError, TT.select, ["overview", "foo"])
+
+    def test_20_make_sheets__subset(self):
+        books = TT.make_sheets(self.rep, set(["rhsa_critical"]))
+        self.assertEqual([len(b) for b in books], [1, 0])
+
+        (title, _headers, rows) = books[0][0]
+        self.assertEqual(title, "Critical or Important RHSAs")
+        self.assertEqual([r[0] for r in rows], ["RHSA-2017:0001"])
+
+        # Views of RHBAs were not needed and not computed.
+        self.assertTrue("rhsa" in self.rep.data["errata"])
+        self.assertFalse("rhba" in self.rep.data["errata"])
+
+    def test_30_dump_reports(self):
+        TT.dump_reports(self.rep, self.workdir, ["installed", "updates"])
+        (summary, details) = [os.path.join(self.workdir, fn) for fn
+                              in fleure.globals.REPORT_FILES]
+        self.assertFalse(os.path.exists(summary))
+        self.assertTrue(os.path.exists(details))
+        self.assertFalse("rhsa" in self.rep.data["errata"])
+
+# vim:sw=4:ts=4:et:
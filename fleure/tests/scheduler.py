@@ -0,0 +1,165 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os
+import threading
+import time
+import unittest
+
+import fleure.scheduler as TT
+
+
+def _wait(event, timeout=5):
+    event.wait(timeout)
+    return event.is_set()
+
+
+def _fail(*_args):
+    raise ValueError("Failed!")
+
+
+def _pid(*_args):
+    return os.getpid()
+
+
+def _threads(*_args):
+    """Are tasks run in this thread?"""
+    ident = threading.current_thread().ident
+    return TT.run_tasks(lambda: threading.current_thread().ident == ident,
+                        [((), {}), ((), {})])
+
+
+class Test00(unittest.TestCase):
+
+    def test_10_run_tasks__concurrently(self):
+        event = threading.Event()
+        tasks = [((event, ), {}), ((), {})]
+
+        def fnc(*args):
+            return _wait(*args) if args else event.set()
+
+        self.assertEqual(TT.run_tasks(fnc, tasks, 2), [True, None])
+
+    def test_20_run_tasks__serially(self):
+        ress = TT.run_tasks(str, [((i, ), {}) for i in range(3)], 1)
+        self.assertEqual(ress, ["0", "1", "2"])
+
+    def _patch_cpu_count(self, count=4):
+        cpu_count = TT.multiprocessing.cpu_count
+        self.addCleanup(setattr, TT.multiprocessing, "cpu_count", cpu_count)
+        TT.multiprocessing.cpu_count = lambda: count
+
+    def test_22_run_tasks__in_worker(self):
+        self._patch_cpu_count()
+        self.assertEqual(_threads(), [False, False])
+
+        self.addCleanup(TT.set_worker, TT.set_worker())
+        self.assertEqual(_threads(), [True, True])
+
+    def test_30_run_tasks__error(self):
+        self.assertRaises(ValueError, TT.run_tasks, _fail,
+                          [((), {}), ((), {})], 2)
+
+    def test_40_run_tasks_g__in_order_of_completion(self):
+        event = threading.Event()
+        tasks = [((event, ), {}), ((), {})]
+
+        def fnc(*args):
+            return _wait(*args) if args else event.set()
+
+        self.assertEqual(list(TT.run_tasks_g(fnc, tasks, 2)), [None, True])
+
+    def test_42_run_tasks_g__error(self):
+        self.assertRaises(ValueError, list,
+                          TT.run_tasks_g(_fail, [((), {}), ((), {})], 2))
+
+    def test_50_run_stages__backpressure(self):
+        fed = []
+
+        def items():
+            for i in range(100):
+                fed.append(i)
+                yield i
+
+        ress = TT.run_stages(items(), [(lambda x: [x], 2),
+                                       (lambda x: [x * 2], 2)], maxsize=1)
+        first = next(ress)
+        self.assertTrue(len(fed) < 10)  # Blocked as the queues are full.
+        self.assertEqual(sorted([first] + list(ress)),
+                         [i * 2 for i in range(100)])
+
+    def test_52_run_stages__error(self):
+        def fnc(item):
+            if item == 3:
+                _fail()
+            return [item]
+
+        self.assertRaises(ValueError, list,
+                          TT.run_stages(range(100), [(fnc, 2), (fnc, 1)]))
+
+    def test_60_recycling_pool__max_tasks(self):
+        pool = TT.RecyclingPool(1, max_tasks=2)
+        try:
+            pids = [pool.apply(_pid) for _i in range(4)]
+        finally:
+            pool.close()
+
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertFalse(os.getpid() in pids)
+
+    def test_61_recycling_pool__in_worker(self):
+        self._patch_cpu_count()
+        pool = TT.RecyclingPool(1)
+        try:
+            self.assertEqual(pool.apply(_threads), [True, True])
+        finally:
+            pool.close()
+
+    def test_62_recycling_pool__error(self):
+        pool = TT.RecyclingPool(2)
+        try:
+            self.assertRaises(ValueError, pool.apply, _fail)
+            self.assertEqual(len(list(pool.imap_unordered(_pid, range(4)))),
+                             4)
+        finally:
+            pool.close()
+
+    def test_64_recycling_pool__admission(self):
+        pool = TT.RecyclingPool(2, reserve=1 << 60, weight=lambda x: x)
+        try:
+            res = sorted(pool.imap_unordered(abs, [-1, -2, -3]))
+        finally:
+            pool.close()
+
+        self.assertEqual(res, [1, 2, 3])  # Run one by one.
+
+    def test_66_recycling_pool__apply_async(self):
+        pool = TT.RecyclingPool(2)
+        try:
+            ress = [pool.apply_async(abs, (-1, )),
+                    pool.apply_async(_fail, (1, ))]
+            self.assertEqual(ress[0].get(), 1)
+            self.assertRaises(ValueError, ress[1].get)
+        finally:
+            pool.close()
+
+    def test_68_recycling_pool__terminate(self):
+        pool = TT.RecyclingPool(1)
+        res = pool.apply_async(time.sleep, (60, ))
+        while not pool._busy:
+            time.sleep(0.1)
+
+        # The worker running the task was stopped also not to wait for it.
+        start = time.time()
+        pool.terminate()
+        self.assertRaises(RuntimeError, res.get)
+        self.assertRaises(RuntimeError, pool.apply, abs, (-1, ))
+        self.assertTrue(time.time() - start < 30)
+
+# vim:sw=4:ts=4:et:
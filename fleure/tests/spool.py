@@ -0,0 +1,100 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import multiprocessing
+import os.path
+import os
+import time
+
+import fleure.spool as TT
+import fleure.tests.common
+
+
+def _process(job):
+    if job["n"] < 0:
+        raise ValueError("Failed!")
+
+    return dict(n=job["n"] * 2, pid=os.getpid())
+
+
+def _work(topdir):
+    TT.work(topdir, _process, once=True, interval=0)
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.spool = TT.Spool(self.workdir)
+
+    def test_10_claim_and_complete(self):
+        self.spool.submit("b", dict(n=2))
+        self.spool.submit("a", dict(n=1))
+
+        self.assertEqual(self.spool.claim(), ("a", dict(n=1)))
+        self.spool.complete("a", dict(n=2))
+        self.assertEqual(self.spool.claim(), ("b", dict(n=2)))
+        self.assertTrue(self.spool.claim() is None)
+
+        self.spool.fail("b", dict(error="x"))
+        self.assertEqual(list(self.spool.results_g(["a", "b"], 0)),
+                         [("a", dict(n=2), True),
+                          ("b", dict(error="x"), False)])
+
+    def test_20_requeue_stale(self):
+        self.spool.submit("a", dict(n=1))
+        self.spool.claim()
+        self.assertEqual(self.spool.requeue_stale(60), [])
+
+        past = time.time() - 120
+        os.utime(os.path.join(self.workdir, TT.CLAIMED, "a.json"),
+                 (past, past))
+        self.assertEqual(self.spool.requeue_stale(60), ["a"])
+        self.assertEqual(self.spool.claim(), ("a", dict(n=1)))
+
+    def test_30_work__multiple_processes(self):
+        jids = ["%03d" % i for i in range(20)]
+        for jid in jids:
+            self.spool.submit(jid, dict(n=int(jid) - 1))
+
+        procs = [multiprocessing.Process(target=_work,
+                                         args=(self.workdir, ))
+                 for _i in range(3)]
+        for proc in procs:
+            proc.start()
+
+        ress = dict((jid, (res, done)) for jid, res, done
+                    in self.spool.results_g(jids, 0.1))
+        for proc in procs:
+            proc.join()
+
+        self.assertEqual(sorted(ress.keys()), jids)
+        self.assertFalse(ress["000"][1])  # n = -1
+        self.assertEqual([ress[j][0]["n"] for j in jids[1:]],
+                         [(i - 1) * 2 for i in range(1, 20)])
+        self.assertEqual(os.listdir(os.path.join(self.workdir, TT.CLAIMED)),
+                         [])
+
+    def test_40_stop(self):
+        def stop(job):
+            TT.Spool(self.workdir).stop()
+            return _process(job)
+
+        for jid in ("a", "b"):
+            self.spool.submit(jid, dict(n=1))
+        self.assertEqual(TT.work(self.workdir, stop, interval=0), 1)
+
+        token = self.spool.stop_token()
+        self.assertTrue(self.spool.stopped())
+        self.assertFalse(self.spool.stopped(token))
+
+    def test_42_stop__workers_started_later(self):
+        self.spool.stop()
+        self.spool.submit("a", dict(n=1))
+        self.assertEqual(TT.work(self.workdir, _process, once=True), 1)
+
+# vim:sw=4:ts=4:et:
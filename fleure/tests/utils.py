@@ -40,4 +40,8 @@ class Test00(unittest.TestCase):
         self.assertFalse(out, out)
         self.assertFalse(err, err)
 
+    def test_40_json_load__unsupported_encoding(self):
+        self.assertRaises(ValueError, TT.json_load, "/not/exist.json",
+                          "euc-jp")
+
 # vim:sw=4:ts=4:et:
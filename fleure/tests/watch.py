@@ -0,0 +1,117 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import os
+import tarfile
+
+import fleure.checkpoint
+import fleure.globals
+import fleure.tests.common
+import fleure.watch as TT
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def setUp(self):
+        super(Test00, self).setUp()
+        self.datadir = os.path.join(self.workdir, "data")
+        os.makedirs(self.datadir)
+        self.analyzed = []
+        fleure.tests.common.patch_main(
+            self, self._analyze, lambda hid: [fleure.tests.common.mk_pkg(hid)])
+
+    def _analyze(self, host):
+        if host.hid == "bad":
+            raise RuntimeError("Failed!")
+        self.analyzed.append(host.hid)
+
+    def _mk_archive(self, hid, content="\n"):
+        rpmdir = os.path.join(self.workdir, "root",
+                              fleure.globals.RPMDB_SUBDIR)
+        if not os.path.exists(rpmdir):
+            os.makedirs(rpmdir)
+        for fname in fleure.globals.RPMDB_FILENAMES:
+            with open(os.path.join(rpmdir, fname), 'w') as out:
+                out.write(content)
+
+        arcpath = os.path.join(self.datadir, hid + "_rpmdb.tar.gz")
+        with tarfile.open(arcpath, "w:gz") as tar:
+            tar.add(rpmdir, arcname=fleure.globals.RPMDB_SUBDIR)
+        return arcpath
+
+    def test_10_watcher_ready(self):
+        arc = self._mk_archive("h1")
+        watcher = TT.Watcher(self.datadir, settle=10)
+        self.assertEqual(watcher.ready(100), [])  # Might be being written.
+        self.assertTrue(watcher.pending())
+        self.assertEqual(watcher.ready(105), [])
+        self.assertEqual(watcher.ready(110), [arc])
+        self.assertEqual(watcher.ready(120), [])
+        self.assertFalse(watcher.pending())
+
+        with open(arc, 'a') as out:  # Changed.
+            out.write("x")
+        self.assertEqual(watcher.ready(130), [])
+        self.assertEqual(watcher.ready(140), [arc])
+        watcher.close()
+
+    def test_20_main__once(self):
+        for hid in ("h1", "h2"):
+            self._mk_archive(hid, hid)
+
+        workdir = os.path.join(self.workdir, "out")
+        TT.main(self.datadir, workdir, once=True, settle=0, interval=0.01)
+        self.assertEqual(sorted(self.analyzed), ["h1", "h2"])
+
+        # Hosts done are skipped on restart and only changed ones analyzed.
+        self._mk_archive("h2", "h2 updated")
+        TT.main(self.datadir, workdir, once=True, settle=0, interval=0.01)
+        self.assertEqual(sorted(self.analyzed), ["h1", "h2", "h2"])
+
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        self.assertEqual(sorted(ckpt.states), ["h1", "h2"])
+
+    def test_22_main__host_ids(self):
+        # IDs do not depend on other archives arrived.
+        workdir = os.path.join(self.workdir, "out")
+        for hid in ("host1", "ahost1"):
+            self._mk_archive(hid, hid)
+            TT.main(self.datadir, workdir, once=True, settle=0,
+                    interval=0.01)
+
+        self.assertEqual(self.analyzed, ["host1", "ahost1"])
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        self.assertEqual(sorted(ckpt.states), ["ahost1", "host1"])
+
+    def test_30_main__error(self):
+        for hid in ("bad", "h0"):
+            self._mk_archive(hid, hid)
+        workdir = os.path.join(self.workdir, "out")
+        TT.main(self.datadir, workdir, once=True, settle=0, interval=0.01)
+
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        self.assertEqual(ckpt.states["bad"]["status"],
+                         fleure.checkpoint.FAILED)
+        self.assertTrue(ckpt.states["bad"]["input"])
+        self.assertEqual(self.analyzed, ["h0"])  # Not stopped by the error.
+
+        # Keep watching and analyze other hosts after the error.
+        self._mk_archive("h1", "h1")
+        TT.main(self.datadir, workdir, once=True, settle=0, interval=0.01)
+        self.assertEqual(self.analyzed, ["h0", "h1"])
+
+    def test_32_main__error__sole_host(self):
+        self._mk_archive("bad", "bad")
+        workdir = os.path.join(self.workdir, "out")
+        TT.main(self.datadir, workdir, once=True, settle=0, interval=0.01)
+
+        ckpt = fleure.checkpoint.Checkpoint(workdir, {})
+        self.assertEqual(list(ckpt.states), ["bad"])
+        self.assertEqual(self.analyzed, [])
+
+# vim:sw=4:ts=4:et:
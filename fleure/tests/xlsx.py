@@ -0,0 +1,55 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato at redhat.com>
+# License: GPLv3+
+#
+# pylint: disable=missing-docstring, invalid-name
+from __future__ import absolute_import
+
+import os.path
+import zipfile
+import xml.etree.ElementTree as ET
+
+import tablib
+
+import fleure.datasets
+import fleure.tests.common
+import fleure.xlsx as TT
+
+
+_NS = "{%s}" % TT._NS_MAIN
+
+
+def _load_rows(zipf, idx):
+    tree = ET.fromstring(zipf.read("xl/worksheets/sheet%d.xml" % idx))
+    return [[(c.findtext(_NS + "v") or c.findtext(_NS + "is/" + _NS + "t"))
+             for c in row] for row in tree.iter(_NS + "row")]
+
+
+class Test00(fleure.tests.common.TestsWithWorkdir):
+
+    def test_10_dump_xlsx(self):
+        tds = tablib.Dataset((1, "a"), title="Overview", headers=("n", "s"))
+        data = [dict(name="foo-%d" % i, bzs=[], desc="a\x01 < b")
+                for i in range(70000)]  # Exceeds the limit of .xls.
+        sheet = fleure.datasets.make_sheet(data, "Details [test]",
+                                           ("name", "desc"),
+                                           ("Name", "Description"))
+        path = os.path.join(self.workdir, "test.xlsx")
+        TT.dump_xlsx([tds, sheet], path)
+
+        with zipfile.ZipFile(path) as zipf:
+            self.assertTrue("[Content_Types].xml" in zipf.namelist())
+            wbook = ET.fromstring(zipf.read("xl/workbook.xml"))
+            titles = [s.get("name") for s in wbook.iter(_NS + "sheet")]
+            self.assertEqual(titles, ["Overview", "Details test"])
+
+            self.assertEqual(_load_rows(zipf, 1), [['n', 's'], ['1', 'a']])
+            rows = _load_rows(zipf, 2)
+            self.assertEqual(len(rows), 70001)
+            self.assertEqual(rows[0], ["Name", "Description"])
+            self.assertEqual(rows[-1], ["foo-69999", "a < b"])
+
+        self.assertFalse([f for f in os.listdir(self.workdir)
+                          if f.startswith(".sheet-")])
+
+# vim:sw=4:ts=4:et:
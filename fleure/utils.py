@@ -15,7 +15,6 @@ from __future__ import absolute_import
 
 import codecs
 import itertools
-import json
 import logging
 import operator
 import os.path
@@ -23,6 +22,8 @@ import os
 import subprocess
 import anyconfig.utils
 
+import fleure.jsonio
+
 
 LOG = logging.getLogger(__name__)
 
@@ -182,9 +183,13 @@ def json_load(filepath, encoding="utf-8"):
     """
     Load ``filepath`` in JSON format and return data.
 
-    :param filepath: Output file path
+    :param filepath: Input file path, may be compressed, see
+        :func:`fleure.jsonio.load`
+    :param encoding: Encoding of the file, only utf-8 is supported
     """
-    return json.load(copen(filepath, encoding=encoding))
+    if encoding.lower().replace('_', '-') != "utf-8":
+        raise ValueError("Not supported encoding: %s" % encoding)
+    return fleure.jsonio.load(filepath)
 
 
 def json_dump(data, filepath):
@@ -192,9 +197,9 @@ def json_dump(data, filepath):
     Dump given ``data`` into ``filepath`` in JSON format.
 
     :param data: Data to dump
-    :param filepath: Output file path
+    :param filepath: Output file path, see :func:`fleure.jsonio.dump`
     """
-    json.dump(data, copen(filepath, 'w'))
+    fleure.jsonio.dump(data, filepath)
 
 
 def all_eq(iterable):
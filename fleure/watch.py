@@ -0,0 +1,221 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Watch mode of multihost analysis to analyze hosts continuously.
+
+The data dir is watched with inotify if inotify_simple is available, or
+polled periodically, and RPM DB archives (or root dirs) of hosts new or
+changed are analyzed as soon as they are regarded as complete, that is,
+unchanged for a while, so that archives being uploaded are not read.
+
+Repo metadata populated are reused among hosts and refreshed periodically,
+and hosts done with same inputs are skipped on restart with the checkpoint,
+see :mod:`fleure.checkpoint`. Host IDs are names of archives without known
+suffixes, e.g. <host_id>_rpmdb.tar.xz, see
+:func:`fleure.multihosts.hid_of_path`, so that they do not change as
+other archives arrive.
+"""
+from __future__ import absolute_import
+
+import glob
+import logging
+import os.path
+import os
+import time
+
+import fleure.checkpoint
+import fleure.globals
+import fleure.main
+import fleure.multihosts
+
+from fleure.globals import _
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+LOG = logging.getLogger(__name__)
+
+SETTLE = 10  # Archives unchanged for this seconds are regarded complete.
+INTERVAL = 30  # Interval in seconds to poll the data dir.
+REFRESH = 60 * 60  # Interval in seconds to refresh repo metadata.
+
+
+def _stat(path):
+    """
+    :param path: Path to the RPM DB archive or root dir of a host
+    :return: A tuple of (size, mtime) of the archive or the RPM DB, or None
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, fleure.globals.RPMDB_SUBDIR, "Packages")
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_size, stat.st_mtime)
+
+
+class Watcher(object):
+    """Watcher of the data dir.
+    """
+    def __init__(self, datadir, settle=SETTLE):
+        """
+        :param datadir: Dir in which RPM DB archives or roots of hosts exist
+        :param settle: Archives unchanged for this seconds are regarded
+            complete
+        """
+        (self.datadir, self.settle) = (datadir, settle)
+        self._seen = dict()  # {path: (stat, time seen with the stat first)}
+        self._done = dict()  # {path: stat when it was ready}
+
+        self._inotify = None
+        if inotify_simple is not None:
+            flags = inotify_simple.flags
+            self._inotify = inotify_simple.INotify()
+            self._inotify.add_watch(datadir, flags.CREATE | flags.MODIFY |
+                                    flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def ready(self, now=None):
+        """
+        :param now: Current time in seconds since the epoch or None
+        :return: A list of paths of archives new or changed and complete
+        """
+        if now is None:
+            now = time.time()
+
+        paths = []
+        for path in sorted(glob.glob(os.path.join(self.datadir, '*'))):
+            stat = _stat(path)
+            if stat is None or self._done.get(path) == stat:
+                continue
+
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != stat:  # New or being written.
+                self._seen[path] = (stat, now)
+            elif now - seen[1] >= self.settle:
+                paths.append(path)
+
+        for path in paths:
+            self._done[path] = self._seen.pop(path)[0]
+
+        return paths
+
+    def pending(self):
+        """
+        :return: True if some archives are new or changed but not complete
+        """
+        return bool(self._seen)
+
+    def wait(self, timeout):
+        """
+        Wait for changes in the data dir.
+
+        :param timeout: Timeout in seconds
+        """
+        if self._inotify is None:
+            time.sleep(timeout)
+        else:
+            self._inotify.read(timeout=int(timeout * 1000))
+
+    def close(self):
+        """Stop watching.
+        """
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def _not_recorded(ckpt, hosts_datadir, paths, states):
+    """
+    :param ckpt: A :class:`fleure.checkpoint.Checkpoint` object
+    :param paths: Paths of hosts in a batch
+    :param states: States of hosts in the checkpoint before the batch
+    :return: A list of tuples of (hid, path) of hosts not recorded in the
+        batch
+    """
+    return [(hid, path) for hid, path
+            in fleure.multihosts.list_hpaths(hosts_datadir, paths,
+                                             fleure.multihosts.hid_of_path)
+            if ckpt.states.get(hid) is states.get(hid)]
+
+
+def _process(hosts_datadir, workdir, paths, multiproc, prefs, **kwargs):
+    """
+    Analyze hosts of `paths` in a batch. If the batch failed, hosts not done
+    in it are analyzed one by one and hosts failed are recorded as failed,
+    so that an error of a host does not stop others and watching.
+    """
+    topdir = workdir or hosts_datadir
+    ckpt = fleure.checkpoint.Checkpoint(
+        topdir, kwargs, fleure.multihosts.common_cachedir(topdir))
+    states = dict(ckpt.states)
+    try:
+        hosts = fleure.multihosts.configure(
+            hosts_datadir, workdir, ckpt, paths,
+            fleure.multihosts.hid_of_path, **kwargs)
+        fleure.multihosts.process(hosts, multiproc, ckpt, prefs, **kwargs)
+        return
+    except Exception:  # pylint: disable=broad-except
+        LOG.exception(_("Failed to analyze hosts: %s"), ", ".join(paths))
+
+    rest = _not_recorded(ckpt, hosts_datadir, paths, states)
+    if len(paths) > 1:
+        for _hid, path in rest:
+            _process(hosts_datadir, workdir, [path], multiproc, prefs,
+                     **kwargs)
+        return
+
+    for hid, path in rest:
+        try:
+            digest = fleure.checkpoint.input_hash(path)
+        except (IOError, OSError):  # Removed, etc.
+            digest = None
+        ckpt.record(hid, False, digest)
+
+
+def main(hosts_datadir, workdir=None, verbosity=0, multiproc=False,
+         once=False, settle=SETTLE, interval=INTERVAL, refresh=REFRESH,
+         **kwargs):
+    """
+    Watch the data dir and analyze hosts new or changed continuously.
+
+    :param hosts_datadir:
+        Path to dir in which rpm db roots or its archive of hosts exist
+    :param workdir: Working dir to save results
+    :param verbosity: Verbosity level: 0 (default), 1 (verbose), 2 (debug)
+    :param multiproc: Analyze hosts in parallel if True
+    :param once: Exit if no archives are new or changed instead of watching
+    :param settle: See :class:`Watcher`
+    :param interval: Interval in seconds to poll the data dir
+    :param refresh: Interval in seconds to refresh repo metadata
+    :param kwargs: Other options, see :func:`fleure.multihosts.main`
+    """
+    fleure.main.set_loglevel(verbosity)
+    watcher = Watcher(hosts_datadir, settle)
+    (prefs, refreshed) = (dict(), time.time())
+    LOG.info(_("Watching %s"), hosts_datadir)
+    try:
+        while True:
+            paths = watcher.ready()
+            if paths:
+                if time.time() - refreshed > refresh:
+                    (prefs, refreshed) = (dict(), time.time())
+
+                LOG.info(_("Analyze %d hosts new or changed"), len(paths))
+                _process(hosts_datadir, workdir, paths, multiproc, prefs,
+                         **kwargs)
+            elif once and not watcher.pending():
+                break
+
+            watcher.wait(min(settle, interval) if watcher.pending()
+                         else interval)
+    except KeyboardInterrupt:
+        LOG.info(_("Stop watching %s"), hosts_datadir)
+    finally:
+        watcher.close()
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,283 @@
+#
+# Copyright (C) 2017 Satoru SATOH <ssato@redhat.com>
+# License: GPLv3+
+#
+"""Streaming XLSX (Office Open XML spreadsheet) writer.
+
+Rows of each worksheet are written one by one into a temporary file on disk
+and the file is added into the .xlsx (zip) archive when the worksheet is
+done, so that memory use does not depend on the number of rows. Strings are
+written as inline strings to avoid keeping the shared strings table in
+memory.
+"""
+from __future__ import absolute_import
+
+import codecs
+import logging
+import numbers
+import os
+import re
+import tempfile
+import zipfile
+
+from xml.sax.saxutils import escape, quoteattr
+
+
+LOG = logging.getLogger(__name__)
+
+MAX_ROWS = 1048576
+MAX_TITLE_LEN = 31
+
+_INVALID_XML_CHARS = re.compile(u"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_INVALID_TITLE_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = ("http://schemas.openxmlformats.org/officeDocument/2006/"
+           "relationships")
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CT_PREFIX = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_ROOT_RELS = (_XML_DECL +
+              '<Relationships xmlns="%s">'
+              '<Relationship Id="rId1" Target="xl/workbook.xml" '
+              'Type="%s/officeDocument"/>'
+              '</Relationships>' % (_NS_PKG_REL, _NS_REL))
+
+_STYLES = (_XML_DECL +
+           '<styleSheet xmlns="%s">'
+           '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+           '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+           '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+           '<fill><patternFill patternType="gray125"/></fill></fills>'
+           '<borders count="1"><border/></borders>'
+           '<cellStyleXfs count="1">'
+           '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>'
+           '</cellStyleXfs>'
+           '<cellXfs count="2">'
+           '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+           '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" '
+           'applyFont="1"/></cellXfs>'
+           '<cellStyles count="1">'
+           '<cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+           '</styleSheet>' % _NS_MAIN)
+
+
+def column_name(idx):
+    """
+    :param idx: Column index starting from 0
+    :return: Column name, e.g. 'A', 'AB'
+
+    >>> column_name(0), column_name(25), column_name(26), column_name(701)
+    ('A', 'Z', 'AA', 'ZZ')
+    """
+    name = ""
+    idx += 1
+    while idx:
+        (idx, rem) = divmod(idx - 1, 26)
+        name = chr(ord('A') + rem) + name
+
+    return name
+
+
+def sheet_title(title, titles=None):
+    """
+    :param title: Worksheet title may be invalid as a worksheet name
+    :param titles: A collection of worksheet titles already used
+    :return: Valid and unique worksheet title
+
+    >>> sheet_title("RHSAs (CVSS score >= 4.0) [test]")
+    'RHSAs (CVSS score >= 4.0) test'
+    >>> sheet_title("Errata", ["Errata"])
+    'Errata (2)'
+    """
+    title = _INVALID_TITLE_CHARS.sub("", title or "Sheet")[:MAX_TITLE_LEN]
+    if titles is None:
+        return title
+
+    (base, idx) = (title, 2)
+    while title in titles:
+        sfx = " (%d)" % idx
+        title = base[:MAX_TITLE_LEN - len(sfx)] + sfx
+        idx += 1
+
+    return title
+
+
+def _cell(ref, val, style=None):
+    """
+    :param ref: Cell reference, e.g. 'A1'
+    :param val: Cell value
+    :param style: Style index or None
+    :return: XML string of a cell
+
+    >>> _cell("A1", 1)
+    '<c r="A1"><v>1</v></c>'
+    >>> _cell("B1", "a < b", 1)
+    '<c r="B1" s="1" t="inlineStr"><is><t xml:space="preserve">a &lt; b</t></is></c>'
+    """  # noqa: E501
+    sattr = "" if style is None else ' s="%d"' % style
+    if isinstance(val, bool):
+        return '<c r="%s"%s t="b"><v>%d</v></c>' % (ref, sattr, int(val))
+    if isinstance(val, numbers.Real):
+        return '<c r="%s"%s><v>%s</v></c>' % (ref, sattr, val)
+
+    if not isinstance(val, type(u"")):
+        val = val.decode("utf-8") if isinstance(val, bytes) else u"%s" % val
+
+    val = escape(_INVALID_XML_CHARS.sub(u"", val))
+    return (u'<c r="%s"%s t="inlineStr"><is><t xml:space="preserve">%s</t>'
+            u'</is></c>' % (ref, sattr, val))
+
+
+class Writer(object):
+    """Streaming XLSX writer.
+
+    >>> import os.path, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "test.xlsx")
+    >>> with Writer(path) as wrt:
+    ...     wrt.add_sheet("Test", ("a", "b"), ((i, str(i)) for i in range(3)))
+    3
+    >>> zipfile.ZipFile(path).namelist()[0]
+    'xl/worksheets/sheet1.xml'
+    """
+    def __init__(self, filepath):
+        """
+        :param filepath: Output .xlsx file path
+        """
+        self.filepath = filepath
+        self.titles = []
+        self._zipf = zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED)
+        self._colnames = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _ref(self, col, row):
+        """Cell reference with cached column names."""
+        while col >= len(self._colnames):
+            self._colnames.append(column_name(len(self._colnames)))
+
+        return "%s%d" % (self._colnames[col], row)
+
+    def add_sheet(self, title, headers, rows):
+        """
+        Add a worksheet and write rows into it one by one.
+
+        :param title: Worksheet title
+        :param headers: A list of column headers or None
+        :param rows: An iterable yields rows, lists of cell values
+        :return: Number of rows written, not including headers
+        """
+        title = sheet_title(title, self.titles)
+        self.titles.append(title)
+        arcname = "xl/worksheets/sheet%d.xml" % len(self.titles)
+
+        (fd, tmppath) = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.filepath)),
+            prefix=".sheet-", suffix=".xml")
+        nrows = 0
+        try:
+            with codecs.getwriter("utf-8")(os.fdopen(fd, 'wb')) as out:
+                out.write(_XML_DECL)
+                out.write('<worksheet xmlns="%s"><sheetData>' % _NS_MAIN)
+                rowidx = 0
+                if headers:
+                    rowidx += 1
+                    out.write(self._row(rowidx, headers, 1))
+
+                for row in rows:
+                    if rowidx >= MAX_ROWS:
+                        LOG.warning("Too many rows in '%s', truncated at %d",
+                                    title, MAX_ROWS)
+                        break
+                    rowidx += 1
+                    nrows += 1
+                    out.write(self._row(rowidx, row))
+
+                out.write('</sheetData></worksheet>')
+
+            self._zipf.write(tmppath, arcname)
+        finally:
+            os.remove(tmppath)
+
+        return nrows
+
+    def _row(self, rowidx, row, style=None):
+        """
+        :return: XML string of a row
+        """
+        cells = u"".join(_cell(self._ref(col, rowidx), val, style) for
+                         col, val in enumerate(row) if val is not None)
+        return u'<row r="%d">%s</row>' % (rowidx, cells)
+
+    def close(self):
+        """Write the rest parts of the workbook and close it.
+        """
+        if self._zipf is None:
+            return
+
+        sheets = range(1, len(self.titles) + 1)
+        ctypes = "".join('<Override PartName="/xl/worksheets/sheet%d.xml" '
+                         'ContentType="%s.worksheet+xml"/>' % (idx, _CT_PREFIX)
+                         for idx in sheets)
+        ctypes = (_XML_DECL +
+                  '<Types xmlns="http://schemas.openxmlformats.org/package/'
+                  '2006/content-types">'
+                  '<Default Extension="rels" ContentType="application/'
+                  'vnd.openxmlformats-package.relationships+xml"/>'
+                  '<Default Extension="xml" ContentType="application/xml"/>'
+                  '<Override PartName="/xl/workbook.xml" '
+                  'ContentType="%s.sheet.main+xml"/>'
+                  '<Override PartName="/xl/styles.xml" '
+                  'ContentType="%s.styles+xml"/>%s</Types>'
+                  % (_CT_PREFIX, _CT_PREFIX, ctypes))
+
+        wbook = "".join('<sheet name=%s sheetId="%d" r:id="rId%d"/>'
+                        % (quoteattr(title), idx, idx) for idx, title
+                        in zip(sheets, self.titles))
+        wbook = (_XML_DECL +
+                 '<workbook xmlns="%s" xmlns:r="%s"><sheets>%s</sheets>'
+                 '</workbook>' % (_NS_MAIN, _NS_REL, wbook))
+
+        rels = "".join('<Relationship Id="rId%d" Target="worksheets/'
+                       'sheet%d.xml" Type="%s/worksheet"/>'
+                       % (idx, idx, _NS_REL) for idx in sheets)
+        rels = (_XML_DECL +
+                '<Relationships xmlns="%s">%s<Relationship Id="rId%d" '
+                'Target="styles.xml" Type="%s/styles"/></Relationships>'
+                % (_NS_PKG_REL, rels, len(self.titles) + 1, _NS_REL))
+
+        for arcname, content in (("[Content_Types].xml", ctypes),
+                                 ("_rels/.rels", _ROOT_RELS),
+                                 ("xl/workbook.xml", wbook),
+                                 ("xl/_rels/workbook.xml.rels", rels),
+                                 ("xl/styles.xml", _STYLES)):
+            self._zipf.writestr(arcname, content.encode("utf-8"))
+
+        self._zipf.close()
+        self._zipf = None
+
+
+def dump_xlsx(sheets, filepath):
+    """
+    Dump worksheets into an XLSX file.
+
+    :param sheets:
+        A list of :class:`tablib.Dataset` objects or tuples of (title,
+        headers, rows) where rows is an iterable yields rows to write lazily,
+        e.g. :func:`fleure.datasets.make_sheet` returns
+    :param filepath: Output .xlsx file path
+    """
+    with Writer(filepath) as wrt:
+        for sheet in sheets:
+            if isinstance(sheet, tuple):
+                wrt.add_sheet(*sheet)
+            else:
+                wrt.add_sheet(sheet.title, sheet.headers, sheet)
+
+# vim:sw=4:ts=4:et: